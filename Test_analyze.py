@@ -6,6 +6,10 @@ from datetime import datetime
 
 from analyze import fetch_all_habits, fetch_habits_by_periodicity, fetch_all_streaks, fetch_streak_for_habit
 
+from analyze import fetch_longest_streak, fetch_top_streaks
+
+from analyze import iter_all_habits, iter_habits_by_periodicity, iter_all_streaks
+
 
 
 
@@ -198,6 +202,72 @@ def test_fetch_streak_for_habit(mock_db):
 
 
 
+def test_fetch_longest_streak(mock_db):
+
+    """Test the fetch_longest_streak function."""
+
+    assert fetch_longest_streak(mock_db) == ("Exercise", 5)
+
+
+
+
+
+def test_fetch_longest_streak_empty(mock_db):
+
+    """fetch_longest_streak returns None when there are no streaks."""
+
+    mock_db.execute("DELETE FROM streak")
+
+    assert fetch_longest_streak(mock_db) is None
+
+
+
+
+
+def test_fetch_top_streaks(mock_db):
+
+    """Test the fetch_top_streaks function with limits and a periodicity filter."""
+
+    assert fetch_top_streaks(mock_db, k=2) == [("Exercise", 5), ("Reading", 3)]
+
+    assert fetch_top_streaks(mock_db, k=1) == [("Exercise", 5)]
+
+    assert fetch_top_streaks(mock_db, periodicity="weekly") == [("Reading", 3)]
+
+
+
+
+
+def test_fetch_top_streaks_rejects_unknown_metric(mock_db):
+
+    """Only known streak columns can be used for ranking."""
+
+    with pytest.raises(ValueError):
+
+        fetch_top_streaks(mock_db, by="count; DROP TABLE streak")
+
+
+
+def test_iter_helpers_stream_in_chunks(mock_db):
+
+    """The iter_* generators yield the same rows as the list helpers, one chunk at a time."""
+
+    habits = iter_all_habits(mock_db, chunk_size=1)
+
+    assert not isinstance(habits, list)
+
+    assert sorted(habits) == sorted(fetch_all_habits(mock_db))
+
+    assert list(iter_habits_by_periodicity(mock_db, "daily", chunk_size=2)) == fetch_habits_by_periodicity(mock_db, "daily")
+
+    assert sorted(iter_all_streaks(mock_db, chunk_size=1)) == [("Exercise", 5), ("Reading", 3)]
+
+
+
+
+
+
+
 # -------------------------
 
 # Run the tests
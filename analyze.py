@@ -1,21 +1,92 @@
-from typing import Any, List, Tuple
+import os
+import re
+import sys
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import chain
+from typing import Any, Iterator, List, Tuple
 
-from db import get_connection
-import questionary
-from functools import reduce
+import replica
+import resultcache
+from db import get_connection, get_shard_map
+
+# Rows read per fetchmany() call by the streaming iter_* helpers
+FETCH_CHUNK = 1000
+
+
+# ---------------------------
+# Streaming helpers (generators)
+# ---------------------------
+# These read the result set in chunks of FETCH_CHUNK rows, so memory use does
+# not grow with the number of habits. The cursor is busy until the generator
+# is exhausted (or closed); do not run other queries on it in between.
+
+def iter_rows(cursor, chunk_size: int = FETCH_CHUNK) -> Iterator[tuple]:
+    """
+    Yield the rows of the cursor's current result set, fetching them in chunks.
+
+    Args:
+        cursor: A cursor on which a query has been executed.
+        chunk_size (int): Rows per fetchmany() call.
+    """
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def iter_all_habits(cursor, chunk_size: int = FETCH_CHUNK) -> Iterator[str]:
+    """
+    Yield the names of all habits, reading them in chunks.
+    """
+    cursor.execute("SELECT name FROM habits")
+    return map(lambda row: row[0], iter_rows(cursor, chunk_size))
+
+
+def iter_habits_by_periodicity(cursor, periodicity: str, chunk_size: int = FETCH_CHUNK) -> Iterator[str]:
+    """
+    Yield the names of habits that match the given periodicity (daily/weekly),
+    reading them in chunks.
+
+    Args:
+        cursor: The database cursor object.
+        periodicity (str): The periodicity to filter by ("daily" or "weekly").
+        chunk_size (int): Rows per fetchmany() call.
+    """
+    cursor.execute("SELECT name FROM habits WHERE periodicity = ?", (periodicity,))
+    return map(lambda row: row[0], iter_rows(cursor, chunk_size))
+
+
+def iter_all_streaks(cursor, chunk_size: int = FETCH_CHUNK) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (habit name, streak count) for every habit with a streak, reading them in chunks.
+    """
+    cursor.execute("""
+        SELECT h.name, s.count
+        FROM habits h
+        JOIN streak s ON h.habit_id = s.habit_id
+    """)
+    return iter_rows(cursor, chunk_size)
 
 
 # ---------------------------
 # Helper functions (functional style)
 # ---------------------------
 
+def _is_snapshot(source) -> bool:
+    """True if ``source`` is a snapshot.Snapshot rather than a database cursor."""
+    # A snapshot can only exist once snapshot.py (and NumPy) has been imported
+    module = sys.modules.get("snapshot")
+    return module is not None and isinstance(source, module.Snapshot)
+
+
 def fetch_all_habits(cursor) -> List[str]:
     """
     Retrieve the names of all habits from the database using the provided cursor.
     Returns a list of habit names.
     """
-    cursor.execute("SELECT name FROM habits")
-    return list(map(lambda row: row[0], cursor.fetchall()))
+    return list(iter_all_habits(cursor))
 
 
 def fetch_habits_by_periodicity(cursor, periodicity: str) -> List[str]:
@@ -30,8 +101,7 @@ def fetch_habits_by_periodicity(cursor, periodicity: str) -> List[str]:
     Returns:
         list: A list of habit names matching the given periodicity.
     """
-    cursor.execute("SELECT name FROM habits WHERE periodicity = ?", (periodicity,))
-    return list(map(lambda row: row[0], cursor.fetchall()))
+    return list(iter_habits_by_periodicity(cursor, periodicity))
 
 
 def fetch_all_streaks(cursor) -> List[Tuple[str, int]]:
@@ -42,12 +112,7 @@ def fetch_all_streaks(cursor) -> List[Tuple[str, int]]:
     Returns:
         list of tuples: Each tuple contains a habit name and its streak count.
     """
-    cursor.execute("""
-        SELECT h.name, s.count
-        FROM habits h
-        JOIN streak s ON h.habit_id = s.habit_id
-    """)
-    return cursor.fetchall()
+    return list(iter_all_streaks(cursor))
 
 
 def fetch_streak_for_habit(cursor, habit_name: str) -> Any | None:
@@ -72,17 +137,514 @@ def fetch_streak_for_habit(cursor, habit_name: str) -> Any | None:
     return result[0] if result else None
 
 
+# Streak columns that top-K queries may rank by
+STREAK_METRICS = ("count", "longest_streak", "current_streak")
+
+
+def fetch_longest_streak(cursor) -> Tuple[str, int] | None:
+    """
+    Retrieve the habit with the highest streak count using a single
+    ORDER BY ... LIMIT 1 query (served by the streak count index).
+
+    Returns:
+        tuple or None: (habit name, streak count), or None if there are no streaks.
+    """
+    cursor.execute("""
+        SELECT h.name, s.count
+        FROM streak s
+        JOIN habits h ON h.habit_id = s.habit_id
+        ORDER BY s.count DESC
+        LIMIT 1
+    """)
+    return cursor.fetchone()
+
+
+def fetch_top_streaks(cursor, k: int = 10, user_id: int | None = None,
+                      periodicity: str | None = None, by: str = "count") -> List[Tuple[str, int]]:
+    """
+    Retrieve the top-K habits ranked by a streak metric.
+
+    The ranking is done by SQLite (ORDER BY ... LIMIT k) so only k rows are
+    returned; the streak indexes on (count) / (user_id, count) and on
+    (longest_streak) / (user_id, longest_streak) let it stop after k rows.
+
+    Args:
+        cursor: The database cursor object.
+        k (int): Number of habits to return.
+        user_id (int, optional): Only rank this user's habits.
+        periodicity (str, optional): Only rank "daily" or "weekly" habits.
+        by (str): Column to rank by: "count", "longest_streak" or "current_streak".
+
+    Returns:
+        list of tuples: (habit name, metric value), highest first.
+    """
+    if by not in STREAK_METRICS:
+        raise ValueError(f"Unknown streak metric '{by}'. Choose one of {', '.join(STREAK_METRICS)}.")
+
+    conditions, params = [], []
+    if user_id is not None:
+        conditions.append("s.user_id = ?")
+        params.append(user_id)
+    if periodicity is not None:
+        # Unary + keeps SQLite walking the streak ranking index and filtering
+        # habits as it goes, instead of sorting every daily/weekly habit's streak
+        conditions.append("+h.periodicity = ?")
+        params.append(periodicity)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # `by` is checked against STREAK_METRICS above, so it is safe to interpolate
+    cursor.execute(f"""
+        SELECT h.name, s.{by}
+        FROM streak s
+        JOIN habits h ON h.habit_id = s.habit_id
+        {where}
+        ORDER BY s.{by} DESC
+        LIMIT ?
+    """, (*params, k))
+    return cursor.fetchall()
+
+
+def fetch_population_streaks(cursor, user_ids=None) -> dict:
+    """
+    Compute current and longest streaks for every habit of a set of users
+    (or of all users) in one vectorized pass over the completion log.
+
+    Args:
+        cursor: The database cursor object, or a snapshot.Snapshot.
+        user_ids (iterable of int, optional): Users to include; None means everyone.
+
+    Returns:
+        dict: NumPy arrays keyed by habit_id, user_id, periods, current,
+        longest and last_period (one entry per habit), plus the per-run arrays
+        described in streak_engine.compute_streaks.
+    """
+    # NumPy is only needed here, so keep it out of the module import path
+    import numpy as np
+    from streak_engine import compute_streaks_from_days, load_completion_days
+
+    data = cursor.completion_days(user_ids) if _is_snapshot(cursor) else load_completion_days(cursor, user_ids)
+    result = compute_streaks_from_days(data["habit_id"], data["day"], data["weekly"], assume_sorted=True)
+    first_rows = np.searchsorted(data["habit_id"], result["habit_id"])
+    result["user_id"] = data["user_id"][first_rows]
+    return result
+
+
+def fetch_habit_names(cursor, habit_ids) -> dict:
+    """
+    Look up the names of the given habits.
+
+    Returns:
+        dict: Mapping of habit ID to habit name.
+    """
+    habit_ids = [int(habit_id) for habit_id in habit_ids]
+    if not habit_ids:
+        return {}
+    cursor.execute(
+        f"SELECT habit_id, name FROM habits WHERE habit_id IN ({', '.join('?' * len(habit_ids))})",
+        habit_ids
+    )
+    return dict(cursor.fetchall())
+
+
+def fetch_counts(cursor) -> dict:
+    """
+    Count users, habits, active habits and logged completions.
+
+    Returns:
+        dict: users, habits, active_habits and completions.
+    """
+    cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM users),
+               (SELECT COUNT(*) FROM habits),
+               (SELECT COUNT(*) FROM habits WHERE is_active = 'Yes'),
+               (SELECT COUNT(*) FROM completions)
+    """)
+    return dict(zip(("users", "habits", "active_habits", "completions"), cursor.fetchone()))
+
+
+def fetch_streak_histogram(cursor, by: str = "longest_streak", periodicity: str | None = None) -> dict:
+    """
+    Count habits per streak value (e.g. how many habits have a longest run of 7).
+
+    Args:
+        cursor: The database cursor object.
+        by (str): Streak column to bucket by: "count", "longest_streak" or "current_streak".
+        periodicity (str, optional): Only "daily" or "weekly" habits.
+
+    Returns:
+        dict: Mapping of streak value to number of habits, in ascending value order.
+    """
+    if by not in STREAK_METRICS:
+        raise ValueError(f"Unknown streak metric '{by}'. Choose one of {', '.join(STREAK_METRICS)}.")
+    if periodicity is None:
+        # Counted straight from the streak ranking index
+        cursor.execute(f"SELECT {by}, COUNT(*) FROM streak GROUP BY {by} ORDER BY {by}")
+    else:
+        cursor.execute(f"""
+            SELECT s.{by}, COUNT(*)
+            FROM streak s
+            JOIN habits h ON h.habit_id = s.habit_id
+            WHERE h.periodicity = ?
+            GROUP BY s.{by}
+            ORDER BY s.{by}
+        """, (periodicity,))
+    return dict(cursor.fetchall())
+
+
+# ---------------------------
+# Calendar analytics (rollup tables)
+# ---------------------------
+# These read the completion_daily / completion_weekly rollups (see rollups.py),
+# so their cost depends on the number of days or weeks asked for, not on the
+# number of completions logged. Dates may be date objects or 'YYYY-MM-DD'.
+
+# Days covered when no start date is given
+DEFAULT_WINDOW_DAYS = 28
+
+
+def _date_range(start, end) -> Tuple[date, date]:
+    end = date.fromisoformat(end) if isinstance(end, str) else end or date.today()
+    start = date.fromisoformat(start) if isinstance(start, str) else start or end - timedelta(DEFAULT_WINDOW_DAYS - 1)
+    return start, end
+
+
+def fetch_completion_heatmap(cursor, habit_id: int | None = None, user_id: int | None = None,
+                             start=None, end=None) -> dict:
+    """
+    Completions per calendar day, for one habit, one user or everyone.
+
+    Args:
+        cursor: The database cursor object, or a snapshot.Snapshot.
+        habit_id (int, optional): Only this habit.
+        user_id (int, optional): Only this user's habits (ignored when habit_id is given).
+        start, end (date or str, optional): Inclusive range (default: the last 28 days).
+
+    Returns:
+        dict: Mapping of 'YYYY-MM-DD' to completions, for days with any, in date order.
+    """
+    start, end = _date_range(start, end)
+    if _is_snapshot(cursor):
+        return cursor.completion_heatmap(habit_id, user_id, start, end)
+    if habit_id is not None:
+        column, value = "habit_id", habit_id
+    elif user_id is not None:
+        column, value = "user_id", user_id
+    else:
+        column, value = "1", 1
+    cursor.execute(f"""
+        SELECT period_start, SUM(completions)
+        FROM completion_daily
+        WHERE {column} = ? AND period_start BETWEEN ? AND ?
+        GROUP BY period_start
+        ORDER BY period_start
+    """, (value, start.isoformat(), end.isoformat()))
+    return dict(cursor.fetchall())
+
+
+def fetch_habits_done_per_day(cursor, start=None, end=None, user_id: int | None = None) -> dict:
+    """
+    Number of distinct habits completed on each day (one rollup row per habit and day).
+    ``cursor`` may also be a snapshot.Snapshot.
+
+    Returns:
+        dict: Mapping of 'YYYY-MM-DD' to habits completed that day, in date order.
+    """
+    start, end = _date_range(start, end)
+    if _is_snapshot(cursor):
+        return cursor.habits_done_per_day(start, end, user_id)
+    user_filter = "AND user_id = ?" if user_id is not None else ""
+    cursor.execute(f"""
+        SELECT period_start, COUNT(*)
+        FROM completion_daily
+        WHERE period_start BETWEEN ? AND ? {user_filter}
+        GROUP BY period_start
+        ORDER BY period_start
+    """, (start.isoformat(), end.isoformat(), *([user_id] if user_id is not None else [])))
+    return dict(cursor.fetchall())
+
+
+def fetch_weekly_completions(cursor, habit_id: int, start=None, end=None) -> List[Tuple[str, int]]:
+    """
+    Completions per week (Monday to Sunday) for one habit.
+    ``cursor`` may also be a snapshot.Snapshot.
+
+    Returns:
+        list of tuples: (Monday as 'YYYY-MM-DD', completions), for weeks with any, oldest first.
+    """
+    start, end = _date_range(start, end)
+    if _is_snapshot(cursor):
+        return cursor.weekly_completions(habit_id, start, end)
+    cursor.execute("""
+        SELECT period_start, completions
+        FROM completion_weekly
+        WHERE habit_id = ? AND period_start BETWEEN ? AND ?
+        ORDER BY period_start
+    """, (habit_id, (start - timedelta(start.weekday())).isoformat(), end.isoformat()))
+    return cursor.fetchall()
+
+
+def fetch_adherence(cursor, habit_id: int, start=None, end=None) -> dict | None:
+    """
+    Share of a habit's periods (days or weeks, by its periodicity) with at least
+    one completion, counted from the habit's creation or ``start``, whichever is later.
+
+    Returns:
+        dict or None: habit_id, periodicity, periods, completed and rate (0..1),
+        or None if the habit does not exist.
+    """
+    cursor.execute("SELECT periodicity, date(created_at) FROM habits WHERE habit_id = ?", (habit_id,))
+    habit = cursor.fetchone()
+    if not habit:
+        return None
+    periodicity, created = habit
+    start, end = _date_range(start, end)
+    if created:
+        start = max(start, date.fromisoformat(created))
+    if periodicity == "weekly":
+        start, end = start - timedelta(start.weekday()), end - timedelta(end.weekday())
+        periods, table = (end - start).days // 7 + 1, "completion_weekly"
+    else:
+        periods, table = (end - start).days + 1, "completion_daily"
+    periods = max(periods, 0)
+
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM {table}
+        WHERE habit_id = ? AND period_start BETWEEN ? AND ?
+    """, (habit_id, start.isoformat(), end.isoformat()))
+    completed = cursor.fetchone()[0]
+    return {"habit_id": habit_id, "periodicity": periodicity, "periods": periods, "completed": completed,
+            "rate": round(completed / periods, 4) if periods else 0.0}
+
+
+# ---------------------------
+# Habit search
+# ---------------------------
+# Every word of the query must start a word of the habit's name or description
+# ("med rea" finds "Meditate, then read"). Matches are ranked the same way on
+# every path: names starting with the first word score 0, names holding every
+# word 1 and habits that need the description to match 2. Within a tier the
+# habits_fts index (migration 10) ranks with bm25(), added to the score as a
+# fraction below 0.5; ties go to the shorter name.
+#
+# The index is searched for all habits and for a single user's alike (joined
+# to habits and filtered on user_id), and every match is ranked in the query
+# before the limit applies. Words longer than the indexed prefixes are looked
+# up by their first INDEXED_PREFIX characters and checked against the text.
+#
+# SQLite builds without FTS5 have no index and use a LIKE scan instead, which
+# matches the words anywhere inside the text and scores by tier only.
+
+SEARCH_LIMIT = 20
+
+# Longest word prefix habits_fts indexes (prefix='1 2 3 4 5 6')
+INDEXED_PREFIX = 6
+
+
+def _search_terms(query: str) -> List[str]:
+    """Split free text into lower-case words, dropping FTS5 syntax and punctuation."""
+    return re.findall(r"\w+", query.lower())
+
+
+def _like_pattern(term: str, anywhere: bool = True) -> str:
+    """LIKE pattern (with ESCAPE '\\') matching ``term`` inside the text, or at its start."""
+    escaped = re.sub(r"([\\%_])", r"\\\1", term)
+    return f"%{escaped}%" if anywhere else f"{escaped}%"
+
+
+def has_search_index(cursor) -> bool:
+    """True if the database has the habits_fts full-text index."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'habits_fts'")
+    return cursor.fetchone() is not None
+
+
+def search_habits(cursor, query: str, limit: int = SEARCH_LIMIT,
+                  user_id: int | None = None) -> List[Tuple[int, str, str | None, float]]:
+    """
+    Find habits by words (or the beginnings of words) in their name or
+    description, best matches first.
+
+    Args:
+        cursor: The database cursor object.
+        query (str): Free text, e.g. "med" or "morning run".
+        limit (int): Maximum number of matches.
+        user_id (int, optional): Only search this user's habits.
+
+    Returns:
+        list of tuples: (habit_id, name, description, score); a lower score is a better match.
+    """
+    terms = _search_terms(query)
+    if not terms or limit <= 0:
+        return []
+    if not has_search_index(cursor):
+        return _search_habits_like(cursor, terms, limit, user_id)
+
+    match = " ".join(f'"{term[:INDEXED_PREFIX]}"*' for term in terms)
+    long_terms = [_like_pattern(term) for term in terms if len(term) > INDEXED_PREFIX]
+    # Only candidates holding the whole words match, and only names holding them rank as name matches
+    in_text = "".join(" AND (h.name LIKE ? ESCAPE '\\' OR h.description LIKE ? ESCAPE '\\')" for _ in long_terms)
+    not_in_name = "".join(" OR h.name NOT LIKE ? ESCAPE '\\'" for _ in long_terms)
+    if user_id is not None:
+        # The user's habits drive the query through idx_habits_user (CROSS JOIN keeps that order),
+        # and only their names are looked up
+        source = "habits h CROSS JOIN habits_fts ON habits_fts.rowid = h.habit_id"
+        named = "habits_fts MATCH ? AND rowid IN (SELECT habit_id FROM habits WHERE user_id = ?)"
+        user_filter, named_args, user_args = "AND h.user_id = ?", (user_id,), (user_id,)
+    else:
+        source = "habits_fts JOIN habits h ON h.habit_id = habits_fts.rowid"
+        named, user_filter, named_args, user_args = "habits_fts MATCH ?", "", (), ()
+    cursor.execute(f"""
+        SELECT h.habit_id, h.name, h.description,
+               CASE WHEN h.habit_id NOT IN (SELECT rowid FROM habits_fts WHERE {named}){not_in_name}
+                        THEN 2.0
+                    WHEN h.name LIKE ? ESCAPE '\\' THEN 0.0
+                    ELSE 1.0 END + 0.5 / (1.0 - bm25(habits_fts)) AS score
+        FROM {source}
+        WHERE habits_fts MATCH ?{in_text} {user_filter}
+        ORDER BY score, length(h.name), h.habit_id
+        LIMIT ?
+    """, (f"name : ({match})", *named_args, *long_terms, _like_pattern(terms[0], anywhere=False),
+          match, *(p for p in long_terms for _ in range(2)), *user_args, limit))
+    return cursor.fetchall()
+
+
+def _search_habits_like(cursor, terms, limit, user_id):
+    """The LIKE scan behind search_habits, with the same scores."""
+    user_filter, user_args = ("AND h.user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    patterns = [_like_pattern(term) for term in terms]
+    in_text = " AND ".join("(h.name LIKE ? ESCAPE '\\' OR h.description LIKE ? ESCAPE '\\')" for _ in terms)
+    in_name = " AND ".join("h.name LIKE ? ESCAPE '\\'" for _ in terms)
+    cursor.execute(f"""
+        SELECT h.habit_id, h.name, h.description,
+               CASE WHEN NOT ({in_name}) THEN 2.0 WHEN h.name LIKE ? ESCAPE '\\' THEN 0.0 ELSE 1.0 END AS score
+        FROM habits h
+        WHERE {in_text} {user_filter}
+        ORDER BY score, length(h.name), h.habit_id
+        LIMIT ?
+    """, (*patterns, _like_pattern(terms[0], anywhere=False), *(p for p in patterns for _ in range(2)),
+          *user_args, limit))
+    return cursor.fetchall()
+
+
 # ---------------------------
 # Analytics Interface
 # ---------------------------
 
+# Snapshot directory (see snapshot.py) the analytics menu reads, if any
+SNAPSHOT_PATH = os.environ.get("HABIT_TRACKER_SNAPSHOT") or None
+
+# The helpers that accept a snapshot.Snapshot in place of the cursor. Every
+# other helper needs tables a snapshot does not hold (habit names, the streak
+# table, the search index), so a runner with a snapshot sends those to the database.
+SNAPSHOT_HELPERS = frozenset({
+    fetch_population_streaks,
+    fetch_completion_heatmap,
+    fetch_habits_done_per_day,
+    fetch_weekly_completions,
+})
+
+
+def _peek(items):
+    """Return (first item or None, iterator over all items) without materialising them."""
+    first = next(items, None)
+    return first, (chain((first,), items) if first is not None else iter(()))
+
+
+def _bind(cursor, cached):
+    # run(fn, ...) on one cursor, through the process-wide result cache if wanted
+    cache = resultcache.get_cache() if cached else None
+    if cache is None:
+        return lambda fn, *args, **kwargs: fn(cursor, *args, **kwargs)
+    return lambda fn, *args, **kwargs: cache.call(cursor, fn, *args, **kwargs)
+
+
+@contextmanager
+def analytics_runner(on_replica=None, cached=True, snapshot=None, on_fallback=None):
+    """
+    Provide ``run(fn, *args, **kwargs)``, which calls a helper above as
+    ``fn(cursor, *args, **kwargs)`` on the live database.
+
+    With a snapshot (see snapshot.py), the helpers in SNAPSHOT_HELPERS read it
+    instead of any database; the others still read the database as described
+    below, and ``on_fallback`` is told each time that happens.
+
+    In sharded mode (see shards.py) the call goes to every shard, or only to
+    the shards owning the requested user(s) or habits, and the partial results
+    are merged into the same shape a single database returns.
+
+    Otherwise, when a replica directory is configured (see replica.py) and holds
+    a replica, the helpers read the freshest replica instead of the primary.
+    Results are served from the process-wide result cache (see resultcache.py)
+    while the database they were read from is unchanged.
+
+    Args:
+        on_replica (callable, optional): Called with the replica's status
+            (see ``replica.freshest``) when a replica is used.
+        cached (bool): Use the result cache (not in sharded mode or for snapshot reads).
+        snapshot (str or snapshot.Snapshot, optional): Snapshot (directory) to read
+            (default: HABIT_TRACKER_SNAPSHOT, if set).
+        on_fallback (callable, optional): Called with a helper's name when a
+            snapshot is used but the helper has to read the database.
+    """
+    if snapshot is None:
+        snapshot = SNAPSHOT_PATH
+    with _database_runner(on_replica, cached) as run:
+        if snapshot is None:
+            yield run
+            return
+        if isinstance(snapshot, str):
+            # Imported here so NumPy is only loaded when a snapshot is used
+            from snapshot import open_snapshot
+            snapshot = open_snapshot(snapshot)
+
+        def run_on_snapshot(fn, *args, **kwargs):
+            if fn in SNAPSHOT_HELPERS:
+                return fn(snapshot, *args, **kwargs)
+            if on_fallback is not None:
+                on_fallback(fn.__name__)
+            return run(fn, *args, **kwargs)
+
+        yield run_on_snapshot
+
+
+@contextmanager
+def _database_runner(on_replica, cached):
+    shard_map = get_shard_map()
+    if shard_map is not None:
+        yield shard_map.query
+        return
+    conn, status = replica.connect_freshest()
+    if conn is not None:
+        if on_replica is not None:
+            on_replica(status)
+        try:
+            yield _bind(conn.cursor(), cached)
+        finally:
+            conn.close()
+        return
+    with get_connection() as conn:
+        yield _bind(conn.cursor(), cached)
+
+
 def run_analytics():
     """
     Display the interactive analytics menu and handle user-selected options
     for analyzing tracked habits and their streaks.
     """
-    with get_connection() as conn:
-        cursor = conn.cursor()
+    # questionary (and prompt_toolkit) take ~0.2s to import, so only load them
+    # when the interactive menu is actually used
+    import questionary
+
+    def announce_replica(status):
+        questionary.print(f"🪞 Reading an analytics replica, {replica.describe_age(status)}.")
+
+    announced = set()
+
+    def announce_fallback(name):
+        if name not in announced:
+            announced.add(name)
+            questionary.print(f"ℹ️ {name} is not answered from the snapshot; reading the database.")
+
+    with analytics_runner(on_replica=announce_replica, on_fallback=announce_fallback) as run:
         while True:
             choice = questionary.select(
                 "📊 Analytics Menu - Choose an analysis option:",
@@ -91,16 +653,22 @@ def run_analytics():
                     "List habits by periodicity",
                     "Longest streak across all habits",
                     "Longest streak for a specific habit",
+                    "Streak leaderboard (consecutive periods)",
+                    "Top habits by completions",
+                    "Streak length distribution",
+                    "Daily activity (last 4 weeks)",
+                    "Search habits",
                     "Back to Main Menu"
                 ]
             ).ask()
 
             # Option 1: Display all tracked habits
             if choice == "List all currently tracked habits":
-                habits = fetch_all_habits(cursor)
-                if habits:
+                first, habits = _peek(run(iter_all_habits))
+                if first is not None:
                     questionary.print("📋 Tracked Habits:")
-                    list(map(lambda h: questionary.print(f"- {h}"), habits))
+                    for h in habits:
+                        questionary.print(f"- {h}")
                 else:
                     questionary.print("⚠️ No habits found.")
 
@@ -110,18 +678,18 @@ def run_analytics():
                     "Select periodicity:",
                     choices=["daily", "weekly"]
                 ).ask()
-                habits = fetch_habits_by_periodicity(cursor, period)
-                if habits:
+                first, habits = _peek(run(iter_habits_by_periodicity, period))
+                if first is not None:
                     questionary.print(f"📅 {period.capitalize()} Habits:")
-                    list(map(lambda h: questionary.print(f"- {h}"), habits))
+                    for h in habits:
+                        questionary.print(f"- {h}")
                 else:
                     questionary.print(f"⚠️ No {period} habits found.")
 
             # Option 3: Find and display the longest streak among all habits
             elif choice == "Longest streak across all habits":
-                streaks = fetch_all_streaks(cursor)
-                if streaks:
-                    longest = reduce(lambda a, b: a if a[1] > b[1] else b, streaks)
+                longest = run(fetch_longest_streak)
+                if longest:
                     questionary.print(f"🏆 Longest Streak: {longest[0]} with {longest[1]} completions")
                 else:
                     questionary.print("⚠️ No streak data available.")
@@ -129,12 +697,73 @@ def run_analytics():
             # Option 4: Retrieve and display the streak for a specific habit
             elif choice == "Longest streak for a specific habit":
                 habit_name = questionary.text("Enter the habit name:").ask()
-                streak = fetch_streak_for_habit(cursor, habit_name)
+                streak = run(fetch_streak_for_habit, habit_name)
                 if streak:
                     questionary.print(f"🔥 '{habit_name}' has a streak of {streak} completions.")
                 else:
                     questionary.print(f"⚠️ No streak found for '{habit_name}'.")
 
-            # Option 5: Exit the analytics menu
+            # Option 5: Rank habits by their longest run of consecutive periods
+            elif choice == "Streak leaderboard (consecutive periods)":
+                streaks = run(fetch_population_streaks)
+                if len(streaks["habit_id"]):
+                    top = streaks["longest"].argsort(kind="stable")[::-1][:10]
+                    names = run(fetch_habit_names, streaks["habit_id"][top])
+                    questionary.print("🏅 Streak Leaderboard:")
+                    for i in top:
+                        questionary.print(
+                            f"- {names.get(int(streaks['habit_id'][i]))}: longest {streaks['longest'][i]}, "
+                            f"current {streaks['current'][i]}"
+                        )
+                else:
+                    questionary.print("⚠️ No completions logged yet.")
+
+            # Option 6: Top-K habits by completions, optionally for one periodicity
+            elif choice == "Top habits by completions":
+                period = questionary.select(
+                    "Select periodicity:",
+                    choices=["all", "daily", "weekly"]
+                ).ask()
+                top = run(fetch_top_streaks, k=10, periodicity=None if period == "all" else period)
+                if top:
+                    questionary.print("🏆 Top Habits:")
+                    list(map(lambda t: questionary.print(f"- {t[0]}: {t[1]} completions"), top))
+                else:
+                    questionary.print("⚠️ No streak data available.")
+
+            # Option 7: How many habits reached each longest-streak length
+            elif choice == "Streak length distribution":
+                histogram = run(fetch_streak_histogram)
+                if histogram:
+                    widest = max(histogram.values())
+                    questionary.print("📊 Habits by longest streak:")
+                    for length, habits in histogram.items():
+                        questionary.print(f"{length:>5} | {'█' * max(1, round(40 * habits / widest))} {habits}")
+                else:
+                    questionary.print("⚠️ No streak data available.")
+
+            # Option 8: Habits completed per day, read from the daily rollup
+            elif choice == "Daily activity (last 4 weeks)":
+                per_day = run(fetch_habits_done_per_day)
+                if per_day:
+                    widest = max(per_day.values())
+                    questionary.print("📅 Habits completed per day:")
+                    for day, habits in per_day.items():
+                        questionary.print(f"{day} | {'█' * max(1, round(40 * habits / widest))} {habits}")
+                else:
+                    questionary.print("⚠️ No completions in the last 4 weeks.")
+
+            # Option 9: Find habits by words in their name or description
+            elif choice == "Search habits":
+                query = questionary.text("Search for (e.g. 'med' or 'morning run'):").ask()
+                matches = run(search_habits, query or "")
+                if matches:
+                    questionary.print(f"🔎 Habits matching '{query}':")
+                    for _, name, description, _ in matches:
+                        questionary.print(f"- {name}" + (f": {description}" if description else ""))
+                else:
+                    questionary.print(f"⚠️ No habits match '{query}'.")
+
+            # Option 10: Exit the analytics menu
             elif choice == "Back to Main Menu":
                 break
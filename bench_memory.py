@@ -0,0 +1,139 @@
+"""
+Memory benchmark for loaded habit rows.
+
+Loads the same habits from an in-memory database in several representations
+and reports the memory held per row (measured with tracemalloc while the
+rows are alive, so it includes the column values), the size of the per-row
+container itself (the object plus its ``__dict__``, if any) and the load time:
+
+- tuple:       default sqlite3 rows
+- sqlite3.Row: ``conn.row_factory = sqlite3.Row``
+- dict:        one dict per row
+- dict-class:  a plain class with a per-instance ``__dict__`` (the old models)
+- slots:       ``habit.Habit`` built by ``habit.habit_row``
+
+Usage:
+    python bench_memory.py [--rows N] [--json results.json]
+"""
+import argparse
+import gc
+import json
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+import migrations
+from habit import Habit, habit_row, select_list
+
+
+class DictHabit:
+    # Same fields as habit.Habit but without __slots__, as the models used to be
+    def __init__(self, habit_id, user_id, name, description, periodicity, created_at, is_active='Yes',
+                 last_completed_at=None):
+        self.habit_id = habit_id
+        self.user_id = user_id
+        self.name = name
+        self.description = description
+        self.periodicity = periodicity
+        self.created_at = created_at
+        self.is_active = is_active
+        self.last_completed_at = last_completed_at
+
+
+def _dict_row(cursor, row):
+    return dict(zip(Habit.COLUMNS, row))
+
+
+def _dict_class_row(cursor, row):
+    return DictHabit(*row)
+
+
+REPRESENTATIONS = {
+    "tuple": None,
+    "sqlite3.Row": sqlite3.Row,
+    "dict": _dict_row,
+    "dict-class": _dict_class_row,
+    "slots": habit_row,
+}
+
+
+def make_database(rows):
+    """Create an in-memory database holding ``rows`` habits spread over 1000 users."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, 'pw')",
+                     ((i, f"user{i}") for i in range(1, 1001)))
+    conn.executemany("""
+        INSERT INTO habits (habit_id, name, description, periodicity, created_at, user_id, last_completed_at)
+        VALUES (?, ?, ?, ?, '2024-01-01 08:00:00', ?, '2024-03-01 08:00:00')
+    """, ((i, f"habit {i}", "benchmark habit", "daily" if i % 3 else "weekly", i % 1000 + 1)
+          for i in range(1, rows + 1)))
+    conn.commit()
+    return conn
+
+
+def measure(conn, factory):
+    """
+    Load every habit with the given row factory.
+
+    Returns:
+        dict: bytes_per_row (memory held by the loaded rows), container_bytes (one
+        row object without its values) and seconds to load.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = factory
+    query = f"SELECT {select_list(Habit)} FROM habits"
+
+    # Time without tracing (tracemalloc slows allocation down), then measure memory
+    start = time.perf_counter()
+    cursor.execute(query).fetchall()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    rows = cursor.execute(query).fetchall()
+    gc.collect()
+    held, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(rows)
+    sample = rows[0]
+    container = sys.getsizeof(sample)
+    if hasattr(sample, "__dict__"):
+        container += sys.getsizeof(vars(sample))
+    elif isinstance(sample, sqlite3.Row):
+        container += sys.getsizeof(tuple(sample))  # the Row wraps the plain row tuple
+    del rows
+    return {"bytes_per_row": round(held / count, 1), "container_bytes": container,
+            "seconds": round(elapsed, 4), "rows": count}
+
+
+def run(rows=200_000):
+    """Measure every representation; returns a dict keyed by representation name."""
+    conn = make_database(rows)
+    try:
+        return {name: measure(conn, factory) for name, factory in REPRESENTATIONS.items()}
+    finally:
+        conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare memory per row of habit representations.")
+    parser.add_argument("--rows", type=int, default=200_000, help="habits to load")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.rows)
+    baseline = results["tuple"]["bytes_per_row"]
+    for name, r in results.items():
+        print(f"{name:<12} {r['bytes_per_row']:>8.1f} B/row  ({r['bytes_per_row'] / baseline:.2f}x tuple)  "
+              f"container {r['container_bytes']:>4} B  load {r['seconds']:.3f}s")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Startup-time benchmark for the habit tracker's non-interactive paths.
+
+Short-lived batch invocations (cron jobs, pipelines, ``python cli.py ...``)
+pay the interpreter start and module imports on every run, so this script
+measures, each in a fresh interpreter:
+
+- import:      importing the core modules (db, tracker, analyze, cli)
+- first_query: checking the schema and running a first analytics query
+- cli:         wall time of a complete ``python cli.py analytics longest`` process
+
+and compares the medians against the budgets below. It exits with status 1
+when a budget is exceeded, so it can guard CI against import-time regressions
+(for example a UI or NumPy import creeping back into the core modules).
+
+Usage:
+    python bench_startup.py [--runs N] [--json results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Budgets in milliseconds (medians)
+BUDGETS_MS = {
+    "import": 60.0,
+    "first_query": 80.0,
+    "cli": 250.0,
+}
+
+# Modules that must not be loaded by the core import path
+HEAVY_MODULES = ("questionary", "prompt_toolkit", "numpy")
+
+_IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import db, tracker, analyze, cli
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+_FIRST_QUERY_PROBE = """
+import time, json
+start = time.perf_counter()
+import db, analyze
+db.DATABASE_URL = {path!r}
+db.ensure_schema()
+with db.get_connection() as conn:
+    analyze.fetch_longest_streak(conn.cursor())
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000}}))
+"""
+
+
+def _probe(code):
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _summary(samples):
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "min_ms": round(min(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def run(runs=10):
+    """
+    Run every startup measurement ``runs`` times.
+
+    Returns:
+        dict: Per measurement, median/min/max milliseconds, budget and pass flag,
+        plus the heavy modules (if any) pulled in by the core imports.
+    """
+    workdir = tempfile.mkdtemp(prefix="habit-startup-")
+    try:
+        db_path = os.path.join(workdir, "startup.db")
+        samples = {"import": [], "first_query": [], "cli": []}
+        heavy = set()
+        for _ in range(runs):
+            result = _probe(_IMPORT_PROBE.format(heavy=HEAVY_MODULES))
+            samples["import"].append(result["ms"])
+            heavy.update(result["heavy"])
+
+            samples["first_query"].append(_probe(_FIRST_QUERY_PROBE.format(path=db_path))["ms"])
+
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "cli.py", "--db", db_path, "analytics", "longest"],
+                           cwd=HERE, check=True, capture_output=True)
+            samples["cli"].append((time.perf_counter() - start) * 1000)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {"runs": runs, "heavy_modules": sorted(heavy), "measurements": {}}
+    for name, values in samples.items():
+        entry = _summary(values)
+        entry["budget_ms"] = BUDGETS_MS[name]
+        entry["ok"] = entry["median_ms"] <= BUDGETS_MS[name]
+        report["measurements"][name] = entry
+    report["ok"] = not heavy and all(m["ok"] for m in report["measurements"].values())
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Measure cold import and first-query time.")
+    parser.add_argument("--runs", type=int, default=10, help="fresh interpreters per measurement")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run(args.runs)
+    for name, m in report["measurements"].items():
+        status = "ok" if m["ok"] else "OVER BUDGET"
+        print(f"{name:<12} median {m['median_ms']:>8.2f} ms  (min {m['min_ms']:.2f}, max {m['max_ms']:.2f}, "
+              f"budget {m['budget_ms']:.0f}) {status}")
+    if report["heavy_modules"]:
+        print(f"Core imports pulled in: {', '.join(report['heavy_modules'])}")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
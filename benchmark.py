@@ -0,0 +1,469 @@
+"""
+Micro-benchmark suite for the data and analytics layer.
+
+Builds (and caches) a synthetic database at the requested scale, then times
+every public function of db.py, main.py (all inputs passed as arguments,
+questionary output and confirmations stubbed out) and analyze.py. Each case
+reports latency percentiles and throughput; results are written as JSON so a
+later run can be compared against a stored baseline.
+
+Usage:
+    python benchmark.py --scale 100k --json results.json
+    python benchmark.py --scale 100k --baseline results.json --threshold 0.25
+    python benchmark.py --scale 1k --only analyze.     # cases whose name starts with "analyze."
+    python benchmark.py --scale 100k --profile all     # compare the storage profiles (profiles.py)
+
+Scales are completion counts: 1k, 100k and 10m (or any integer). Databases
+are cached in --cache-dir and reused by runs with the same scale and seed;
+the main.* write cases modify the working copy, never the cached file.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from unittest import mock
+
+import analyze
+import db
+import ingest
+import main
+import migrations
+import profiles
+import resultcache
+import sessions
+
+SCALES = {"1k": 1_000, "100k": 100_000, "10m": 10_000_000}
+
+# Completions per habit and habits per user in the synthetic data
+COMPLETIONS_PER_HABIT = 100
+HABITS_PER_USER = 5
+
+# Default regression threshold: 25% slower p50 than the baseline
+DEFAULT_THRESHOLD = 0.25
+
+
+# ---------------------------
+# Synthetic database
+# ---------------------------
+
+def parse_scale(scale) -> int:
+    """Convert a scale name ("1k", "100k", "10m") or integer string to a completion count."""
+    return SCALES.get(str(scale).lower()) or int(scale)
+
+
+def build_database(path, completions: int, seed: int = 0) -> dict:
+    """
+    Create a synthetic database with about ``completions`` completion events.
+
+    Habits are spread over users HABITS_PER_USER at a time; two thirds are daily
+    and one third weekly. Each habit gets about COMPLETIONS_PER_HABIT completions
+    with a per-habit adherence rate, and streaks are maintained by the bulk
+    ingest path.
+
+    Returns:
+        dict: users, habits and completions created.
+    """
+    rng = random.Random(seed)
+    habits = max(10, completions // COMPLETIONS_PER_HABIT)
+    users = max(2, habits // HABITS_PER_USER)
+    per_habit = max(1, completions // habits)
+    start = date(2020, 1, 1)
+
+    conn = sqlite3.connect(path)
+    try:
+        migrations.migrate(conn)
+        with conn:
+            conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)",
+                             ((u, f"user{u}", "pw") for u in range(1, users + 1)))
+            conn.executemany("""
+                INSERT INTO habits (habit_id, name, description, periodicity, created_at, user_id)
+                VALUES (?, ?, 'synthetic habit', ?, '2020-01-01 00:00:00', ?)
+            """, ((h, f"habit {h}", "weekly" if h % 3 == 0 else "daily", (h - 1) % users + 1)
+                  for h in range(1, habits + 1)))
+
+        def events():
+            for habit_id in range(1, habits + 1):
+                user_id = (habit_id - 1) % users + 1
+                step = 7 if habit_id % 3 == 0 else 1
+                adherence = rng.uniform(0.5, 0.95)
+                day, made = 0, 0
+                while made < per_habit:
+                    if rng.random() < adherence:
+                        when = start + timedelta(days=day)
+                        yield user_id, habit_id, f"{when.isoformat()} {rng.randrange(6, 22):02d}:00:00"
+                        made += 1
+                    day += step
+
+        stats = ingest.ingest_completions(events(), conn)
+    finally:
+        conn.close()
+    return {"users": users, "habits": habits, "completions": stats["inserted"]}
+
+
+def cached_database(cache_dir, completions: int, seed: int) -> tuple:
+    """Return (path, meta) of a cached synthetic database, building it on first use."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"bench-{completions}-{seed}.db")
+    meta_path = path + ".json"
+    if not (os.path.exists(path) and os.path.exists(meta_path)):
+        for stale in (path, meta_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+        started = time.perf_counter()
+        meta = build_database(path + ".tmp", completions, seed)
+        meta["build_seconds"] = round(time.perf_counter() - started, 2)
+        os.replace(path + ".tmp", path)
+        with open(meta_path, "w") as handle:
+            json.dump(meta, handle)
+    with open(meta_path) as handle:
+        return path, json.load(handle)
+
+
+# ---------------------------
+# Benchmark cases
+# ---------------------------
+
+class Context:
+    """
+    State shared by the cases: the database shape, a private RNG, a counter for
+    unique names and a private result cache.
+    """
+
+    def __init__(self, meta, seed):
+        self.users = meta["users"]
+        self.habits = meta["habits"]
+        self.rng = random.Random(seed)
+        self.counter = itertools.count(1)
+        self.cache = resultcache.ResultCache()
+
+    def user(self):
+        return self.rng.randint(1, self.users)
+
+    def habit(self):
+        habit_id = self.rng.randint(1, self.habits)
+        return habit_id, (habit_id - 1) % self.users + 1
+
+    def unique(self, prefix):
+        return f"{prefix}-{os.getpid()}-{next(self.counter)}"
+
+
+def _cursor_case(fn):
+    # Wrap an analyze helper so it runs on a pooled connection like the menu does
+    def case(ctx):
+        with db.get_connection() as conn:
+            result = fn(conn.cursor(), ctx)
+            if hasattr(result, "__next__"):
+                for _ in result:
+                    pass
+    return case
+
+
+# The delete cases first create the row they delete, and that insert is timed too
+def _main_delete_habit(ctx):
+    user = ctx.user()
+    habit_id = ctx.unique("bench-habit")
+    with db.get_connection() as conn:
+        new_id = conn.execute("""
+            INSERT INTO habits (name, periodicity, created_at, user_id) VALUES (?, 'daily', 'now', ?)
+        """, (habit_id, user)).lastrowid
+        conn.commit()
+    main.delete_habit(f"user{user}", "pw", new_id)
+
+
+def _main_delete_user(ctx):
+    username = ctx.unique("bench-user")
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO users (username, password) VALUES (?, 'pw')", (username,))
+        conn.commit()
+    main.delete_user(username, "pw")
+
+
+def _main_log(ctx):
+    habit_id, user = ctx.habit()
+    when = date(2020, 1, 1) + timedelta(days=ctx.rng.randrange(0, 3000))
+    main.log_completion(f"user{user}", user, habit_id, when.isoformat())
+
+
+CASES = {
+    # db.py
+    "db.get_connection": lambda ctx: db.get_connection().close(),
+    "db.ensure_schema": lambda ctx: db.ensure_schema(),
+    "db.insert_user.existing": lambda ctx: db.insert_user(f"user{ctx.user()}", "pw"),
+    "db.insert_user.new": lambda ctx: db.insert_user(ctx.unique("bench-user"), "pw"),
+
+    # analyze.py
+    "analyze.fetch_all_habits": _cursor_case(lambda cur, ctx: analyze.fetch_all_habits(cur)),
+    "analyze.iter_all_habits": _cursor_case(lambda cur, ctx: analyze.iter_all_habits(cur)),
+    "analyze.fetch_habits_by_periodicity": _cursor_case(
+        lambda cur, ctx: analyze.fetch_habits_by_periodicity(cur, ctx.rng.choice(("daily", "weekly")))),
+    "analyze.fetch_all_streaks": _cursor_case(lambda cur, ctx: analyze.fetch_all_streaks(cur)),
+    "analyze.fetch_streak_for_habit": _cursor_case(
+        lambda cur, ctx: analyze.fetch_streak_for_habit(cur, f"habit {ctx.habit()[0]}")),
+    "analyze.fetch_longest_streak": _cursor_case(lambda cur, ctx: analyze.fetch_longest_streak(cur)),
+    "analyze.fetch_top_streaks": _cursor_case(lambda cur, ctx: analyze.fetch_top_streaks(cur, k=10)),
+    "analyze.fetch_top_streaks.user": _cursor_case(
+        lambda cur, ctx: analyze.fetch_top_streaks(cur, k=10, user_id=ctx.user(), by="longest_streak")),
+    "analyze.fetch_population_streaks": _cursor_case(lambda cur, ctx: analyze.fetch_population_streaks(cur)),
+    "analyze.fetch_population_streaks.user": _cursor_case(
+        lambda cur, ctx: analyze.fetch_population_streaks(cur, user_ids=[ctx.user()])),
+    "analyze.fetch_habit_names": _cursor_case(
+        lambda cur, ctx: analyze.fetch_habit_names(cur, [ctx.habit()[0] for _ in range(10)])),
+    "analyze.fetch_habits_done_per_day": _cursor_case(
+        lambda cur, ctx: analyze.fetch_habits_done_per_day(cur, "2020-01-01", "2020-03-31")),
+    "analyze.fetch_completion_heatmap.user": _cursor_case(
+        lambda cur, ctx: analyze.fetch_completion_heatmap(cur, user_id=ctx.user(), start="2020-01-01",
+                                                          end="2020-12-31")),
+    "analyze.fetch_adherence": _cursor_case(
+        lambda cur, ctx: analyze.fetch_adherence(cur, ctx.habit()[0], "2020-01-01", "2020-12-31")),
+    "analyze.search_habits": _cursor_case(
+        lambda cur, ctx: analyze.search_habits(cur, f"habit {ctx.habit()[0]}")),
+    "analyze.search_habits.user": _cursor_case(
+        lambda cur, ctx: analyze.search_habits(cur, "hab", user_id=ctx.user())),
+    # The same query served from the result cache (resultcache.py) while nothing is written
+    "analyze.cached.fetch_population_streaks": _cursor_case(
+        lambda cur, ctx: ctx.cache.call(cur, analyze.fetch_population_streaks)),
+
+    # main.py (prompts bypassed); run last because the write cases add rows
+    "main.register": lambda ctx: main.register(ctx.unique("bench-user"), "pw"),
+    "main.view_user_profile": lambda ctx: main.view_user_profile(f"user{ctx.user()}", "pw"),
+    "main.view_habit": lambda ctx: main.view_habit(f"user{ctx.user()}", "pw"),
+    "main.add_habit": lambda ctx: (lambda u: main.add_habit(f"user{u}", u, ctx.unique("bench-habit"),
+                                                            "benchmark", "daily"))(ctx.user()),
+    "main.log_completion": _main_log,
+    "main.delete_habit": _main_delete_habit,
+    "main.delete_user": _main_delete_user,
+}
+
+
+@contextlib.contextmanager
+def quiet_ui():
+    """Stub out questionary output and confirmations, and silence prints."""
+    with mock.patch.object(main.questionary, "print"), \
+            mock.patch.object(main.questionary, "confirm") as confirm, \
+            contextlib.redirect_stdout(io.StringIO()):
+        confirm.return_value.ask.return_value = True
+        yield
+
+
+def time_case(fn, ctx, iterations: int, max_seconds: float) -> dict:
+    """
+    Run one case repeatedly (after one warm-up call) and summarise its latency.
+
+    Stops after ``iterations`` calls or ``max_seconds``, whichever comes first,
+    but always runs at least 3 timed calls.
+
+    Returns:
+        dict: iterations, p50/p90/p99/mean/min/max in milliseconds and ops_per_sec.
+    """
+    fn(ctx)
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < iterations and (len(samples) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn(ctx)
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+
+    def pct(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] * 1000
+
+    mean = statistics.fmean(samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(pct(50), 4),
+        "p90_ms": round(pct(90), 4),
+        "p99_ms": round(pct(99), 4),
+        "mean_ms": round(mean * 1000, 4),
+        "min_ms": round(samples[0] * 1000, 4),
+        "max_ms": round(samples[-1] * 1000, 4),
+        "ops_per_sec": round(1 / mean, 2) if mean else None,
+    }
+
+
+def run(scale="1k", seed=0, iterations=200, max_seconds=2.0, only=None, cache_dir=".bench",
+        profile=None) -> dict:
+    """
+    Build or reuse the synthetic database for ``scale`` and time every case.
+
+    Args:
+        scale: Scale name or completion count.
+        seed (int): Seed for the data and the per-call inputs.
+        iterations (int): Maximum timed calls per case.
+        max_seconds (float): Time budget per case.
+        only (str, optional): Only run cases whose name starts with this prefix.
+        cache_dir (str): Where synthetic databases are cached.
+        profile (str, optional): Storage profile (see profiles.py) for the run;
+            read-only profiles only run the analyze.* cases.
+
+    Returns:
+        dict: {"meta": {...}, "results": {case name: summary}}.
+    """
+    completions = parse_scale(scale)
+    if profile is not None and profiles.is_read_only(profile):
+        only = only if only and only.startswith("analyze.") else "analyze."
+    cached, meta = cached_database(cache_dir, completions, seed)
+
+    # Work on a copy so write cases never change the cached database
+    work = os.path.join(cache_dir, f"work-{os.getpid()}.db")
+    shutil.copyfile(cached, work)
+    previous_url, previous_profile = db.DATABASE_URL, db.PROFILE
+    db.DATABASE_URL = work
+    results = {}
+    try:
+        if profile is not None:
+            db.configure_profile(profile)
+        ctx = Context(meta, seed)
+        with quiet_ui():
+            for name, fn in CASES.items():
+                if only and not name.startswith(only):
+                    continue
+                results[name] = time_case(fn, ctx, iterations, max_seconds)
+    finally:
+        db.configure_profile(previous_profile)
+        sessions.clear_cache()
+        db.DATABASE_URL = previous_url
+        for path in (work, work + "-journal", work + "-wal", work + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return {
+        "meta": {
+            "scale": completions,
+            "seed": seed,
+            "profile": profile or db.PROFILE,
+            **meta,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+# ---------------------------
+# Baseline comparison
+# ---------------------------
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD, metric: str = "p50_ms") -> list:
+    """
+    Compare two result files case by case.
+
+    Returns:
+        list of dict: One entry per case present in both: name, baseline, current,
+        ratio (current / baseline) and regressed (ratio above 1 + threshold).
+    """
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get(metric):
+            continue
+        ratio = result[metric] / base[metric]
+        rows.append({"name": name, "baseline": base[metric], "current": result[metric],
+                     "ratio": round(ratio, 3), "regressed": ratio > 1 + threshold})
+    return rows
+
+
+def path_summary(report: dict, prefix: str) -> dict | None:
+    """
+    Combine the cases whose names start with ``prefix`` (e.g. "main." for the
+    write path, "analyze." for the read path) into one figure.
+
+    Returns:
+        dict or None: cases, the sum of their p50 latencies, and ops_per_sec when
+        each case is run once in turn; None if no case matched.
+    """
+    results = [r for name, r in report["results"].items() if name.startswith(prefix)]
+    if not results:
+        return None
+    mean_ms = sum(r["mean_ms"] for r in results)
+    return {"cases": len(results), "p50_ms_total": round(sum(r["p50_ms"] for r in results), 4),
+            "ops_per_sec": round(1000 * len(results) / mean_ms, 2) if mean_ms else None}
+
+
+def print_report(report: dict) -> None:
+    meta = report["meta"]
+    print(f"scale {meta['scale']:,} completions ({meta['users']:,} users, {meta['habits']:,} habits), "
+          f"SQLite {meta['sqlite']}, profile {meta['profile']}")
+    for name, r in report["results"].items():
+        print(f"{name:<40} p50 {r['p50_ms']:>10.3f} ms  p90 {r['p90_ms']:>10.3f}  p99 {r['p99_ms']:>10.3f}  "
+              f"{r['ops_per_sec']:>10.1f} ops/s  (n={r['iterations']})")
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the data and analytics layer.")
+    parser.add_argument("--scale", default="1k", help="completions: 1k, 100k, 10m or an integer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=200, help="maximum timed calls per case")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="time budget per case")
+    parser.add_argument("--only", help="only run cases whose name starts with this prefix")
+    parser.add_argument("--cache-dir", default=".bench", help="where synthetic databases are kept")
+    parser.add_argument("--profile", help="storage profile(s) to run, comma-separated, or 'all' "
+                                          f"({', '.join(profiles.PROFILES)}; default: {db.PROFILE})")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of p50 versus the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    if args.profile == "all":
+        names = list(profiles.PROFILES)
+    else:
+        names = [profiles.check(name) for name in args.profile.split(",")] if args.profile else [None]
+
+    reports = {}
+    for name in names:
+        report = run(args.scale, args.seed, args.iterations, args.max_seconds, args.only, args.cache_dir, name)
+        reports[report["meta"]["profile"]] = report
+        print_report(report)
+
+    if len(reports) > 1:
+        # Side by side: the main.py write path and the analyze.py read path per profile
+        print(f"\n{'profile':<20} {'write p50 sum':>14} {'write ops/s':>12} {'read p50 sum':>14} {'read ops/s':>12}")
+        for name, report in reports.items():
+            cells = []
+            for prefix in ("main.", "analyze."):
+                summary = path_summary(report, prefix)
+                cells += [f"{summary['p50_ms_total']:>11.3f} ms", f"{summary['ops_per_sec']:>12.1f}"] if summary \
+                    else [f"{'-':>14}", f"{'-':>12}"]
+            print(f"{name:<20} " + " ".join(cells))
+
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report if len(reports) == 1 else {"profiles": reports}, handle, indent=2)
+
+    if args.baseline:
+        if len(reports) > 1:
+            print("⚠️ --baseline compares a single profile; pass one --profile.")
+            return 2
+        meta = report["meta"]
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if baseline.get("meta", {}).get("scale") != meta["scale"]:
+            print("⚠️ Baseline was recorded at a different scale; ratios are not comparable.")
+        rows = compare(report, baseline, args.threshold)
+        regressions = [row for row in rows if row["regressed"]]
+        for row in rows:
+            flag = "REGRESSION" if row["regressed"] else ""
+            print(f"{row['name']:<40} {row['baseline']:>10.3f} -> {row['current']:>10.3f} ms  "
+                  f"x{row['ratio']:.2f} {flag}")
+        if regressions:
+            print(f"❌ {len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}.")
+            return 1
+        print("✅ No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,466 @@
+"""
+Non-interactive command line for scripts, cron jobs and load tests.
+
+Every subcommand calls the same core functions as the interactive menu
+(tracker.py and analyze.py) but never prompts, and prints its result as one
+JSON object per line. ``batch`` reads many commands from a file or stdin and
+runs them in one process over one database connection. With sharded storage
+(see shards.py) each command runs on the shard of its user, and analytics
+and rebuilds visit every shard.
+
+Every write runs as its own BEGIN IMMEDIATE transaction and is retried
+(``db.retrying``) while another process holds the write lock, like the
+interactive menu's writes, so scripts can run several writers at once.
+
+Commands acting for a user take either credentials or ``--token`` with a
+session token from ``login``; inside a batch, commands given neither use the
+session of the batch's most recent ``login``.
+
+Usage:
+    python cli.py register alice secret
+    python cli.py login alice secret        # prints a session token for --token
+    python cli.py add-habit --username alice --user-id 1 --name Run --periodicity daily
+    python cli.py log --username alice --user-id 1 --habit-id 3
+    python cli.py list --username alice --password secret
+    python cli.py list --token TOKEN --page-size 100 --stream   # one line per page
+    python cli.py analytics top -k 5 --periodicity weekly
+    python cli.py batch commands.txt        # one command per line, '-' for stdin
+"""
+import argparse
+import contextlib
+import json
+import shlex
+import sqlite3
+import sys
+from collections.abc import Iterator
+
+import analyze
+import db
+import ingest
+import rollups
+import sessions
+import tracker
+from completions import rebuild_streaks
+
+HABIT_FIELDS = ("habit_id", "name", "description", "periodicity", "is_active", "last_completed_at")
+
+
+class CommandError(Exception):
+    """Raised instead of exiting when a command line cannot be parsed."""
+
+
+# Failures reported as a command's JSON error instead of ending the run: the
+# tracker's own errors, database errors, unreadable files (e.g. a missing
+# ingest CSV) and malformed input data
+COMMAND_ERRORS = (tracker.TrackerError, sqlite3.Error, OSError, ValueError)
+
+
+class _Parser(argparse.ArgumentParser):
+    # argparse normally prints usage and exits; in batch mode one bad line
+    # must not end the whole run.
+    def error(self, message):
+        raise CommandError(message)
+
+
+# ---------------------------
+# Command handlers
+# ---------------------------
+
+def _acting_user(cursor, args, secret="user_id") -> int:
+    # A session token costs one cache lookup; credentials cost a query
+    if args.token:
+        return sessions.authenticate_token(args.token, cursor).user_id
+    if args.username is None or getattr(args, secret) is None:
+        flag = "--" + secret.replace("_", "-")
+        raise tracker.InvalidInputError(f"Either --token or --username and {flag} are required.")
+    if secret == "password":
+        return tracker.authenticate(cursor, args.username, args.password)[0]
+    return tracker.verify_user_id(cursor, args.username, args.user_id)
+
+
+def cmd_register(conn, args):
+    for attempt in db.retrying():
+        with attempt, db.transaction(conn):
+            user_id = tracker.register_user(conn.cursor(), args.username, args.password)
+    return {"user_id": user_id, "username": args.username}
+
+
+def cmd_login(conn, args):
+    for attempt in db.retrying():
+        with attempt, db.transaction(conn):
+            session = sessions.login(conn.cursor(), args.username, args.password, ttl=args.ttl)
+    return {"token": session.token, "user_id": session.user_id,
+            "username": session.username, "expires_at": session.expires_at}
+
+
+def cmd_logout(conn, args):
+    for attempt in db.retrying():
+        with attempt, db.transaction(conn):
+            sessions.logout(conn.cursor(), args.token)
+    return {"logged_out": True}
+
+
+def cmd_add_habit(conn, args):
+    for attempt in db.retrying():
+        with attempt, db.transaction(conn):
+            cursor = conn.cursor()
+            user_id = _acting_user(cursor, args)
+            habit_id = tracker.add_habit(cursor, user_id, args.name, args.description, args.periodicity)
+    return {"habit_id": habit_id, "name": args.name}
+
+
+def cmd_log(conn, args):
+    for attempt in db.retrying():
+        with attempt, db.transaction(conn):
+            cursor = conn.cursor()
+            user_id = _acting_user(cursor, args)
+            summary = tracker.log_completion(cursor, user_id, args.habit_id, args.at)
+    return summary
+
+
+def _habit_fields(habit):
+    return {field: getattr(habit, field) for field in HABIT_FIELDS}
+
+
+def _habit_page(habits, next_page):
+    return {"habits": [_habit_fields(habit) for habit in habits], "next": next_page}
+
+
+def cmd_list(conn, args):
+    cursor = conn.cursor()
+    user_id = _acting_user(cursor, args, secret="password")
+    # Habit objects (habit.py) carry their fields by name
+    filters = {"is_active": args.active, "periodicity": args.periodicity, "as_objects": True}
+    if args.stream:
+        # One JSON line per page, fetched as the previous one is written
+        pages = tracker.iter_habit_pages(cursor, user_id, args.after, args.page_size, **filters)
+        return (_habit_page(habits, next_page) for habits, next_page in pages)
+    if args.page_size or args.after:
+        return _habit_page(*tracker.list_habits_page(cursor, user_id, args.after,
+                                                      args.page_size or tracker.DEFAULT_PAGE_SIZE, **filters))
+    habits = []
+    for page, _next_page in tracker.iter_habit_pages(cursor, user_id, **filters):
+        habits += page
+    return [_habit_fields(habit) for habit in habits]
+
+
+def _query(conn, fn, *args, **kwargs):
+    # In sharded mode analytics visit every shard (conn is None) and merge the results
+    shard_map = db.get_shard_map()
+    if shard_map is not None:
+        return shard_map.query(fn, *args, **kwargs)
+    return fn(conn.cursor(), *args, **kwargs)
+
+
+def cmd_analytics_habits(conn, args):
+    if args.periodicity:
+        return _query(conn, analyze.fetch_habits_by_periodicity, args.periodicity)
+    return _query(conn, analyze.fetch_all_habits)
+
+
+def cmd_analytics_longest(conn, args):
+    longest = _query(conn, analyze.fetch_longest_streak)
+    return {"name": longest[0], "count": longest[1]} if longest else None
+
+
+def cmd_analytics_streak(conn, args):
+    return {"name": args.name, "count": _query(conn, analyze.fetch_streak_for_habit, args.name)}
+
+
+def cmd_analytics_top(conn, args):
+    top = _query(conn, analyze.fetch_top_streaks, k=args.k, user_id=args.user_id,
+                 periodicity=args.periodicity, by=args.by)
+    return [{"name": name, args.by: value} for name, value in top]
+
+
+def cmd_analytics_search(conn, args):
+    matches = _query(conn, analyze.search_habits, args.query, limit=args.limit, user_id=args.user_id)
+    return [{"habit_id": habit_id, "name": name, "description": description, "score": score}
+            for habit_id, name, description, score in matches]
+
+
+def cmd_ingest(conn, args):
+    # Each batch is retried on its own inside ingest_completions; retrying the
+    # whole command would load the batches committed before the lock error again
+    return ingest.ingest_completions(ingest.read_events(args.file), conn, batch_size=args.batch_size)
+
+
+def _rebuild(conn, rebuild) -> int:
+    # A rebuild recomputes everything from the log, so a locked try simply runs again
+    for attempt in db.retrying():
+        with attempt, db.transaction(conn):
+            return rebuild(conn)
+
+
+def _on_every_database(conn, rebuild) -> int:
+    # In sharded mode maintenance runs shard by shard (conn is None)
+    shard_map = db.get_shard_map()
+    if shard_map is None:
+        return _rebuild(conn, rebuild)
+    total = 0
+    for shard in range(shard_map.count):
+        with shard_map.pool(shard).connection() as shard_conn:
+            total += _rebuild(shard_conn, rebuild)
+    return total
+
+
+def cmd_rebuild_streaks(conn, args):
+    return {"streaks": _on_every_database(conn, rebuild_streaks)}
+
+
+def cmd_rebuild_rollups(conn, args):
+    return {"daily_rows": _on_every_database(conn, rollups.rebuild)}
+
+
+# Commands that span every shard themselves instead of running on one user's shard
+SHARD_WIDE = (cmd_analytics_habits, cmd_analytics_longest, cmd_analytics_streak, cmd_analytics_top,
+              cmd_analytics_search, cmd_rebuild_streaks, cmd_rebuild_rollups)
+
+
+# ---------------------------
+# Parser
+# ---------------------------
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    """Build the argument parser; batch mode passes a class that raises instead of exiting."""
+    parser = parser_class(prog="cli.py", description="Habit tracker batch interface (JSON output).")
+    parser.add_argument("--db", help="database file (default: %(default)s)", default=db.DATABASE_URL)
+    commands = parser.add_subparsers(dest="command", required=True, parser_class=parser_class)
+
+    p = commands.add_parser("register", help="create a user")
+    p.add_argument("username")
+    p.add_argument("password")
+    p.set_defaults(handler=cmd_register)
+
+    p = commands.add_parser("login", help="start a session and print its token")
+    p.add_argument("username")
+    p.add_argument("password")
+    p.add_argument("--ttl", type=int, default=sessions.DEFAULT_TTL, help="session lifetime in seconds")
+    p.set_defaults(handler=cmd_login)
+
+    p = commands.add_parser("logout", help="end a session")
+    p.add_argument("--token", required=True)
+    p.set_defaults(handler=cmd_logout)
+
+    p = commands.add_parser("add-habit", help="add a habit for a user")
+    p.add_argument("--token", help="session token (instead of --username/--user-id)")
+    p.add_argument("--username")
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--name", required=True)
+    p.add_argument("--description", default="")
+    p.add_argument("--periodicity", choices=tracker.PERIODICITIES, default="daily")
+    p.set_defaults(handler=cmd_add_habit)
+
+    p = commands.add_parser("log", help="log a habit completion")
+    p.add_argument("--token", help="session token (instead of --username/--user-id)")
+    p.add_argument("--username")
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--habit-id", type=int, required=True)
+    p.add_argument("--at", help="completion time, ISO-8601 (default: now)")
+    p.set_defaults(handler=cmd_log)
+
+    p = commands.add_parser("list", help="list a user's habits")
+    p.add_argument("--token", help="session token (instead of --username/--password)")
+    p.add_argument("--username")
+    p.add_argument("--password")
+    p.add_argument("--page-size", type=int, help="return one page of this many habits plus a 'next' token")
+    p.add_argument("--after", help="'next' token of the previous page")
+    p.add_argument("--stream", action="store_true", help="write every page as its own JSON line")
+    p.add_argument("--active", choices=("Yes", "No"), help="only active (Yes) or inactive (No) habits")
+    p.add_argument("--periodicity", choices=tracker.PERIODICITIES)
+    p.set_defaults(handler=cmd_list)
+
+    analytics = commands.add_parser("analytics", help="run an analytics query")
+    queries = analytics.add_subparsers(dest="query", required=True, parser_class=parser_class)
+
+    p = queries.add_parser("habits", help="list tracked habit names")
+    p.add_argument("--periodicity", choices=tracker.PERIODICITIES)
+    p.set_defaults(handler=cmd_analytics_habits)
+
+    p = queries.add_parser("longest", help="habit with the highest streak count")
+    p.set_defaults(handler=cmd_analytics_longest)
+
+    p = queries.add_parser("streak", help="streak count of one habit")
+    p.add_argument("name")
+    p.set_defaults(handler=cmd_analytics_streak)
+
+    p = queries.add_parser("top", help="top-K habits by a streak metric")
+    p.add_argument("-k", type=int, default=10)
+    p.add_argument("--user-id", type=int)
+    p.add_argument("--periodicity", choices=tracker.PERIODICITIES)
+    p.add_argument("--by", choices=analyze.STREAK_METRICS, default="count")
+    p.set_defaults(handler=cmd_analytics_top)
+
+    p = queries.add_parser("search", help="find habits by words in their name or description")
+    p.add_argument("query")
+    p.add_argument("--limit", type=int, default=analyze.SEARCH_LIMIT)
+    p.add_argument("--user-id", type=int)
+    p.set_defaults(handler=cmd_analytics_search)
+
+    p = commands.add_parser("ingest", help="bulk-load completions from a CSV file")
+    ingest.build_parser(p)
+    p.set_defaults(handler=cmd_ingest)
+
+    p = commands.add_parser("rebuild-streaks", help="recompute streaks from the completion log")
+    p.set_defaults(handler=cmd_rebuild_streaks)
+
+    p = commands.add_parser("rebuild-rollups", help="recompute the daily/weekly completion rollups")
+    p.set_defaults(handler=cmd_rebuild_rollups)
+
+    p = commands.add_parser("batch", help="run commands from a file, one per line")
+    p.add_argument("file", nargs="?", default="-", help="commands file ('-' for stdin, the default)")
+    p.add_argument("--stop-on-error", action="store_true", help="stop at the first failing command")
+    p.set_defaults(handler=None)
+
+    return parser
+
+
+# ---------------------------
+# Execution
+# ---------------------------
+
+def connect(conn, args):
+    """
+    Return the connection a command runs on, as a context manager.
+
+    In single-file mode that is ``conn``. In sharded mode it is a connection
+    to the shard of the command's user, found from ``--user-id``, the prefix
+    of ``--token`` or ``--username`` like main.py does (None for SHARD_WIDE
+    commands).
+
+    Raises:
+        shards.ShardRoutingError: In sharded mode, if the command names no user
+            (e.g. ``ingest``, whose events may belong to any shard).
+    """
+    if db.get_shard_map() is None:
+        return contextlib.nullcontext(conn)
+    if args.handler in SHARD_WIDE:
+        return contextlib.nullcontext()
+    if args.handler is cmd_register:
+        return db.get_connection(username=args.username, claim=True)
+    user_id = getattr(args, "user_id", None)
+    if getattr(args, "token", None):
+        user_id = sessions.token_user_id(args.token)
+    return db.get_connection(username=getattr(args, "username", None), user_id=user_id)
+
+
+def execute(conn, args) -> dict:
+    """
+    Run one parsed command and wrap its outcome for JSON output.
+
+    Returns:
+        dict: {"ok": True, "result": ...} or {"ok": False, "error": ..., "message": ...}.
+    """
+    try:
+        return {"ok": True, "result": args.handler(conn, args)}
+    except COMMAND_ERRORS as e:
+        if conn is not None:
+            conn.rollback()
+        return {"ok": False, "error": type(e).__name__, "message": str(e)}
+
+
+def emit(conn, args, out=sys.stdout, **fields) -> dict:
+    """
+    Run one parsed command and write its outcome to ``out`` as JSON.
+
+    Streaming commands (``list --stream``) return an iterator of results; each
+    one is written as its own line with a "page" number as soon as it is
+    fetched, and an error part-way through is written as a final line.
+
+    Args:
+        fields: Extra keys to put at the front of every line (e.g. the batch line number).
+
+    Returns:
+        dict: The last outcome written.
+    """
+    outcome = execute(conn, args)
+    if not (outcome["ok"] and isinstance(outcome["result"], Iterator)):
+        out.write(json.dumps({**fields, **outcome}, default=str) + "\n")
+        return outcome
+
+    try:
+        for page, result in enumerate(outcome["result"], start=1):
+            outcome = {"ok": True, "page": page, "result": result}
+            out.write(json.dumps({**fields, **outcome}, default=str) + "\n")
+    except COMMAND_ERRORS as e:
+        if conn is not None:
+            conn.rollback()
+        outcome = {"ok": False, "error": type(e).__name__, "message": str(e)}
+        out.write(json.dumps({**fields, **outcome}, default=str) + "\n")
+    return outcome
+
+
+def run_command(conn, args, out=sys.stdout, **fields) -> dict:
+    """Route one parsed command to its connection (see ``connect``) and ``emit`` it."""
+    try:
+        routed = connect(conn, args)
+    except COMMAND_ERRORS as e:
+        outcome = {"ok": False, "error": type(e).__name__, "message": str(e)}
+        out.write(json.dumps({**fields, **outcome}) + "\n")
+        return outcome
+    with routed as command_conn:
+        return emit(command_conn, args, out, **fields)
+
+
+def run_batch(conn, lines, out=sys.stdout, stop_on_error=False) -> int:
+    """
+    Run commands read from ``lines`` over a single connection (in sharded
+    mode ``conn`` is None and each command uses its user's shard).
+
+    Blank lines and lines starting with '#' are skipped. Each command writes one
+    JSON line to ``out`` including its line number. After a successful ``login``,
+    commands given neither ``--token`` nor ``--username`` act in that session.
+
+    Returns:
+        int: The number of failed commands.
+    """
+    parser = build_parser(_Parser)
+    failures = 0
+    token = None
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(line))
+            if args.handler is None:
+                raise CommandError("batch cannot be nested")
+            if getattr(args, "token", "") is None and args.username is None:
+                args.token = token
+            outcome = run_command(conn, args, out, line=number)
+            if args.handler is cmd_login and outcome["ok"]:
+                token = outcome["result"]["token"]
+        except (CommandError, ValueError) as e:
+            outcome = {"ok": False, "error": "UsageError", "message": str(e)}
+            out.write(json.dumps({"line": number, **outcome}) + "\n")
+        if not outcome["ok"]:
+            failures += 1
+            if stop_on_error:
+                break
+    out.flush()
+    return failures
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    db.DATABASE_URL = args.db
+    db.ensure_schema()
+
+    # One connection for the whole run; in sharded mode each command checks out its user's shard
+    single_file = db.get_shard_map() is None
+    with db.get_connection() if single_file else contextlib.nullcontext() as conn:
+        if args.command == "batch":
+            handle = sys.stdin if args.file == "-" else open(args.file)
+            try:
+                failures = run_batch(conn, handle, stop_on_error=args.stop_on_error)
+            finally:
+                if handle is not sys.stdin:
+                    handle.close()
+            return 1 if failures else 0
+
+        outcome = run_command(conn, args, sys.stdout)
+        return 0 if outcome["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
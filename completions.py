@@ -0,0 +1,244 @@
+"""
+Completion event log and streak maintenance.
+
+Every completion is appended to the ``completions`` table, which is the source
+of truth for a habit's history. The ``streak`` row for the habit keeps a
+running summary of that history (total count, current run, longest run and the
+last period completed) that is updated in constant time per event, so logging
+never rescans old completions. ``rebuild_streaks`` recomputes the summaries
+from the log in a single ordered pass when they need to be repaired.
+
+Periods are integers: for daily habits the number of days since 1970-01-01,
+for weekly habits the number of Monday-based weeks since then. Two completions
+continue a streak when their periods are consecutive.
+
+Days are local calendar days. ``completed_at`` is stored as local wall-clock
+time (timezone-aware timestamps are converted first) and ``completed_on`` is
+its date, so the Python helpers here and the SQL ones (``SQL_DAY_NUMBER``, the
+rollups, bulk ingestion) agree on which day a completion belongs to.
+"""
+import sys
+from datetime import date, datetime
+
+import rollups
+from db import get_connection
+
+# date(1970, 1, 1).toordinal(); day numbers are counted from here
+EPOCH_ORDINAL = 719163
+
+# SQL expression giving the same day number for an ISO 'YYYY-MM-DD' column
+SQL_DAY_NUMBER = "CAST(julianday({column}) - 2440587.5 AS INTEGER)"
+
+
+# ---------------------------
+# Periods and streak state
+# ---------------------------
+
+def day_number(day: date) -> int:
+    """Return the number of days between 1970-01-01 and the given date."""
+    return day.toordinal() - EPOCH_ORDINAL
+
+
+def period_of(day: date, periodicity: str) -> int:
+    """
+    Map a completion date onto the period index used for streaks.
+
+    Args:
+        day (date): The completion date.
+        periodicity (str): "daily" or "weekly".
+
+    Returns:
+        int: The day number for daily habits, the Monday-based week number for weekly ones.
+    """
+    number = day_number(day)
+    if periodicity == "weekly":
+        # 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday
+        return (number + 3) // 7
+    return number
+
+
+def advance(current: int, longest: int, last_period, period: int):
+    """
+    Fold one completion into a streak summary in O(1).
+
+    A completion in the period right after ``last_period`` extends the current
+    run, one in the same period changes nothing and one after a gap starts a
+    new run. Completions older than ``last_period`` (back-filled out of order)
+    leave the summary unchanged; ``rebuild_streaks`` accounts for them.
+
+    Args:
+        current (int): Length of the current run.
+        longest (int): Length of the longest run so far.
+        last_period (int or None): Period of the latest completion, None if none yet.
+        period (int): Period of the new completion.
+
+    Returns:
+        tuple: The updated (current, longest, last_period).
+    """
+    if last_period is None or period > last_period + 1:
+        current = 1
+    elif period == last_period + 1:
+        current += 1
+    else:
+        return current, longest, last_period
+    return current, max(longest, current), period
+
+
+def to_local_datetime(completed_at) -> datetime:
+    """
+    Convert a completion time (datetime, date, ISO string or None for now) to
+    naive local time; timezone-aware values are converted to the local zone.
+
+    Raises:
+        ValueError: If a string is not an ISO-8601 date or time.
+    """
+    if completed_at is None:
+        return datetime.now()
+    if isinstance(completed_at, date) and not isinstance(completed_at, datetime):
+        return datetime(completed_at.year, completed_at.month, completed_at.day)
+    if not isinstance(completed_at, datetime):
+        completed_at = datetime.fromisoformat(str(completed_at))
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone().replace(tzinfo=None)
+    return completed_at
+
+
+# ---------------------------
+# Logging completions
+# ---------------------------
+
+def record_completion(cursor, user_id: int, habit_id: int, periodicity: str, completed_at=None) -> dict:
+    """
+    Append a completion event and update the habit's streak summary and its
+    daily/weekly rollups.
+
+    The caller is responsible for checking that the habit belongs to the user
+    and for committing the transaction.
+
+    Args:
+        cursor: The database cursor object.
+        user_id (int): ID of the user who completed the habit.
+        habit_id (int): ID of the completed habit.
+        periodicity (str): The habit's periodicity ("daily" or "weekly").
+        completed_at (datetime, date or str, optional): When it was completed (defaults to now).
+
+    Returns:
+        dict: The updated summary with keys count, current_streak, longest_streak and completed_on.
+    """
+    completed_at = to_local_datetime(completed_at)
+    completed_on = completed_at.date()
+    period = period_of(completed_on, periodicity)
+
+    cursor.execute("""
+        INSERT INTO completions (habit_id, user_id, completed_at, completed_on)
+        VALUES (?, ?, ?, ?)
+    """, (habit_id, user_id, completed_at.strftime('%Y-%m-%d %H:%M:%S'), completed_on.isoformat()))
+    rollups.record(cursor, habit_id, user_id, completed_on)
+
+    cursor.execute("""
+        SELECT count, current_streak, longest_streak, last_period
+        FROM streak
+        WHERE habit_id = ? AND user_id = ?
+    """, (habit_id, user_id))
+    streak = cursor.fetchone()
+
+    if streak:
+        count = (streak[0] or 0) + 1
+        current, longest, last_period = advance(streak[1] or 0, streak[2] or 0, streak[3], period)
+        # Keep the latest completion date when an older event is back-filled
+        last_date = completed_on.isoformat() if last_period == period else None
+        cursor.execute("""
+            UPDATE streak
+            SET count = ?, current_streak = ?, longest_streak = ?, last_period = ?,
+                last_completed_date = COALESCE(?, last_completed_date)
+            WHERE habit_id = ? AND user_id = ?
+        """, (count, current, longest, last_period, last_date, habit_id, user_id))
+    else:
+        count, current, longest = 1, 1, 1
+        cursor.execute("""
+            INSERT INTO streak (habit_id, user_id, count, current_streak, longest_streak,
+                                last_period, last_completed_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (habit_id, user_id, count, current, longest, period, completed_on.isoformat()))
+
+    return {
+        "count": count,
+        "current_streak": current,
+        "longest_streak": longest,
+        "completed_on": completed_on.isoformat(),
+    }
+
+
+# ---------------------------
+# Rebuilding from the log
+# ---------------------------
+
+def rebuild_streaks(conn) -> int:
+    """
+    Recompute every streak summary from the completion log in one pass.
+
+    Reads the log ordered by (habit_id, completed_on), which the
+    idx_completions_habit_day index provides without sorting, and folds each
+    habit's events with ``advance``. Streak rows for habits without any logged
+    completions are left untouched.
+
+    Args:
+        conn: An open database connection.
+
+    Returns:
+        int: The number of streak rows written.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.habit_id, c.user_id, h.periodicity, c.completed_on, c.completed_at
+        FROM completions c
+        JOIN habits h ON h.habit_id = c.habit_id
+        ORDER BY c.habit_id, c.completed_on
+    """)
+
+    summaries = []
+    key = None
+    for habit_id, user_id, periodicity, completed_on, completed_at in cursor:
+        if (habit_id, user_id) != key:
+            if key is not None:
+                summaries.append(state)
+            key = (habit_id, user_id)
+            # habit_id, user_id, count, current, longest, last_period, last date, last timestamp
+            state = [habit_id, user_id, 0, 0, 0, None, None, None]
+        period = period_of(date.fromisoformat(completed_on), periodicity)
+        state[2] += 1
+        state[3], state[4], state[5] = advance(state[3], state[4], state[5], period)
+        state[6] = completed_on
+        state[7] = max(state[7] or completed_at, completed_at)
+    if key is not None:
+        summaries.append(state)
+
+    try:
+        conn.executemany("""
+            INSERT INTO streak (habit_id, user_id, count, current_streak, longest_streak,
+                                last_period, last_completed_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (habit_id, user_id) DO UPDATE SET
+                count = excluded.count,
+                current_streak = excluded.current_streak,
+                longest_streak = excluded.longest_streak,
+                last_period = excluded.last_period,
+                last_completed_date = excluded.last_completed_date
+        """, [summary[:7] for summary in summaries])
+        conn.executemany("UPDATE habits SET last_completed_at = ? WHERE habit_id = ?",
+                         [(summary[7], summary[0]) for summary in summaries])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(summaries)
+
+
+if __name__ == "__main__":
+    # Usage: python completions.py rebuild
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python completions.py rebuild")
+        sys.exit(2)
+    with get_connection() as conn:
+        rebuilt = rebuild_streaks(conn)
+    print(f"✅ Rebuilt {rebuilt} streak(s) from the completion log.")
@@ -0,0 +1,405 @@
+"""
+Deterministic, parallel synthetic data generator.
+
+Creates N users, each with a mix of the predefined habit templates from
+db.PREDEFINED_HABITS, and simulates their completion history:
+
+- every habit has its own adherence rate (how often a due period is done),
+- habits lapse now and then for a few days or weeks before being picked up again,
+- daily habits are done around a preferred hour, weekly habits around a
+  preferred weekday (occasionally twice in a week),
+- some habits have been switched off (is_active = 'No').
+
+The output depends only on the seed, the user count and the date window,
+never on the number of workers: each user's data comes from its own RNG
+and has fixed IDs. Users are split into shards that worker processes
+write to separate SQLite files in bulk transactions. The shards are then
+merged into the target database in order. Streak summaries are computed
+from the generated completions with streak_engine in one vectorized pass per
+shard, so no rebuild is needed afterwards.
+
+Usage:
+    python datagen.py --db synthetic.db --users 12500 --days 365 --seed 1 --workers 8
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+
+import migrations
+import rollups
+import streak_engine
+from completions import EPOCH_ORDINAL, day_number
+from db import PREDEFINED_HABITS
+
+DEFAULT_DAYS = 365
+
+# Users generated per worker task (and per shard file)
+SHARD_USERS = 2000
+
+# Completion patterns
+ADHERENCE = (6.0, 2.5)  # beta distribution parameters, mean ~0.7
+LAPSE_RATE = (0.005, 0.03)  # chance per period that a lapse starts
+LAPSE_PERIODS = {"daily": 7, "weekly": 3}  # mean lapse length in periods
+INACTIVE_SHARE = 0.05
+
+# "HH:MM:00" for every minute of the day
+CLOCK = [f"{minute // 60:02d}:{minute % 60:02d}:00" for minute in range(24 * 60)]
+
+
+# ---------------------------
+# Simulation
+# ---------------------------
+
+def user_rng(seed: int, index: int) -> random.Random:
+    """Return the RNG for the index-th generated user (independent of sharding)."""
+    return random.Random(seed * 1_000_003 + index)
+
+
+def habit_mix(rng: random.Random) -> list:
+    """
+    Pick which predefined templates a user tracks: two to all of them, at least one daily.
+
+    Returns:
+        list of int: Positions in db.PREDEFINED_HABITS, in template order.
+    """
+    daily = [i for i, template in enumerate(PREDEFINED_HABITS) if template[2] == "daily"]
+    chosen = set(rng.sample(range(len(PREDEFINED_HABITS)), rng.randint(2, len(PREDEFINED_HABITS))))
+    if not chosen & set(daily):
+        chosen.add(rng.choice(daily))
+    return sorted(chosen)
+
+
+def simulate_habit(rng: random.Random, periodicity: str, first_day: int, last_day: int) -> list:
+    """
+    Simulate one habit's completions between two day numbers (inclusive).
+
+    Args:
+        rng: The owning user's RNG.
+        periodicity (str): "daily" or "weekly".
+        first_day (int): Day number (days since 1970-01-01) the habit was created.
+        last_day (int): Last simulated day.
+
+    Returns:
+        list of tuple: (day number, "HH:MM:SS") in chronological order.
+    """
+    adherence = rng.betavariate(*ADHERENCE)
+    lapse_rate = rng.uniform(*LAPSE_RATE)
+    lapse_scale = 1 / LAPSE_PERIODS[periodicity]
+    # Minute of the day around the preferred hour (+/- 90 minutes)
+    base_minute = rng.randrange(6, 22) * 60 - 90
+    random_ = rng.random
+
+    events = []
+    if periodicity == "daily":
+        day, step = first_day, 1
+    else:
+        # Monday of the creation week, then the preferred weekday each week
+        weekday = rng.randrange(7)
+        day, step = first_day - (first_day + 3) % 7, 7
+
+    while day <= last_day:
+        if random_() < lapse_rate:
+            # Skip a few periods, then pick the habit up again
+            day += step * (1 + int(rng.expovariate(lapse_scale)))
+            continue
+        if random_() < adherence:
+            if step == 1:
+                when = day
+            else:
+                # Mostly on the preferred weekday, sometimes a day early or late
+                shift = random_()
+                when = day + min(6, max(0, weekday - (shift < 0.1) + (shift > 0.9)))
+            if first_day <= when <= last_day:
+                events.append((when, CLOCK[base_minute + int(random_() * 180)]))
+                # Weekly habits are occasionally done twice in one week
+                if step == 7 and random_() < 0.1 and when < min(day + 6, last_day):
+                    events.append((when + 1, CLOCK[base_minute + int(random_() * 180)]))
+        day += step
+    return events
+
+
+def streak_rows(completions: list, days: list, weekly_habits: set) -> list:
+    """
+    Summarise generated completions as the streak table stores them.
+
+    Args:
+        completions (list of tuple): (habit_id, user_id, completed_at, completed_on),
+            chronological per habit.
+        days (list of int): Day number of each completion.
+        weekly_habits (set of int): IDs of the weekly habits.
+
+    Returns:
+        list of tuple: (habit_id, user_id, count, last_completed_date, current_streak,
+        longest_streak, last_period) for every habit with completions, by habit ID.
+    """
+    if not completions:
+        return []
+    habit_ids = np.fromiter((row[0] for row in completions), dtype=np.int64, count=len(completions))
+    weekly = np.isin(habit_ids, np.fromiter(weekly_habits, dtype=np.int64, count=len(weekly_habits)))
+    summary = streak_engine.compute_streaks_from_days(habit_ids, days, weekly)
+    # Both sorted by habit ID; the first occurrence from the end is each habit's latest completion
+    ids, from_end, counts = np.unique(habit_ids[::-1], return_index=True, return_counts=True)
+    latest = [completions[i] for i in (len(completions) - 1 - from_end).tolist()]
+    return [(habit_id, row[1], count, row[3], current, longest, last_period)
+            for habit_id, row, count, current, longest, last_period
+            in zip(ids.tolist(), latest, counts.tolist(), summary["current"].tolist(),
+                   summary["longest"].tolist(), summary["last_period"].tolist())]
+
+
+def _iso(day: int, cache: dict) -> str:
+    text = cache.get(day)
+    if text is None:
+        text = cache[day] = date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+    return text
+
+
+# ---------------------------
+# Shards
+# ---------------------------
+
+def generate_shard(task: dict) -> dict:
+    """
+    Generate one range of users into its own SQLite file (runs in a worker process).
+
+    Args:
+        task (dict): path, first/last user index, seed, first/last day, prefix and
+            the user/habit ID offsets of the target database.
+
+    Returns:
+        dict: path plus the users, habits and completions written.
+    """
+    users, habits, completions, days, weekly = [], [], [], [], set()
+    dates = {}
+    per_user = len(PREDEFINED_HABITS)
+
+    for index in range(task["first_user"], task["last_user"] + 1):
+        rng = user_rng(task["seed"], index)
+        user_id = task["user_offset"] + index
+        users.append((user_id, f"{task['prefix']}{index}", "password"))
+
+        for position in habit_mix(rng):
+            name, description, periodicity = PREDEFINED_HABITS[position]
+            habit_id = task["habit_offset"] + (index - 1) * per_user + position + 1
+            # Habits were started at some point in the first fifth of the window
+            span = task["last_day"] - task["first_day"]
+            created = task["first_day"] + rng.randint(0, span // 5)
+            events = simulate_habit(rng, periodicity, created, task["last_day"])
+            is_active = "No" if rng.random() < INACTIVE_SHARE else "Yes"
+
+            last_at = None
+            for day, clock in events:
+                completed_on = _iso(day, dates)
+                last_at = f"{completed_on} {clock}"
+                completions.append((habit_id, user_id, last_at, completed_on))
+                days.append(day)
+            habits.append((habit_id, name, description, periodicity, f"{_iso(created, dates)} 08:00:00",
+                           last_at, user_id, is_active))
+            if periodicity == "weekly":
+                weekly.add(habit_id)
+
+    streaks = streak_rows(completions, days, weekly)
+
+    conn = sqlite3.connect(task["path"])
+    try:
+        # Scratch file: durability does not matter, it is merged and deleted
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        migrations.migrate(conn)
+        # The habit search index is filled when the shard is merged into the target
+        migrations.drop_habit_search_index(conn)
+        with conn:
+            conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, ?)", users)
+            conn.executemany("""
+                INSERT INTO habits (habit_id, name, description, periodicity, created_at, last_completed_at,
+                                    user_id, is_active)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, habits)
+            conn.executemany("""
+                INSERT INTO completions (habit_id, user_id, completed_at, completed_on) VALUES (?, ?, ?, ?)
+            """, completions)
+            conn.executemany("""
+                INSERT INTO streak (habit_id, user_id, count, last_completed_date, current_streak,
+                                    longest_streak, last_period)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, streaks)
+    finally:
+        conn.close()
+    return {"path": task["path"], "users": len(users), "habits": len(habits), "completions": len(completions)}
+
+
+def merge_shard(conn, path: str) -> None:
+    """Copy a shard file's rows into the target database in one transaction."""
+    conn.execute("ATTACH DATABASE ? AS shard", (path,))
+    try:
+        with conn:
+            conn.execute("INSERT INTO users (user_id, username, password) "
+                         "SELECT user_id, username, password FROM shard.users")
+            conn.execute("""
+                INSERT INTO habits (habit_id, name, description, periodicity, created_at, last_completed_at,
+                                    user_id, is_active)
+                SELECT habit_id, name, description, periodicity, created_at, last_completed_at, user_id, is_active
+                FROM shard.habits
+            """)
+            conn.execute("""
+                INSERT INTO completions (habit_id, user_id, completed_at, completed_on)
+                SELECT habit_id, user_id, completed_at, completed_on FROM shard.completions
+                ORDER BY completion_id
+            """)
+            conn.execute("""
+                INSERT INTO streak (habit_id, user_id, count, last_completed_date, current_streak,
+                                    longest_streak, last_period)
+                SELECT habit_id, user_id, count, last_completed_date, current_streak, longest_streak, last_period
+                FROM shard.streak
+            """)
+            rollups.add_completions(conn.cursor(), source="shard.completions")
+    finally:
+        conn.execute("DETACH DATABASE shard")
+
+
+# ---------------------------
+# Entry points
+# ---------------------------
+
+def generate(database: str, users: int, days: int = DEFAULT_DAYS, seed: int = 0, workers: int | None = None,
+             prefix: str = "user", end: date | None = None, shard_users: int = SHARD_USERS) -> dict:
+    """
+    Generate synthetic users, habits and completions into a database.
+
+    New rows get IDs above the existing ones, so the target may already hold
+    data as long as the generated usernames (``prefix`` + index) are free.
+
+    Args:
+        database (str): Target database file (created and migrated if needed).
+        users (int): Number of users to generate.
+        days (int): Length of the simulated history.
+        seed (int): Seed; the same seed, users and window give the same data.
+        workers (int, optional): Worker processes (default: CPU count; 1 runs in-process).
+        prefix (str): Username prefix.
+        end (date, optional): Last simulated day (default: today).
+        shard_users (int): Users per shard file.
+
+    Returns:
+        dict: users, habits, completions, shards and seconds.
+    """
+    started = time.perf_counter()
+    last_day = day_number(end or date.today())
+    first_day = last_day - days + 1
+
+    conn = sqlite3.connect(database)
+    try:
+        migrations.migrate(conn)
+        user_offset = conn.execute("SELECT COALESCE(MAX(user_id), 0) FROM users").fetchone()[0]
+        habit_offset = conn.execute("SELECT COALESCE(MAX(habit_id), 0) FROM habits").fetchone()[0]
+
+        workdir = tempfile.mkdtemp(prefix="datagen-", dir=os.path.dirname(os.path.abspath(database)))
+        tasks = [
+            {
+                "path": os.path.join(workdir, f"shard-{number:05d}.db"),
+                "first_user": first, "last_user": min(users, first + shard_users - 1),
+                "seed": seed, "first_day": first_day, "last_day": last_day, "prefix": prefix,
+                "user_offset": user_offset, "habit_offset": habit_offset,
+            }
+            for number, first in enumerate(range(1, users + 1, shard_users))
+        ]
+
+        totals = {"users": 0, "habits": 0, "completions": 0, "shards": len(tasks)}
+        pool = None
+        try:
+            conn.execute("PRAGMA cache_size = -262144")
+            if workers == 1 or len(tasks) <= 1:
+                results = map(generate_shard, tasks)
+            else:
+                pool = ProcessPoolExecutor(max_workers=workers)
+                results = pool.map(generate_shard, tasks)
+            # Shards are merged in order as they finish, while later ones are still generating
+            for result in results:
+                merge_shard(conn, result["path"])
+                os.remove(result["path"])
+                for key in ("users", "habits", "completions"):
+                    totals[key] += result[key]
+        finally:
+            # On failure, stop the workers before their shard files are removed
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        conn.close()
+
+    totals["seconds"] = round(time.perf_counter() - started, 2)
+    return totals
+
+
+def simulate_user_history(conn, user_id: int, days: int = 28, seed: int = 0, end: date | None = None) -> int:
+    """
+    Replace the completion history of an existing user's habits with a simulated one.
+
+    Used to give the demo database (db.py's test user) a realistic history.
+
+    Returns:
+        int: The number of completions written.
+    """
+    rng = user_rng(seed, user_id)
+    last_day = day_number(end or date.today())
+    first_day = last_day - days + 1
+    dates = {}
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT habit_id, periodicity FROM habits WHERE user_id = ? ORDER BY habit_id", (user_id,))
+    habits = cursor.fetchall()
+
+    completions, days = [], []
+    for habit_id, periodicity in habits:
+        for day, clock in simulate_habit(rng, periodicity, first_day, last_day):
+            completions.append((habit_id, user_id, f"{_iso(day, dates)} {clock}", _iso(day, dates)))
+            days.append(day)
+    streaks = streak_rows(completions, days, {habit_id for habit_id, periodicity in habits
+                                              if periodicity == "weekly"})
+
+    cursor.executemany("DELETE FROM completions WHERE habit_id = ? AND user_id = ?",
+                       [(habit_id, user_id) for habit_id, _ in habits])
+    cursor.executemany("DELETE FROM streak WHERE habit_id = ? AND user_id = ?",
+                       [(habit_id, user_id) for habit_id, _ in habits])
+    cursor.executemany("""
+        INSERT INTO completions (habit_id, user_id, completed_at, completed_on) VALUES (?, ?, ?, ?)
+    """, completions)
+    cursor.executemany("""
+        INSERT INTO streak (habit_id, user_id, count, last_completed_date, current_streak,
+                            longest_streak, last_period)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, streaks)
+    cursor.executemany("UPDATE habits SET last_completed_at = ? WHERE habit_id = ?",
+                       [(streak[3], streak[0]) for streak in streaks])
+    conn.commit()
+    rollups.rebuild(conn, [habit_id for habit_id, _ in habits])
+    return len(completions)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic habit tracker database.")
+    parser.add_argument("--db", required=True, help="target database file")
+    parser.add_argument("--users", type=int, default=1000, help="users to generate (~500 completions per user and year)")
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="days of history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--prefix", default="user", help="username prefix")
+    parser.add_argument("--end", type=lambda s: datetime.strptime(s, "%Y-%m-%d").date(),
+                        help="last simulated day, YYYY-MM-DD (default: today; fix it for reproducible output)")
+    args = parser.parse_args(argv)
+
+    stats = generate(args.db, args.users, args.days, args.seed, args.workers, args.prefix, args.end)
+    print(f"✅ Generated {stats['users']:,} users, {stats['habits']:,} habits and "
+          f"{stats['completions']:,} completions in {stats['seconds']}s ({stats['shards']} shards).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,85 +1,332 @@
 import sqlite3
 from datetime import datetime
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from itertools import chain
+
+import instrument
+import migrations
+import profiles
+import shards
+from pool import ConnectionPool
 
 # Path to the SQLite database file
 DATABASE_URL = "habit_tracker.db"
 
+# Maximum number of pooled connections (override with HABIT_TRACKER_POOL_SIZE)
+POOL_SIZE = int(os.environ.get("HABIT_TRACKER_POOL_SIZE", "5"))
+
+# Sharded storage (see shards.py): directory of the shard files, or None to use
+# the single DATABASE_URL file, and the shard count for a new layout
+SHARD_DIR = os.environ.get("HABIT_TRACKER_SHARD_DIR") or None
+SHARD_COUNT = int(os.environ.get("HABIT_TRACKER_SHARDS", str(shards.DEFAULT_SHARD_COUNT)))
+
+# Storage profile (see profiles.py) applied to every pooled connection
+PROFILE = profiles.check(os.environ.get("HABIT_TRACKER_PROFILE") or "default")
+
+# Write transactions that find the database locked are retried this many times
+# in all, waiting a random time of up to RETRY_BASE_DELAY * 2**n (capped at
+# RETRY_MAX_DELAY) seconds before the n-th retry
+RETRY_ATTEMPTS = int(os.environ.get("HABIT_TRACKER_RETRY_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = 0.01
+RETRY_MAX_DELAY = 1.0
+
+# Processes that sharded analytics fan out to (see scatter.py); 1 queries shards in turn
+ANALYTICS_WORKERS = int(os.environ.get("HABIT_TRACKER_ANALYTICS_WORKERS", "1"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_shard_map = None
 
-def get_connection():
+
+def _pool_options():
+    # Settings shared by every pool this module opens
+    return {"init": profiles.initializer(PROFILE), **instrument.connect_kwargs()}
+
+
+def get_pool():
     """
-    Establishes and returns a connection to the SQLite database.
-    Includes debugging statements to print the current working directory
-    and confirm successful connection.
+    Returns the process-wide connection pool for DATABASE_URL, creating it on
+    first use. If DATABASE_URL has been changed since, the old pool is closed
+    and a new one is opened for the new path.
 
     Returns:
-        sqlite3.Connection: A connection object to the database.
+        ConnectionPool: The shared connection pool.
     """
-    try:
-        # Debugging: Display the current working directory
-        print("Current working directory:", os.getcwd())
+    global _pool
+    pool = _pool
+    if pool is not None and pool.database == DATABASE_URL:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE_URL:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_URL, size=POOL_SIZE, **_pool_options())
+        return _pool
 
-        # Attempt to connect to the database
-        conn = sqlite3.connect(DATABASE_URL)
-        print(f"Connected to database: {DATABASE_URL}")
-        return conn
-    except Exception as e:
-        # Handle connection errors
-        print(f"Error connecting to database: {e}")
+
+def configure_pool(size=None, timeout=None):
+    """
+    Replaces the shared connection pool with one using the given settings.
+
+    Args:
+        size (int, optional): Maximum number of open connections.
+        timeout (float, optional): Seconds to wait for a free connection.
+
+    Returns:
+        ConnectionPool: The new pool.
+    """
+    global _pool, POOL_SIZE
+    with _pool_lock:
+        if size is not None:
+            POOL_SIZE = size
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DATABASE_URL, size=POOL_SIZE, **_pool_options())
+        if timeout is not None:
+            _pool.timeout = timeout
+        return _pool
+
+
+def configure_profile(name):
+    """
+    Switches the storage profile (see profiles.py) for connections opened from now on.
+
+    The shared pools are closed, so every connection checked out afterwards is
+    new and has the profile's PRAGMAs applied.
+
+    Args:
+        name (str): Profile name, e.g. "balanced".
+
+    Raises:
+        ValueError: If there is no such profile.
+    """
+    global PROFILE
+    profiles.check(name)
+    close_pool()
+    PROFILE = name
+
+
+def close_pool():
+    """Closes every pooled connection, including the shard pools (e.g. before the process exits)."""
+    global _pool, _shard_map
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _shard_map is not None:
+            _shard_map.close()
+            _shard_map = None
+
+
+def get_shard_map():
+    """
+    Returns the shard layout when sharded storage is enabled (SHARD_DIR is set),
+    opening it on first use, or None in single-file mode.
+
+    Returns:
+        shards.ShardMap or None: The shared shard map.
+    """
+    global _shard_map
+    if SHARD_DIR is None:
+        return None
+    shard_map = _shard_map
+    if shard_map is not None and shard_map.root == SHARD_DIR:
+        return shard_map
+    with _pool_lock:
+        if _shard_map is None or _shard_map.root != SHARD_DIR:
+            if _shard_map is not None:
+                _shard_map.close()
+            _shard_map = shards.ShardMap(SHARD_DIR, SHARD_COUNT, pool_size=POOL_SIZE, workers=ANALYTICS_WORKERS,
+                                         **_pool_options())
+        return _shard_map
+
+
+def configure_shards(root=None, count=None, workers=None):
+    """
+    Switches between single-file and sharded storage.
+
+    Args:
+        root (str, optional): Directory of the shard layout; None returns to DATABASE_URL.
+        count (int, optional): Shard count for a new layout (or to add shards).
+        workers (int, optional): Processes for cross-shard analytics.
+
+    Returns:
+        shards.ShardMap or None: The new shard map.
+    """
+    global SHARD_DIR, SHARD_COUNT, ANALYTICS_WORKERS, _shard_map
+    with _pool_lock:
+        if _shard_map is not None:
+            _shard_map.close()
+            _shard_map = None
+        SHARD_DIR = root
+        if count is not None:
+            SHARD_COUNT = count
+        if workers is not None:
+            ANALYTICS_WORKERS = workers
+    return get_shard_map()
+
+
+def get_connection(username=None, user_id=None, claim=False):
+    """
+    Checks out a connection to the SQLite database from the shared pool.
+
+    The returned object behaves like a sqlite3.Connection. Used as a context
+    manager it commits on success and rolls back on error, and leaving the
+    block hands the connection back to the pool instead of closing it.
+    Calls made from a thread that already holds a connection reuse it.
+
+    In sharded mode the connection is to the shard of the given user, so
+    callers acting for a user pass its ID (cheapest) or username; in
+    single-file mode these arguments are ignored.
+
+    Args:
+        username (str, optional): Route to the shard of this username.
+        user_id (int, optional): Route to the shard of this user ID.
+        claim (bool): Record a new username's shard in the directory (registration).
+
+    Returns:
+        PooledConnection: A pooled connection to the database.
+
+    Raises:
+        shards.ShardRoutingError: In sharded mode, if no user is given.
+    """
+    shard_map = get_shard_map()
+    if shard_map is not None:
+        return shard_map.connection(username, user_id, claim)
+    return get_pool().connection()
+
+
+# ---------------------------
+# Write transactions and lock retries
+# ---------------------------
+
+def begin_write(conn):
+    """
+    Starts a write transaction with BEGIN IMMEDIATE, unless one is already open.
+
+    Taking SQLite's write lock up front makes the reads that precede a write
+    (ownership checks, streak lookups) part of the same transaction, and it is
+    the only point where a busy database can make the transaction wait, so it
+    never fails half-way because another process got the lock first.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+@contextmanager
+def transaction(conn):
+    """
+    Runs the block as one write transaction on an already open connection:
+    ``begin_write`` first, then a commit, or a rollback if the block raises.
+    For code that holds a connection for longer than one write (cli.py's
+    batches, bulk ingestion), so each write can be retried on its own::
+
+        for attempt in retrying():
+            with attempt, transaction(conn):
+                ...
+    """
+    begin_write(conn)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
         raise
+    conn.commit()
+
+
+def is_lock_error(exc):
+    """Returns True for the errors SQLite raises when another connection holds the lock."""
+    return isinstance(exc, sqlite3.OperationalError) and (
+        "database is locked" in str(exc) or "database is busy" in str(exc))
+
+
+# Counters for the lock retries made by this process
+RETRY_STATS = {"retries": 0, "gave_up": 0}
+
+
+class _Attempt:
+    # One try of a retried block; swallows a lock error unless it is the last try
+    def __init__(self, number, last):
+        self.number = number
+        self.last = last
+        self.error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is None or not is_lock_error(exc):
+            return False
+        if self.last:
+            RETRY_STATS["gave_up"] += 1
+            return False
+        self.error = exc
+        return True
+
+
+def retrying(attempts=None):
+    """
+    Retries a block of work that failed because the database was locked, with
+    jittered exponential backoff between tries::
+
+        for attempt in retrying():
+            with attempt, get_connection() as conn:
+                begin_write(conn)
+                ...
+
+    The transaction is rolled back before each retry (by the connection's
+    ``with`` block), so the block must be safe to run again from the start.
+    Other errors, and a lock error on the last try, propagate.
+
+    Args:
+        attempts (int, optional): Tries in all (default: RETRY_ATTEMPTS).
+    """
+    attempts = attempts or RETRY_ATTEMPTS
+    for number in range(1, attempts + 1):
+        attempt = _Attempt(number, number == attempts)
+        yield attempt
+        if attempt.error is None:
+            return
+        RETRY_STATS["retries"] += 1
+        # "Full jitter": concurrent retries spread out instead of colliding again
+        time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (number - 1))))
+
+
+def ensure_schema():
+    """
+    Brings the database schema up to date by running any pending migrations.
+    When the schema is already current this only reads PRAGMA user_version,
+    so it is safe to call on every startup. In sharded mode every shard is
+    migrated.
+
+    Returns:
+        list: The migration versions that were applied (empty if none).
+    """
+    shard_map = get_shard_map()
+    if shard_map is not None:
+        return sorted(set(chain.from_iterable(shard_map.migrate().values())))
+    with get_connection() as conn:
+        return migrations.migrate(conn)
 
 
 def create_tables():
     """
-    Creates the necessary tables in the database if they do not already exist:
+    Creates or upgrades the database schema to the latest version:
     - users: stores registered user credentials
     - habits: stores user habits with periodicity and timestamps
     - streak: tracks completion streaks for each habit
+    plus the indexes defined in migrations.py.
     """
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-
-            # Create 'users' table to store usernames and passwords
-            cursor.execute(''' 
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT NOT NULL UNIQUE,
-                    password TEXT NOT NULL
-                )
-            ''')
-
-            # Create 'habits' table to store habits and their metadata
-            cursor.execute(''' 
-                CREATE TABLE IF NOT EXISTS habits (
-                    habit_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    description TEXT,
-                    periodicity TEXT CHECK(periodicity IN ('daily', 'weekly')) NOT NULL,
-                    created_at TEXT NOT NULL,
-                    last_completed_at TEXT,
-                    user_id INTEGER,
-                    is_active TEXT DEFAULT 'Yes',
-                    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Create 'streak' table to track how many times a habit has been completed
-            cursor.execute(''' 
-                CREATE TABLE IF NOT EXISTS streak (
-                    streak_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    habit_id INTEGER NOT NULL,
-                    user_id INTEGER NOT NULL,
-                    count INTEGER DEFAULT 0,
-                    last_completed_date TEXT,
-                    FOREIGN KEY (habit_id) REFERENCES habits(habit_id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            ''')
-
-            # Commit the changes to the database
-            conn.commit()
-            print("Tables created successfully.")
+        applied = ensure_schema()
+        if applied:
+            print(f"Tables created successfully (schema version {migrations.SCHEMA_VERSION}).")
+        else:
+            print(f"Schema already up to date (version {migrations.SCHEMA_VERSION}).")
     except Exception as e:
         print(f"Error creating tables: {e}")
         raise
@@ -98,7 +345,7 @@ def insert_user(username, password):
                      or None if insertion failed.
     """
     try:
-        with get_connection() as conn:
+        with get_connection(username=username, claim=True) as conn:
             cursor = conn.cursor()
 
             # Check if the user already exists
@@ -118,6 +365,16 @@ def insert_user(username, password):
         return None
 
 
+# Predefined habit templates with name, description, and frequency
+PREDEFINED_HABITS = [
+    ("Morning Run", "Jog for 20 minutes in the morning", "daily"),
+    ("Hydration", "Drink 8 glasses of water", "daily"),
+    ("Reading", "Read at least 10 pages of a book", "daily"),
+    ("Team Sync", "Attend weekly team meeting", "weekly"),
+    ("Grocery Shopping", "Do weekly grocery shopping", "weekly")
+]
+
+
 def initialize_predefined_habits(user_id):
     """
     Inserts a predefined list of daily and weekly habits for the given user ID.
@@ -125,21 +382,12 @@ def initialize_predefined_habits(user_id):
     Args:
         user_id (int): The ID of the user to assign the predefined habits to.
     """
-    # Predefined habit templates with name, description, and frequency
-    predefined_habits = [
-        ("Morning Run", "Jog for 20 minutes in the morning", "daily"),
-        ("Hydration", "Drink 8 glasses of water", "daily"),
-        ("Reading", "Read at least 10 pages of a book", "daily"),
-        ("Team Sync", "Attend weekly team meeting", "weekly"),
-        ("Grocery Shopping", "Do weekly grocery shopping", "weekly")
-    ]
-
     try:
-        with get_connection() as conn:
+        with get_connection(user_id=user_id) as conn:
             cursor = conn.cursor()
 
             # Loop through and insert each predefined habit
-            for name, description, periodicity in predefined_habits:
+            for name, description, periodicity in PREDEFINED_HABITS:
                 cursor.execute(''' 
                     INSERT INTO habits (name, description, periodicity, created_at, last_completed_at, user_id, is_active) 
                     VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -1,3 +1,21 @@
+"""Domain models for users, habits and streaks.
+
+The models use ``__slots__`` so that loading hundreds of thousands of rows
+costs about as much memory as the equivalent tuples, and each class lists its
+``COLUMNS`` in constructor order. Selecting those columns with the matching
+row factory (``user_row``, ``habit_row``, ``streak_row``) builds the objects
+directly from the cursor with no per-row name lookups::
+
+    cursor = conn.cursor()
+    cursor.row_factory = habit_row
+    cursor.execute(f"SELECT {select_list(Habit)} FROM habits WHERE user_id = ?", (user_id,))
+    habits = cursor.fetchall()   # list of Habit
+
+``tracker.list_habits`` and ``tracker.list_habits_page`` do this when called
+with ``as_objects=True``; ``cli.py list`` reads its habits that way.
+"""
+
+
 class User:
     """Represents a registered user in the habit tracker app.
 
@@ -8,12 +26,20 @@ class User:
         created_at (str, optional): Timestamp when the user account was created.
     """
 
+    __slots__ = ("user_id", "username", "password", "created_at")
+
+    # Columns of the users table, in constructor order (created_at is not stored)
+    COLUMNS = ("user_id", "username", "password")
+
     def __init__(self, user_id, username, password, created_at=None):
         self.user_id = user_id
         self.username = username
         self.password = password
         self.created_at = created_at
 
+    def __repr__(self):
+        return f"User(user_id={self.user_id!r}, username={self.username!r})"
+
 
 class Habit:
     """Represents a habit being tracked by a user.
@@ -29,6 +55,11 @@ class Habit:
         last_completed_at (str, optional): Timestamp of the last completion of the habit.
     """
 
+    __slots__ = ("habit_id", "user_id", "name", "description", "periodicity", "created_at", "is_active",
+                 "last_completed_at")
+
+    COLUMNS = __slots__
+
     def __init__(self, habit_id, user_id, name, description, periodicity, created_at, is_active='Yes',
                  last_completed_at=None):
         self.habit_id = habit_id
@@ -40,6 +71,9 @@ class Habit:
         self.is_active = is_active
         self.last_completed_at = last_completed_at
 
+    def __repr__(self):
+        return f"Habit(habit_id={self.habit_id!r}, name={self.name!r}, periodicity={self.periodicity!r})"
+
 
 class Streak:
     """Tracks a user's streaks for a particular habit (consecutive completions).
@@ -50,11 +84,58 @@ class Streak:
         user_id (int): ID of the user who owns this streak.
         count (int): Number of consecutive successful completions.
         last_completed_date (str): Date when the habit was last completed.
+        current_streak (int): Length of the current run of consecutive periods.
+        longest_streak (int): Length of the longest run so far.
+        last_period (int, optional): Period number of the latest completion.
     """
 
-    def __init__(self, streak_id, habit_id, user_id, count, last_completed_date):
+    __slots__ = ("streak_id", "habit_id", "user_id", "count", "last_completed_date", "current_streak",
+                 "longest_streak", "last_period")
+
+    COLUMNS = __slots__
+
+    def __init__(self, streak_id, habit_id, user_id, count, last_completed_date, current_streak=0,
+                 longest_streak=0, last_period=None):
         self.streak_id = streak_id
         self.habit_id = habit_id
         self.user_id = user_id
         self.count = count
         self.last_completed_date = last_completed_date
+        self.current_streak = current_streak
+        self.longest_streak = longest_streak
+        self.last_period = last_period
+
+    def __repr__(self):
+        return f"Streak(habit_id={self.habit_id!r}, user_id={self.user_id!r}, count={self.count!r})"
+
+
+# ---------------------------
+# Row mapping
+# ---------------------------
+
+def select_list(model, alias=None) -> str:
+    """
+    Return the SELECT column list matching a model's constructor order.
+
+    Args:
+        model: User, Habit or Streak.
+        alias (str, optional): Table alias to qualify the columns with.
+    """
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + column for column in model.COLUMNS)
+
+
+def row_factory(model):
+    """
+    Build a sqlite3 ``row_factory`` that turns each row into a ``model`` instance.
+
+    The row is passed positionally, so the query must select ``select_list(model)``.
+    """
+    def factory(cursor, row):
+        return model(*row)
+    return factory
+
+
+user_row = row_factory(User)
+habit_row = row_factory(Habit)
+streak_row = row_factory(Streak)
@@ -0,0 +1,301 @@
+"""
+Bulk ingestion of habit completions.
+
+Back-fills from wearables and other trackers arrive as millions of
+``(user_id, habit_id, timestamp)`` events. Instead of running the interactive
+``log_completion`` path once per event, ``ingest_completions`` streams them
+into a temporary staging table with ``executemany`` and moves each batch into
+the ``completions`` log with a single ``INSERT ... SELECT`` (and into the
+daily/weekly rollups with one grouped upsert each). Streak summaries and
+``habits.last_completed_at`` are then updated with set-based statements for
+the habits that received events.
+
+Each batch is its own write transaction, started with BEGIN IMMEDIATE and
+retried (``db.retrying``) while another process holds the write lock, so
+parallel ingests and interactive writers take turns instead of failing.
+
+Usage:
+    python ingest.py events.csv [--batch-size N]
+    python ingest.py - < events.csv
+"""
+import argparse
+import csv
+import sys
+import time
+from datetime import date, datetime
+from itertools import islice
+
+import rollups
+from completions import SQL_DAY_NUMBER
+from db import get_connection, retrying, transaction
+
+# Rows per executemany/commit; large batches amortise statement and fsync cost
+DEFAULT_BATCH_SIZE = 100_000
+
+# Page cache (in KiB) used while ingesting, restored afterwards
+INGEST_CACHE_KIB = 256 * 1024
+
+# Normalises the staged timestamp (ISO text or Unix epoch seconds) to local
+# 'YYYY-MM-DD HH:MM:SS', the convention of completions.record_completion: epoch
+# seconds and text with a UTC offset are converted to local time, naive text
+# is taken as local time already
+_NORMALISED_TS = """
+    CASE WHEN typeof(ts) IN ('integer', 'real') THEN datetime(ts, 'unixepoch', 'localtime')
+         WHEN ts GLOB '*[+-][0-9][0-9]:[0-9][0-9]' OR ts GLOB '*[Zz]' THEN datetime(ts, 'localtime')
+         ELSE datetime(ts) END
+"""
+
+_DAY = SQL_DAY_NUMBER.format(column="c.completed_on")
+
+
+# ---------------------------
+# Event sources
+# ---------------------------
+
+def _normalise(batch):
+    """Convert date/datetime timestamps in a batch to ISO strings SQLite understands."""
+    return [
+        (user_id, habit_id, ts.isoformat(" ") if isinstance(ts, datetime) else
+         ts.isoformat() if isinstance(ts, date) else ts)
+        for user_id, habit_id, ts in batch
+    ]
+
+
+def read_events(path):
+    """
+    Stream events from a CSV file with columns user_id, habit_id, timestamp.
+
+    A header row is skipped if present. Timestamps may be ISO-8601 text or Unix
+    epoch seconds.
+
+    Args:
+        path (str): Path to the CSV file, or "-" to read from stdin.
+
+    Yields:
+        tuple: (user_id, habit_id, timestamp) for each row.
+
+    Raises:
+        OSError: If the file cannot be opened.
+        ValueError: At the first row that is not valid CSV or lacks a numeric
+            habit ID or a timestamp.
+    """
+    handle = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        reader = csv.reader(handle)
+        try:
+            for row in reader:
+                if not row or not row[0].strip().isdigit():
+                    continue  # header or blank line
+                user_id, habit_id, ts = int(row[0]), int(row[1]), row[2].strip()
+                try:
+                    ts = float(ts)  # Unix epoch seconds
+                except ValueError:
+                    pass  # ISO-8601 text, normalised by SQLite
+                yield user_id, habit_id, ts
+        except (csv.Error, IndexError, ValueError) as e:
+            raise ValueError(f"{path}, line {reader.line_num}: expected user_id,habit_id,timestamp ({e})") from e
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+# ---------------------------
+# Ingestion
+# ---------------------------
+
+def _prepare(cursor):
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS staged_completions (user_id INTEGER, habit_id INTEGER, ts)")
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS touched_habits (
+            habit_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            added INTEGER NOT NULL,
+            last_at TEXT
+        )
+    """)
+    cursor.execute("DELETE FROM staged_completions")
+    cursor.execute("DELETE FROM touched_habits")
+
+
+def _load_batch(cursor, batch) -> int:
+    """Stage one batch and append its valid events to the log; returns rows inserted."""
+    cursor.executemany("INSERT INTO staged_completions VALUES (?, ?, ?)", batch)
+    cursor.execute("SELECT COALESCE(MAX(completion_id), 0) FROM completions")
+    first_new = cursor.fetchone()[0]
+
+    # Only events for habits that exist and belong to the given user are kept
+    cursor.execute(f"""
+        INSERT INTO completions (habit_id, user_id, completed_at, completed_on)
+        SELECT s.habit_id, s.user_id, s.completed_at, date(s.completed_at)
+        FROM (
+            SELECT habit_id, user_id, {_NORMALISED_TS} AS completed_at
+            FROM staged_completions
+        ) s
+        JOIN habits h ON h.habit_id = s.habit_id AND h.user_id = s.user_id
+        WHERE s.completed_at IS NOT NULL
+        ORDER BY s.habit_id, s.completed_at
+    """)
+    inserted = cursor.rowcount
+
+    # Remember which habits received events (new rows follow first_new in rowid order)
+    cursor.execute("""
+        INSERT INTO touched_habits (habit_id, user_id, added, last_at)
+        SELECT habit_id, user_id, COUNT(*), MAX(completed_at)
+        FROM completions
+        WHERE completion_id > ?
+        GROUP BY habit_id
+        ON CONFLICT (habit_id) DO UPDATE SET
+            added = added + excluded.added,
+            last_at = MAX(last_at, excluded.last_at)
+    """, (first_new,))
+    rollups.add_completions(cursor, "completion_id > ?", (first_new,))
+    cursor.execute("DELETE FROM staged_completions")
+    return inserted
+
+
+def _update_streaks(cursor):
+    """Recompute streak summaries and last completion times for every touched habit."""
+    # Gaps-and-islands over distinct periods: consecutive periods share the
+    # same (period - row_number) value, so each island is one run.
+    cursor.execute(f"""
+        WITH periods AS (
+            SELECT DISTINCT c.habit_id,
+                   CASE h.periodicity WHEN 'weekly' THEN ({_DAY} + 3) / 7 ELSE {_DAY} END AS period
+            FROM completions c
+            JOIN habits h ON h.habit_id = c.habit_id
+            WHERE c.habit_id IN (SELECT habit_id FROM touched_habits)
+        ),
+        islands AS (
+            SELECT habit_id, period,
+                   period - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY period) AS island
+            FROM periods
+        ),
+        runs AS (
+            SELECT habit_id, COUNT(*) AS length, MAX(period) AS end_period
+            FROM islands
+            GROUP BY habit_id, island
+        ),
+        summary AS (
+            SELECT habit_id, MAX(length) AS longest, MAX(end_period) AS last_period
+            FROM runs
+            GROUP BY habit_id
+        )
+        INSERT INTO streak (habit_id, user_id, count, current_streak, longest_streak,
+                            last_period, last_completed_date)
+        SELECT t.habit_id, t.user_id, t.added, r.length, s.longest, s.last_period, date(t.last_at)
+        FROM touched_habits t
+        JOIN summary s ON s.habit_id = t.habit_id
+        JOIN runs r ON r.habit_id = s.habit_id AND r.end_period = s.last_period
+        WHERE true
+        ON CONFLICT (habit_id, user_id) DO UPDATE SET
+            count = COALESCE(count, 0) + excluded.count,
+            current_streak = excluded.current_streak,
+            longest_streak = excluded.longest_streak,
+            last_period = excluded.last_period,
+            last_completed_date = MAX(COALESCE(last_completed_date, ''), excluded.last_completed_date)
+    """)
+
+    cursor.execute("""
+        UPDATE habits
+        SET last_completed_at = MAX(
+            COALESCE(last_completed_at, ''),
+            (SELECT last_at FROM touched_habits t WHERE t.habit_id = habits.habit_id)
+        )
+        WHERE habit_id IN (SELECT habit_id FROM touched_habits)
+    """)
+
+
+def ingest_completions(events, conn=None, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    Append a stream of completion events to the log in large batches.
+
+    Events whose habit does not exist or does not belong to the given user,
+    and events with unparseable timestamps, are counted as rejected. Streak
+    summaries of the affected habits are recomputed from the log once all
+    batches are in, so events may arrive in any order.
+
+    Args:
+        events: Iterable of (user_id, habit_id, timestamp) tuples. Timestamps may
+            be datetime/date objects, ISO-8601 strings or Unix epoch seconds.
+        conn (optional): Connection to use; defaults to one from the shared pool.
+        batch_size (int): Number of events staged and committed per transaction.
+
+    Returns:
+        dict: received, inserted, rejected, habits, seconds and rows_per_sec.
+    """
+    if conn is None:
+        with get_connection() as pooled:
+            return ingest_completions(events, pooled, batch_size)
+
+    started = time.perf_counter()
+    received = inserted = 0
+    rows = iter(events)
+    cursor = conn.cursor()
+    # A bigger page cache keeps the completions index in memory while it grows
+    cursor.execute("PRAGMA cache_size")
+    cache_size = cursor.fetchone()[0]
+    cursor.execute(f"PRAGMA cache_size = {-INGEST_CACHE_KIB}")
+    try:
+        _prepare(cursor)
+        conn.commit()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            received += len(batch)
+            # Sources usually produce one timestamp type; only convert Python dates
+            if isinstance(batch[0][2], date) or isinstance(batch[-1][2], date):
+                batch = _normalise(batch)
+            # A rolled-back try also undoes its staging, so the batch can simply run again
+            for attempt in retrying():
+                with attempt, transaction(conn):
+                    loaded = _load_batch(cursor, batch)
+            inserted += loaded
+
+        for attempt in retrying():
+            with attempt, transaction(conn):
+                _update_streaks(cursor)
+                cursor.execute("SELECT COUNT(*) FROM touched_habits")
+                habits = cursor.fetchone()[0]
+                cursor.execute("DELETE FROM touched_habits")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute(f"PRAGMA cache_size = {int(cache_size)}")
+
+    seconds = time.perf_counter() - started
+    return {
+        "received": received,
+        "inserted": inserted,
+        "rejected": received - inserted,
+        "habits": habits,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(inserted / seconds) if seconds > 0 else 0,
+    }
+
+
+# ---------------------------
+# Command line
+# ---------------------------
+
+def build_parser(parser=None):
+    """Add the ingestion arguments to ``parser`` (or a new one) and return it."""
+    parser = parser or argparse.ArgumentParser(description="Bulk-load habit completions.")
+    parser.add_argument("file", help="CSV file of user_id,habit_id,timestamp rows ('-' for stdin)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"events per transaction (default {DEFAULT_BATCH_SIZE})")
+    return parser
+
+
+def run(args) -> dict:
+    """Run an ingestion from parsed command-line arguments and print a summary."""
+    stats = ingest_completions(read_events(args.file), batch_size=args.batch_size)
+    print(f"✅ Ingested {stats['inserted']} of {stats['received']} events "
+          f"({stats['rejected']} rejected) for {stats['habits']} habit(s) "
+          f"in {stats['seconds']}s - {stats['rows_per_sec']} rows/sec")
+    return stats
+
+
+if __name__ == "__main__":
+    run(build_parser().parse_args())
@@ -0,0 +1,500 @@
+"""
+Query instrumentation and slow-query log for the SQLite layer.
+
+When enabled, connections handed out by ``db.get_connection()`` are
+InstrumentedConnection objects that record, per normalized statement
+(literals replaced by ``?``, whitespace collapsed):
+
+- calls, total/mean/percentile wall time (execute plus fetching the rows),
+- rows returned and VM work (via ``set_progress_handler``),
+- how often SQLite started the statement (via ``set_trace_callback``; this
+  also sees statements issued implicitly, such as BEGIN, or by executescript),
+- the function in main.py / analyze.py (or the nearest caller) that issued it.
+
+Statements slower than the threshold are appended to a slow-query log with
+their ``EXPLAIN QUERY PLAN`` output. Statistics are saved to a JSON file when
+the process exits (merged with earlier runs) for the report command.
+
+Enable with environment variables before the first connection is made::
+
+    HABIT_TRACKER_INSTRUMENT=1          # turn instrumentation on
+    HABIT_TRACKER_SLOW_MS=50            # slow-query threshold (default 100)
+    HABIT_TRACKER_SLOW_LOG=slow.log     # default slow_queries.log
+    HABIT_TRACKER_QUERY_STATS=q.json    # default query_stats.json
+
+or call ``instrument.enable(...)`` and then ``db.configure_pool()``.
+
+Usage:
+    python instrument.py report --top 15 --by total
+    python instrument.py profile --scale 100k      # run the benchmark workload instrumented
+"""
+import argparse
+import atexit
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+# VM instructions between progress handler calls
+PROGRESS_STEPS = 1000
+
+# Timing samples kept per statement for percentiles (reservoir sampling)
+MAX_SAMPLES = 1000
+
+# Modules whose functions statements are attributed to when they are on the stack
+REPORT_MODULES = ("main", "analyze")
+
+# Frames from these modules are plumbing, never an origin
+_INFRASTRUCTURE = {__name__, "instrument", "pool", "db", "sqlite3", "sqlite3.dbapi2"}
+
+# Statements EXPLAIN QUERY PLAN can describe
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+_config = {
+    "enabled": os.environ.get("HABIT_TRACKER_INSTRUMENT", "") not in ("", "0"),
+    "slow_ms": float(os.environ.get("HABIT_TRACKER_SLOW_MS", "100")),
+    "slow_log": os.environ.get("HABIT_TRACKER_SLOW_LOG", "slow_queries.log"),
+    "stats_file": os.environ.get("HABIT_TRACKER_QUERY_STATS", "query_stats.json"),
+}
+
+
+# ---------------------------
+# SQL normalization
+# ---------------------------
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(sql: str) -> str:
+    """
+    Reduce a statement to its shape: literals become ``?``, ``IN (?, ?, ...)``
+    becomes ``IN (?...)`` and whitespace is collapsed.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?...)", sql)
+    return _SPACE.sub(" ", sql).strip().rstrip(";")
+
+
+# ---------------------------
+# Statistics
+# ---------------------------
+
+class QueryStats:
+    """Thread-safe per-statement counters shared by every instrumented connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = {}
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {
+                "calls": 0, "traced": 0, "total_s": 0.0, "max_s": 0.0, "rows": 0, "vm_steps": 0,
+                "slow": 0, "samples": [], "origins": {},
+            }
+        return entry
+
+    def record(self, key, elapsed, rows, vm_steps, origin, slow):
+        with self._lock:
+            entry = self._entry(key)
+            entry["calls"] += 1
+            entry["total_s"] += elapsed
+            entry["max_s"] = max(entry["max_s"], elapsed)
+            entry["rows"] += rows
+            entry["vm_steps"] += vm_steps
+            entry["slow"] += slow
+            entry["origins"][origin] = entry["origins"].get(origin, 0) + 1
+            samples = entry["samples"]
+            if len(samples) < MAX_SAMPLES:
+                samples.append(elapsed)
+            else:
+                slot = random.randrange(entry["calls"])
+                if slot < MAX_SAMPLES:
+                    samples[slot] = elapsed
+
+    def traced(self, key):
+        with self._lock:
+            self._entry(key)["traced"] += 1
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+
+    def snapshot(self) -> dict:
+        """Return a deep copy of the entries (safe to serialize)."""
+        with self._lock:
+            return {key: {**entry, "samples": list(entry["samples"]), "origins": dict(entry["origins"])}
+                    for key, entry in self.entries.items()}
+
+    def merge(self, entries: dict):
+        """Add entries loaded from an earlier run's stats file."""
+        with self._lock:
+            for key, other in entries.items():
+                entry = self._entry(key)
+                for field in ("calls", "traced", "total_s", "rows", "vm_steps", "slow"):
+                    entry[field] += other.get(field, 0)
+                entry["max_s"] = max(entry["max_s"], other.get("max_s", 0.0))
+                entry["samples"] = (entry["samples"] + other.get("samples", []))[:MAX_SAMPLES]
+                for origin, count in other.get("origins", {}).items():
+                    entry["origins"][origin] = entry["origins"].get(origin, 0) + count
+
+
+STATS = QueryStats()
+_log_lock = threading.Lock()
+
+
+def _origin() -> str:
+    # The first main.py / analyze.py function on the stack, else the nearest caller
+    frame = sys._getframe(2)
+    nearest = None
+    depth = 0
+    while frame is not None and depth < 25:
+        module = frame.f_globals.get("__name__", "?")
+        if module in REPORT_MODULES or (module == "__main__" and frame.f_code.co_filename.endswith("main.py")):
+            return f"{'main' if module == '__main__' else module}.{frame.f_code.co_name}"
+        if nearest is None and module not in _INFRASTRUCTURE:
+            nearest = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+        depth += 1
+    return nearest or "?"
+
+
+def _percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+# ---------------------------
+# Instrumented connection
+# ---------------------------
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times each statement from execute() until its rows are consumed."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None
+
+    # A statement stays open while its rows are fetched; SQLite does the work lazily
+    def _begin(self, sql, params):
+        self._finish()
+        conn = self.connection
+        self._pending = [sql, params, time.perf_counter(), 0, conn._ticks, _origin(), 0.0]
+
+    def _finish(self):
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+        sql, params, started, rows, ticks, origin, elapsed = pending
+        elapsed = elapsed or time.perf_counter() - started
+        conn = self.connection
+        vm_steps = (conn._ticks - ticks) * PROGRESS_STEPS
+        slow = elapsed * 1000 >= _config["slow_ms"]
+        STATS.record(normalize(sql), elapsed, rows, vm_steps, origin, slow)
+        if slow:
+            _log_slow(conn, sql, params, elapsed, rows, origin)
+
+    def _fetched(self, count, exhausted):
+        pending = self._pending
+        if pending is not None:
+            pending[3] += count
+            if exhausted:
+                pending[6] = time.perf_counter() - pending[2]
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        try:
+            super().execute(sql, parameters)
+        except Exception:
+            self._finish()
+            raise
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._begin(sql, seq_of_parameters[0] if seq_of_parameters else ())
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish()
+        return self
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._fetched(row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._fetched(len(rows), True)
+        return rows
+
+    def __next__(self):
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(0, True)
+            raise
+        self._fetched(1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that feeds STATS through its cursors, trace and progress callbacks."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ticks = 0
+        self.set_trace_callback(self._trace)
+        self.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def _trace(self, statement):
+        STATS.traced(normalize(statement))
+
+    def _progress(self):
+        self._ticks += 1
+        return 0  # never interrupt
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() does not go through cursor(), so route it explicitly
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _log_slow(conn, sql, params, elapsed, rows, origin):
+    plan = []
+    if sql.lstrip().upper().startswith(_EXPLAINABLE):
+        # Plain cursor with the callbacks off, so the EXPLAIN is not itself recorded
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+        try:
+            plan = [row[3] for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error as e:
+            plan = [f"(no plan: {e})"]
+        finally:
+            conn.set_trace_callback(conn._trace)
+            conn.set_progress_handler(conn._progress, PROGRESS_STEPS)
+
+    lines = [f"-- {time.strftime('%Y-%m-%dT%H:%M:%S')} {elapsed * 1000:.1f} ms, {rows} rows, {origin}",
+             _SPACE.sub(" ", sql).strip() + ";"]
+    lines += [f"--   {step}" for step in plan]
+    with _log_lock, open(_config["slow_log"], "a") as handle:
+        handle.write("\n".join(lines) + "\n\n")
+
+
+# ---------------------------
+# Configuration
+# ---------------------------
+
+def enable(slow_ms=None, slow_log=None, stats_file=None):
+    """
+    Turn instrumentation on for connections created from now on.
+
+    The shared pool keeps its existing connections, so call this before the
+    first ``db.get_connection()`` or follow it with ``db.configure_pool()``.
+    """
+    _config["enabled"] = True
+    for key, value in (("slow_ms", slow_ms), ("slow_log", slow_log), ("stats_file", stats_file)):
+        if value is not None:
+            _config[key] = value
+
+
+def disable():
+    """Stop instrumenting connections created from now on."""
+    _config["enabled"] = False
+
+
+def is_enabled() -> bool:
+    return _config["enabled"]
+
+
+def connect_kwargs() -> dict:
+    """Extra ``sqlite3.connect`` arguments for new connections (empty when disabled)."""
+    return {"factory": InstrumentedConnection} if _config["enabled"] else {}
+
+
+def save(path=None):
+    """Merge this process's statistics into the stats file and reset them."""
+    path = path or _config["stats_file"]
+    if not path:
+        return
+    entries = STATS.snapshot()
+    if not entries:
+        return
+    merged = QueryStats()
+    if os.path.exists(path):
+        with open(path) as handle:
+            merged.merge(json.load(handle))
+    merged.merge(entries)
+    with open(path, "w") as handle:
+        json.dump(merged.snapshot(), handle)
+    STATS.reset()
+
+
+@atexit.register
+def _save_at_exit():
+    if _config["enabled"]:
+        try:
+            save()
+        except OSError:
+            pass
+
+
+# ---------------------------
+# Report
+# ---------------------------
+
+SORT_KEYS = {
+    "total": lambda e: e["total_s"],
+    "calls": lambda e: e["calls"],
+    "mean": lambda e: e["total_s"] / e["calls"] if e["calls"] else 0,
+    "p95": lambda e: _percentile(e["samples"], 95),
+    "rows": lambda e: e["rows"],
+    "vm": lambda e: e["vm_steps"],
+}
+
+
+def report(entries: dict, top: int = 15, by: str = "total", modules=REPORT_MODULES) -> list:
+    """
+    Summarize the hottest statements.
+
+    Args:
+        entries (dict): Statistics as produced by ``QueryStats.snapshot()``.
+        top (int): Number of statements to return.
+        by (str): Sort key: total, calls, mean, p95, rows or vm.
+        modules (iterable of str, optional): Only statements issued from these
+            modules (e.g. main, analyze); None for all.
+
+    Returns:
+        list of dict: sql, calls, traced, total_ms, mean_ms, p50_ms, p95_ms, p99_ms,
+        max_ms, rows, vm_steps, slow and origins (most frequent first).
+    """
+    rows = []
+    for sql, entry in entries.items():
+        if not entry["calls"]:
+            continue
+        origins = entry["origins"]
+        if modules:
+            origins = {o: n for o, n in origins.items() if o.split(".")[0] in modules}
+            if not origins:
+                continue
+        samples = entry["samples"]
+        rows.append({
+            "sql": sql,
+            "calls": entry["calls"],
+            "traced": entry["traced"],
+            "total_ms": round(entry["total_s"] * 1000, 3),
+            "mean_ms": round(entry["total_s"] / entry["calls"] * 1000, 3),
+            "p50_ms": round(_percentile(samples, 50) * 1000, 3),
+            "p95_ms": round(_percentile(samples, 95) * 1000, 3),
+            "p99_ms": round(_percentile(samples, 99) * 1000, 3),
+            "max_ms": round(entry["max_s"] * 1000, 3),
+            "rows": entry["rows"],
+            "vm_steps": entry["vm_steps"],
+            "slow": entry["slow"],
+            "origins": sorted(origins, key=origins.get, reverse=True),
+            "_entry": entry,
+        })
+    rows.sort(key=lambda r: SORT_KEYS[by](r["_entry"]), reverse=True)
+    for row in rows:
+        del row["_entry"]
+    return rows[:top]
+
+
+def print_report(rows, out=None):
+    out = out or sys.stdout
+    if not rows:
+        out.write("No instrumented statements recorded.\n")
+        return
+    for number, r in enumerate(rows, start=1):
+        sql = r["sql"] if len(r["sql"]) <= 110 else r["sql"][:107] + "..."
+        out.write(f"{number:>2}. {sql}\n")
+        out.write(f"    calls {r['calls']:<8} total {r['total_ms']:>10.1f} ms  mean {r['mean_ms']:.3f}  "
+                  f"p50 {r['p50_ms']:.3f}  p95 {r['p95_ms']:.3f}  p99 {r['p99_ms']:.3f}  max {r['max_ms']:.3f}\n")
+        out.write(f"    rows {r['rows']:<9} vm steps {r['vm_steps']:<10} slow {r['slow']:<5} "
+                  f"from {', '.join(r['origins'][:3])}\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Report on instrumented SQLite statements.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("report", "print the hottest statements from a stats file"),
+                            ("profile", "run the benchmark workload instrumented, then report")):
+        p = commands.add_parser(name, help=help_text)
+        p.add_argument("--stats", default=_config["stats_file"], help="stats file (default: %(default)s)")
+        p.add_argument("--top", type=int, default=15)
+        p.add_argument("--by", choices=SORT_KEYS, default="total")
+        p.add_argument("--modules", default=",".join(REPORT_MODULES),
+                       help="comma-separated origin modules to include ('' for all)")
+        p.add_argument("--json", action="store_true", help="print the report as JSON")
+        if name == "profile":
+            p.add_argument("--scale", default="1k", help="benchmark scale (see benchmark.py)")
+            p.add_argument("--slow-ms", type=float, default=_config["slow_ms"])
+            p.add_argument("--slow-log", default=_config["slow_log"])
+    args = parser.parse_args(argv)
+
+    if args.command == "profile":
+        import benchmark
+        import db
+        # db imports this file as "instrument", which is a separate module when run as a script
+        import instrument
+
+        instrument.enable(slow_ms=args.slow_ms, slow_log=args.slow_log, stats_file=args.stats)
+        db.close_pool()
+        benchmark.run(args.scale, iterations=50, max_seconds=1.0)
+        entries = instrument.STATS.snapshot()
+        instrument.save(args.stats)
+    else:
+        if not os.path.exists(args.stats):
+            print(f"❌ No stats file at {args.stats}. Run with HABIT_TRACKER_INSTRUMENT=1 first.")
+            return 1
+        with open(args.stats) as handle:
+            entries = json.load(handle)
+
+    modules = tuple(m for m in args.modules.split(",") if m) or None
+    rows = report(entries, args.top, args.by, modules)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,48 @@
-from datetime import datetime  # Import datetime module for working with dates and times
 import questionary  # Import questionary for user input and interaction
-from db import get_connection  # Import the function to get a database connection from the db module
+import tracker  # Core habit operations shared with the batch command line (cli.py)
+import sessions  # Login sessions, so actions do not re-check credentials every time
+import writebehind  # Optional group-commit queue for logging completions
+from db import get_connection, ensure_schema, begin_write, retrying  # Database connection, schema and transaction helpers
 from analyze import run_analytics  # Import the analytics function for viewing analytics
 
+# Habits shown per page by view_habit
+VIEW_PAGE_SIZE = 20
+
+# Each action below accepts its inputs as arguments and only prompts for the
+# ones that are missing, so the menu, scripts and tests can all call it.
+# Actions that need a user also accept a logged-in Session (see sessions.py)
+# in place of credentials, which skips both the prompts and the lookup.
+
+
+def _session_ok(session):
+    # One cache lookup; tells the user to log in again if the session has ended
+    try:
+        sessions.validate(session)
+    except sessions.SessionExpiredError as e:
+        questionary.print(f"❌ {e}")
+        return False
+    return True
+
 
 # ---------------------------
 # Register a new user
 # ---------------------------
-def register():
+def register(username=None, password=None):
     # Prompt the user for a username and password using questionary
-    username = questionary.text("Choose your desired username:").ask()
-    password = questionary.password("Enter your password:").ask()
-
-    # Insert the username and password into the database
-    with get_connection() as conn:
+    if username is None:
+        username = questionary.text("Choose your desired username:").ask()
+    if password is None:
+        password = questionary.password("Enter your password:").ask()
+
+    # Insert the username and password into the database (in sharded mode, on the
+    # shard the username is assigned to)
+    with get_connection(username=username, claim=True) as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO users (username, password) VALUES (?, ?)",  # SQL query to insert the user
-            (username, password)
-        )
+        try:
+            tracker.register_user(cursor, username, password)
+        except tracker.DuplicateError as e:
+            questionary.print(f"❌ {e}")
+            return
         conn.commit()  # Commit the transaction to save the user in the database
 
     # Print confirmation message
@@ -28,50 +52,55 @@ def register():
 # ---------------------------
 # Add a new habit
 # ---------------------------
-def add_habit():
-    # Prompt for username and user ID
-    username = questionary.text("Enter your username:").ask()
-    user_id_input = questionary.text("Enter your user ID:").ask()
-
-    # Attempt to convert user_id_input to an integer, if it fails, show an error
-    try:
-        user_id = int(user_id_input)
-    except ValueError:
-        questionary.print("❌ Invalid user ID. Must be a number.")
-        return
-
-    # Open a connection to the database
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # Check if the username exists in the users table
-        cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
-
-        # If no user is found or user ID does not match, print error
-        if not user or user[0] != user_id:
-            questionary.print("❌ Username and User ID do not match.")
+def add_habit(username=None, user_id=None, name=None, description=None, periodicity=None, session=None):
+    if session is not None:
+        # Already authenticated: take the user from the session
+        if not _session_ok(session):
+            return
+        user_id = session.user_id
+    else:
+        # Prompt for username and user ID
+        if username is None:
+            username = questionary.text("Enter your username:").ask()
+        if user_id is None:
+            user_id = questionary.text("Enter your user ID:").ask()
+
+        # Attempt to convert user_id to an integer, if it fails, show an error
+        try:
+            user_id = tracker.parse_id(user_id, "user ID")
+        except tracker.InvalidInputError as e:
+            questionary.print(f"❌ {e}")
             return
 
-        # Prompt for the habit name, description, and periodicity (daily or weekly)
-        name = questionary.text("Enter the habit name:").ask()
-        description = questionary.text("Enter a description (optional):").ask()
-        periodicity = questionary.select("Choose the frequency of the habit:", choices=["daily", "weekly"]).ask()
-        created_at = datetime.now()  # Get the current time for habit creation
-
-        # Check if the habit already exists for the user
-        cursor.execute("SELECT * FROM habits WHERE user_id = ? AND name = ?", (user_id, name))
-        existing = cursor.fetchone()
-
-        # If the habit exists, print an error
-        if existing:
-            questionary.print(f"❌ Habit '{name}' already exists for this user.")
-        else:
-            # Insert the new habit into the database
-            cursor.execute("""
-                INSERT INTO habits (name, description, periodicity, created_at, user_id, is_active)
-                VALUES (?, ?, ?, ?, ?, 'Yes')
-            """, (name, description, periodicity, created_at, user_id))
+    # Open a connection to the database (the user's shard in sharded mode); the
+    # block is retried if another process holds the write lock
+    for attempt in retrying():
+        with attempt, get_connection(user_id=user_id) as conn:
+            cursor = conn.cursor()
+
+            # Check that the username exists and matches the user ID
+            if session is None:
+                try:
+                    tracker.verify_user_id(cursor, username, user_id)
+                except tracker.AuthenticationError as e:
+                    questionary.print(f"❌ {e}")
+                    return
+
+            # Prompt for the habit name, description, and periodicity (daily or weekly)
+            if name is None:
+                name = questionary.text("Enter the habit name:").ask()
+            if description is None:
+                description = questionary.text("Enter a description (optional):").ask()
+            if periodicity is None:
+                periodicity = questionary.select("Choose the frequency of the habit:", choices=["daily", "weekly"]).ask()
+
+            # Insert the new habit, unless the user already has one with this name
+            begin_write(conn)
+            try:
+                tracker.add_habit(cursor, user_id, name, description, periodicity)
+            except tracker.TrackerError as e:
+                questionary.print(f"❌ {e}")
+                return
             conn.commit()  # Commit the transaction
             questionary.print(f"✅ Habit '{name}' added successfully!")
 
@@ -79,218 +108,303 @@ def add_habit():
 # ---------------------------
 # View the list of a user's habits
 # ---------------------------
-def view_habit():
-    # Prompt for username and password to authenticate
-    username = questionary.text("Enter your username:").ask()
-    password = questionary.password("Enter your password:").ask()
+def view_habit(username=None, password=None, session=None, page_size=None, is_active=None, periodicity=None):
+    if session is not None:
+        if not _session_ok(session):
+            return
+        username = session.username
+    else:
+        # Prompt for username and password to authenticate
+        if username is None:
+            username = questionary.text("Enter your username:").ask()
+        if password is None:
+            password = questionary.password("Enter your password:").ask()
 
     # Open a connection to the database and check user credentials
-    with get_connection() as conn:
+    with get_connection(username=username, user_id=session.user_id if session else None) as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE username = ? AND password = ?", (username, password))
-        user = cursor.fetchone()
-
-        # If no user is found, print error
-        if not user:
-            questionary.print("❌ Invalid username or password.")
-            return
-
-        user_id = user[0]
-
-        # Query the user's habits
-        cursor.execute("""
-            SELECT habit_id, name, description, periodicity, is_active, last_completed_at
-            FROM habits
-            WHERE user_id = ?
-        """, (user_id,))
-        habits = cursor.fetchall()
-
-        # If habits are found, print them
-        if habits:
-            questionary.print(f"📋 Habits for '{username}':")
+        if session is not None:
+            user_id = session.user_id
+        else:
+            try:
+                user_id = tracker.authenticate(cursor, username, password)[0]
+            except tracker.AuthenticationError as e:
+                questionary.print(f"❌ {e}")
+                return
+
+        # Query the user's habits one page at a time (optionally filtered)
+        pages = tracker.iter_habit_pages(cursor, user_id, limit=page_size or VIEW_PAGE_SIZE,
+                                         is_active=is_active, periodicity=periodicity)
+        for number, (habits, next_page) in enumerate(pages, start=1):
+            if not habits:
+                # If no habits are found, print a message
+                if number > 1:
+                    questionary.print("⚠️ No more habits.")
+                elif is_active or periodicity:
+                    questionary.print("⚠️ No habits match the filter.")
+                else:
+                    questionary.print("⚠️ You have no habits yet.")
+                break
+
+            # Print the page of habits
+            if number == 1:
+                questionary.print(f"📋 Habits for '{username}':")
             for habit in habits:
                 questionary.print(
                     f"- ID {habit[0]}: {habit[1]} | {habit[2]} | Frequency: {habit[3]} | Active: {habit[4]} | Last Completed: {habit[5]}"
                 )
-        else:
-            # If no habits are found, print a message
-            questionary.print("⚠️ You have no habits yet.")
+
+            # Fetch the next page only if the user asks for it
+            if next_page and not questionary.confirm("Show more habits?").ask():
+                break
 
 
 # ---------------------------
 # Log a habit completion
 # ---------------------------
-def log_completion():
-    # Prompt for username, user ID, and habit ID
-    username = questionary.text("Enter your username:").ask()
-    user_id_input = questionary.text("Enter your user ID:").ask()
-    habit_id_input = questionary.text("Enter the Habit ID you completed:").ask()
-    completed_at = datetime.now()  # Time of habit completion
-    today = completed_at.date()  # Today's date
+def log_completion(username=None, user_id=None, habit_id=None, completed_at=None, session=None):
+    if session is not None:
+        if not _session_ok(session):
+            return
+        user_id = session.user_id
+    else:
+        # Prompt for username and user ID
+        if username is None:
+            username = questionary.text("Enter your username:").ask()
+        if user_id is None:
+            user_id = questionary.text("Enter your user ID:").ask()
+
+    # Prompt for the habit ID
+    if habit_id is None:
+        habit_id = questionary.text("Enter the Habit ID you completed:").ask()
 
     # Attempt to convert user_id and habit_id to integers
     try:
-        user_id = int(user_id_input)
-        habit_id = int(habit_id_input)
-    except ValueError:
+        user_id = tracker.parse_id(user_id)
+        habit_id = tracker.parse_id(habit_id)
+    except tracker.InvalidInputError:
         questionary.print("❌ Invalid user ID or Habit ID. Must be numbers.")
         return
 
-    # Open a connection to the database
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # Check if the username exists
-        cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
-        if not user or user[0] != user_id:
-            questionary.print("❌ Username and User ID do not match.")
-            return
-
-        # Check if the habit exists for the user
-        cursor.execute("SELECT periodicity FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
-        habit = cursor.fetchone()
-        if not habit:
-            questionary.print("❌ Habit not found or doesn't belong to the user.")
+    queue = writebehind.get_queue()
+    if queue is not None:
+        # Write-behind mode: check the user, then queue the completion and wait
+        # until the group commit that includes it has been made
+        try:
+            if session is None:
+                with get_connection(user_id=user_id) as conn:
+                    tracker.verify_user_id(conn.cursor(), username, user_id)
+            summary = queue.submit(user_id, habit_id, completed_at).result()
+        except tracker.TrackerError as e:
+            questionary.print(f"❌ {e}")
             return
-
-        # Check and update the streak for the habit
-        cursor.execute("SELECT count FROM streak WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
-        streak = cursor.fetchone()
-
-        if streak:
-            count = streak[0] + 1
-            cursor.execute("""
-                UPDATE streak
-                SET count = ?, last_completed_date = ?
-                WHERE habit_id = ? AND user_id = ?
-            """, (count, today, habit_id, user_id))
-        else:
-            count = 1
-            cursor.execute("""
-                INSERT INTO streak (habit_id, user_id, count, last_completed_date)
-                VALUES (?, ?, ?, ?)
-            """, (habit_id, user_id, count, today))
-
-        # Update the habit's last completed date
-        cursor.execute("""
-            UPDATE habits
-            SET last_completed_at = ?
-            WHERE habit_id = ? AND user_id = ?
-        """, (completed_at, habit_id, user_id))
-
-        conn.commit()  # Commit the transaction
-
-    # Print confirmation and the total number of completions
+    else:
+        # Open a connection to the database (the user's shard in sharded mode); the
+        # block is retried if another process holds the write lock
+        for attempt in retrying():
+            with attempt, get_connection(user_id=user_id) as conn:
+                cursor = conn.cursor()
+
+                # Check the user, then log the completion (defaults to now) and update the streak
+                begin_write(conn)
+                try:
+                    if session is None:
+                        tracker.verify_user_id(cursor, username, user_id)
+                    summary = tracker.log_completion(cursor, user_id, habit_id, completed_at)
+                except tracker.TrackerError as e:
+                    questionary.print(f"❌ {e}")
+                    return
+
+                conn.commit()  # Commit the transaction
+
+    # Print confirmation, the total number of completions and the current streak
+    unit = "day" if summary["periodicity"] == "daily" else "week"
     questionary.print(f"✅ Logged completion for Habit ID {habit_id}.")
-    questionary.print(f"🔥 Total completions so far: {count}")
+    questionary.print(f"🔥 Total completions so far: {summary['count']}")
+    questionary.print(f"📈 Current streak: {summary['current_streak']} {unit}(s) "
+                      f"(longest: {summary['longest_streak']})")
 
 
 # ---------------------------
 # Delete a habit
 # ---------------------------
-def delete_habit():
-    # Prompt for username and password
-    username = questionary.text("Enter your username:").ask()
-    password = questionary.password("Enter your password:").ask()
-
-    # Open a connection to the database and authenticate
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE username = ? AND password = ?", (username, password))
-        user = cursor.fetchone()
-
-        # If authentication fails, print an error
-        if not user:
-            questionary.print("❌ Incorrect credentials.")
+def delete_habit(username=None, password=None, habit_id=None, session=None):
+    if session is not None:
+        if not _session_ok(session):
             return
-
-        user_id = user[0]
-
-        # Prompt for habit ID to delete
-        habit_id = questionary.text("Enter the Habit ID to delete:").ask()
-
-        # Check if the habit exists for the user
-        cursor.execute("SELECT * FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
-        if not cursor.fetchone():
-            questionary.print("⚠️ Habit not found or doesn't belong to you.")
-            return
-
-        # Confirm deletion before removing the habit
-        confirm = questionary.confirm("⚠️ Confirm deletion of this habit?").ask()
-        if confirm:
-            cursor.execute("DELETE FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
-            conn.commit()  # Commit the deletion
-            questionary.print(f"🗑️ Habit ID {habit_id} deleted successfully!")
-        else:
-            questionary.print("❎ Habit deletion cancelled.")
+    else:
+        # Prompt for username and password
+        if username is None:
+            username = questionary.text("Enter your username:").ask()
+        if password is None:
+            password = questionary.password("Enter your password:").ask()
+
+    # Open a connection to the database and authenticate; the block is retried
+    # (without asking again) if another process holds the write lock
+    confirm = None
+    for attempt in retrying():
+        with attempt, get_connection(username=username, user_id=session.user_id if session else None) as conn:
+            cursor = conn.cursor()
+            if session is not None:
+                user_id = session.user_id
+            else:
+                try:
+                    user_id = tracker.authenticate(cursor, username, password)[0]
+                except tracker.AuthenticationError:
+                    # If authentication fails, print an error
+                    questionary.print("❌ Incorrect credentials.")
+                    return
+
+            # Prompt for habit ID to delete
+            if habit_id is None:
+                habit_id = questionary.text("Enter the Habit ID to delete:").ask()
+
+            # Check if the habit exists for the user
+            try:
+                tracker.get_habit(cursor, user_id, habit_id)
+            except tracker.HabitNotFoundError:
+                questionary.print("⚠️ Habit not found or doesn't belong to you.")
+                return
+
+            # Confirm deletion before removing the habit
+            if confirm is None:
+                confirm = questionary.confirm("⚠️ Confirm deletion of this habit?").ask()
+            if confirm:
+                begin_write(conn)
+                tracker.delete_habit(cursor, user_id, habit_id)
+                conn.commit()  # Commit the deletion
+                questionary.print(f"🗑️ Habit ID {habit_id} deleted successfully!")
+            else:
+                questionary.print("❎ Habit deletion cancelled.")
 
 
 # ---------------------------
 # View a user profile
 # ---------------------------
-def view_user_profile():
-    # Prompt for username and password to authenticate
-    username = questionary.text("Enter your username:").ask()
-    password = questionary.password("Enter your password:").ask()
-
-    # Open a connection to the database
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id, username FROM users WHERE username = ? AND password = ?", (username, password))
-        user = cursor.fetchone()
-
-        # If no user is found, print an error
-        if not user:
-            questionary.print("❌ Invalid username or password.")
-        else:
-            # Print user profile information
-            questionary.print("👤 User Profile:")
-            questionary.print(f"ID: {user[0]}")
-            questionary.print(f"Username: {user[1]}")
+def view_user_profile(username=None, password=None, session=None):
+    if session is not None:
+        # The session already holds the profile, no query needed
+        if not _session_ok(session):
+            return
+        user = (session.user_id, session.username)
+    else:
+        # Prompt for username and password to authenticate
+        if username is None:
+            username = questionary.text("Enter your username:").ask()
+        if password is None:
+            password = questionary.password("Enter your password:").ask()
+
+        # Open a connection to the database
+        with get_connection(username=username) as conn:
+            cursor = conn.cursor()
+            try:
+                user = tracker.authenticate(cursor, username, password)
+            except tracker.AuthenticationError as e:
+                # If no user is found, print an error
+                questionary.print(f"❌ {e}")
+                return
+
+    # Print user profile information
+    questionary.print("👤 User Profile:")
+    questionary.print(f"ID: {user[0]}")
+    questionary.print(f"Username: {user[1]}")
 
 
 # ---------------------------
 # Delete account
 # ---------------------------
-def delete_user():
-    # Prompt for username and password to authenticate
-    username = questionary.text("Enter your username:").ask()
-    password = questionary.password("Enter your password:").ask()
+def delete_user(username=None, password=None, session=None):
+    if session is not None:
+        if not _session_ok(session):
+            return
+    else:
+        # Prompt for username and password to authenticate
+        if username is None:
+            username = questionary.text("Enter your username:").ask()
+        if password is None:
+            password = questionary.password("Enter your password:").ask()
+
+    # Open a connection to the database; the block is retried (without asking
+    # again) if another process holds the write lock
+    confirm = None
+    for attempt in retrying():
+        with attempt, get_connection(username=username, user_id=session.user_id if session else None) as conn:
+            cursor = conn.cursor()
+            if session is not None:
+                user_id = session.user_id
+            else:
+                try:
+                    user_id = tracker.authenticate(cursor, username, password)[0]
+                except tracker.AuthenticationError:
+                    # If authentication fails, print an error
+                    questionary.print("❌ Invalid credentials.")
+                    return
+
+            # Confirm deletion of the user's account and associated data
+            if confirm is None:
+                confirm = questionary.confirm(
+                    "⚠️ Are you sure you want to delete your account and all associated habits?"
+                ).ask()
+
+            if confirm:
+                begin_write(conn)
+                sessions.revoke_user(cursor, user_id)  # End all of the user's sessions
+                tracker.delete_user(cursor, user_id)
+                conn.commit()  # Commit the deletion
+                questionary.print("🗑️ Account deleted successfully.")
+            else:
+                questionary.print("❎ Account deletion canceled.")
+
 
-    # Open a connection to the database
-    with get_connection() as conn:
+# ---------------------------
+# Log in and out
+# ---------------------------
+def login(username=None, password=None):
+    # Prompt for username and password once; later actions reuse the session
+    if username is None:
+        username = questionary.text("Enter your username:").ask()
+    if password is None:
+        password = questionary.password("Enter your password:").ask()
+
+    with get_connection(username=username) as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE username = ? AND password = ?", (username, password))
-        user = cursor.fetchone()
+        try:
+            session = sessions.login(cursor, username, password)
+        except tracker.AuthenticationError as e:
+            questionary.print(f"❌ {e}")
+            return None
+        conn.commit()
 
-        # If authentication fails, print an error
-        if not user:
-            questionary.print("❌ Invalid credentials.")
-            return
+    questionary.print(f"🔓 Logged in as '{session.username}'.")
+    return session
 
-        # Confirm deletion of the user's account and associated data
-        confirm = questionary.confirm(
-            "⚠️ Are you sure you want to delete your account and all associated habits?"
-        ).ask()
 
-        if confirm:
-            cursor.execute("DELETE FROM users WHERE user_id = ?", (user[0],))
-            conn.commit()  # Commit the deletion
-            questionary.print("🗑️ Account deleted successfully.")
-        else:
-            questionary.print("❎ Account deletion canceled.")
+def logout(session):
+    with get_connection(user_id=session.user_id) as conn:
+        sessions.logout(conn.cursor(), session.token)
+        conn.commit()
+    questionary.print("🔒 Logged out.")
 
 
 # ---------------------------
 # Main Menu Loop
 # ---------------------------
 def main():
+    # Apply any pending schema migrations (only a version check when current)
+    ensure_schema()
+
+    # The logged-in session (if any) is passed to every action instead of credentials
+    session = None
+
     # Main menu loop for navigating through different options
     while True:
+        # Drop a session that has expired so the menu offers to log in again
+        if session is not None and session.expired():
+            session = None
         choice = questionary.select(
             "🏠 Main Menu - Choose an option:",
             choices=[
+                "Log Out" if session else "Log In",
                 "Register",
                 "View Profile",
                 "Add Habit",
@@ -304,20 +418,27 @@ def main():
         ).ask()
 
         # Call respective functions based on the user's choice
-        if choice == "Register":
+        if choice == "Log In":
+            session = login()
+        elif choice == "Log Out":
+            logout(session)
+            session = None
+        elif choice == "Register":
             register()
         elif choice == "View Profile":
-            view_user_profile()
+            view_user_profile(session=session)
         elif choice == "Add Habit":
-            add_habit()
+            add_habit(session=session)
         elif choice == "View Habits":
-            view_habit()
+            view_habit(session=session)
         elif choice == "Log Habit Completion":
-            log_completion()
+            log_completion(session=session)
         elif choice == "Delete Habit":
-            delete_habit()
+            delete_habit(session=session)
         elif choice == "Delete Account":
-            delete_user()
+            delete_user(session=session)
+            if session is not None and not sessions.is_active(session):
+                session = None
         elif choice == "Analytics":
             run_analytics()  # Run the analytics function
         elif choice == "Exit":
@@ -0,0 +1,367 @@
+"""
+Versioned schema migrations for the habit tracker database.
+
+The schema version is stored in SQLite's ``PRAGMA user_version`` header field.
+Each migration upgrades the database from the previous version to its own and
+runs inside a single transaction together with the version bump, so a failed
+migration leaves the database at the last good version.
+
+To change the schema, append a new entry to MIGRATIONS - never edit one that
+has already shipped, because existing databases will not run it again.
+"""
+import sqlite3
+
+# ---------------------------
+# Migration steps
+# ---------------------------
+
+# Version 1: the original tables. IF NOT EXISTS lets databases created before
+# migrations existed (user_version 0) adopt the framework without changes.
+BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        password TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS habits (
+        habit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        description TEXT,
+        periodicity TEXT CHECK(periodicity IN ('daily', 'weekly')) NOT NULL,
+        created_at TEXT NOT NULL,
+        last_completed_at TEXT,
+        user_id INTEGER,
+        is_active TEXT DEFAULT 'Yes',
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS streak (
+        streak_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        habit_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        count INTEGER DEFAULT 0,
+        last_completed_date TEXT,
+        FOREIGN KEY (habit_id) REFERENCES habits(habit_id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    """,
+]
+
+# Version 2: secondary indexes for the hot lookups.
+#   - habits(user_id, name): listing a user's habits and the duplicate-name check
+#   - habits(periodicity, name): covers "habits by periodicity" without touching the table
+#   - streak(user_id): account deletion and per-user streak queries
+HABIT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_habits_user_name ON habits(user_id, name)",
+    "CREATE INDEX IF NOT EXISTS idx_habits_periodicity_name ON habits(periodicity, name)",
+    "CREATE INDEX IF NOT EXISTS idx_streak_user ON streak(user_id)",
+]
+
+# Version 3: one streak row per (habit, user). Older databases may contain
+# duplicates, so keep the row with the highest count before adding the index.
+UNIQUE_STREAK = [
+    """
+    DELETE FROM streak
+    WHERE streak_id NOT IN (
+        SELECT streak_id FROM (
+            SELECT streak_id,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY habit_id, user_id
+                       ORDER BY count DESC, streak_id DESC
+                   ) AS rank
+            FROM streak
+        )
+        WHERE rank = 1
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_streak_habit_user ON streak(habit_id, user_id)",
+]
+
+# Version 4: append-only completion log plus the running streak summary
+# (current run, longest run, last period) maintained by completions.py.
+COMPLETION_LOG = [
+    """
+    CREATE TABLE IF NOT EXISTS completions (
+        completion_id INTEGER PRIMARY KEY,
+        habit_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        completed_at TEXT NOT NULL,
+        completed_on TEXT NOT NULL,
+        FOREIGN KEY (habit_id) REFERENCES habits(habit_id) ON DELETE CASCADE,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_completions_habit_day ON completions(habit_id, completed_on)",
+    "ALTER TABLE streak ADD COLUMN current_streak INTEGER DEFAULT 0",
+    "ALTER TABLE streak ADD COLUMN longest_streak INTEGER DEFAULT 0",
+    "ALTER TABLE streak ADD COLUMN last_period INTEGER",
+]
+
+# Version 5: indexes that let top-K streak queries (ORDER BY ... DESC LIMIT k)
+# walk the index instead of sorting the whole table, globally or per user.
+STREAK_RANKING_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_streak_count ON streak(count)",
+    "CREATE INDEX IF NOT EXISTS idx_streak_user_count ON streak(user_id, count)",
+    "CREATE INDEX IF NOT EXISTS idx_streak_longest ON streak(longest_streak)",
+    "CREATE INDEX IF NOT EXISTS idx_streak_user_longest ON streak(user_id, longest_streak)",
+]
+
+# Version 6: login sessions (see sessions.py). Tokens are looked up by primary
+# key; the user index serves revocation on logout-everywhere/account deletion.
+SESSIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        token TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)",
+]
+
+# Version 7: keyset pagination of a user's habits. An index on user_id alone
+# is ordered by (user_id, rowid), so "user_id = ? AND habit_id > ? ORDER BY
+# habit_id LIMIT n" seeks straight to the page without sorting.
+HABIT_PAGING_INDEX = [
+    "CREATE INDEX IF NOT EXISTS idx_habits_user ON habits(user_id)",
+]
+
+# Version 8: habit names only need to be unique per user (every user may have
+# a "Morning Run"). SQLite cannot drop a column constraint, so the table is
+# rebuilt and its indexes recreated, with (user_id, name) now UNIQUE. The
+# AUTOINCREMENT high-water mark is carried over so deleted IDs are not reused.
+PER_USER_HABIT_NAMES = [
+    """
+    CREATE TABLE habits_new (
+        habit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        periodicity TEXT CHECK(periodicity IN ('daily', 'weekly')) NOT NULL,
+        created_at TEXT NOT NULL,
+        last_completed_at TEXT,
+        user_id INTEGER,
+        is_active TEXT DEFAULT 'Yes',
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    INSERT INTO habits_new (habit_id, name, description, periodicity, created_at, last_completed_at,
+                            user_id, is_active)
+    SELECT habit_id, name, description, periodicity, created_at, last_completed_at, user_id, is_active
+    FROM habits
+    """,
+    """
+    UPDATE sqlite_sequence
+    SET seq = MAX(seq, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'habits'), 0))
+    WHERE name = 'habits_new'
+    """,
+    # An empty habits_new has no sequence row yet (sqlite_sequence has no key to upsert on)
+    """
+    INSERT INTO sqlite_sequence (name, seq)
+    SELECT 'habits_new', seq FROM sqlite_sequence
+    WHERE name = 'habits' AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'habits_new')
+    """,
+    "DROP TABLE habits",
+    "ALTER TABLE habits_new RENAME TO habits",
+    "CREATE UNIQUE INDEX idx_habits_user_name ON habits(user_id, name)",
+    "CREATE INDEX idx_habits_periodicity_name ON habits(periodicity, name)",
+    "CREATE INDEX idx_habits_user ON habits(user_id)",
+]
+
+# Version 9: per-habit completion counts per day and per week (see rollups.py),
+# back-filled from the log. The day index answers "habits done each day" over
+# all users, the (user_id, period_start) ones the same for a single user.
+COMPLETION_ROLLUPS = [
+    """
+    CREATE TABLE IF NOT EXISTS completion_daily (
+        habit_id INTEGER NOT NULL,
+        period_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        completions INTEGER NOT NULL,
+        PRIMARY KEY (habit_id, period_start),
+        FOREIGN KEY (habit_id) REFERENCES habits(habit_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS completion_weekly (
+        habit_id INTEGER NOT NULL,
+        period_start TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        completions INTEGER NOT NULL,
+        PRIMARY KEY (habit_id, period_start),
+        FOREIGN KEY (habit_id) REFERENCES habits(habit_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """,
+    """
+    INSERT INTO completion_daily (habit_id, period_start, user_id, completions)
+    SELECT habit_id, completed_on, user_id, COUNT(*)
+    FROM completions
+    GROUP BY habit_id, completed_on
+    """,
+    """
+    INSERT INTO completion_weekly (habit_id, period_start, user_id, completions)
+    SELECT habit_id, date(completed_on, '-' || ((CAST(strftime('%w', completed_on) AS INTEGER) + 6) % 7) || ' days'),
+           user_id, COUNT(*)
+    FROM completions
+    GROUP BY 1, 2
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_completion_daily_day ON completion_daily(period_start)",
+    "CREATE INDEX IF NOT EXISTS idx_completion_daily_user_day ON completion_daily(user_id, period_start)",
+    "CREATE INDEX IF NOT EXISTS idx_completion_weekly_user_week ON completion_weekly(user_id, period_start)",
+]
+
+# Version 10: full-text index over habit names and descriptions for
+# analyze.search_habits. An external-content FTS5 table reads the text from
+# habits itself and only stores the index; triggers keep it in sync (an update
+# that touches neither column, like logging a completion, costs nothing). The
+# prefix indexes make queries for word prefixes of up to 6 characters ("med*")
+# read a stored list instead of merging the lists of every matching word.
+HABITS_FTS_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS habits_fts USING fts5(
+        name, description,
+        content='habits', content_rowid='habit_id',
+        tokenize='unicode61 remove_diacritics 2', prefix='1 2 3 4 5 6'
+    )
+"""
+
+HABITS_FTS_SYNC = [
+    """
+    CREATE TRIGGER IF NOT EXISTS habits_fts_insert AFTER INSERT ON habits BEGIN
+        INSERT INTO habits_fts (rowid, name, description) VALUES (new.habit_id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS habits_fts_delete AFTER DELETE ON habits BEGIN
+        INSERT INTO habits_fts (habits_fts, rowid, name, description)
+        VALUES ('delete', old.habit_id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS habits_fts_update AFTER UPDATE OF name, description ON habits BEGIN
+        INSERT INTO habits_fts (habits_fts, rowid, name, description)
+        VALUES ('delete', old.habit_id, old.name, old.description);
+        INSERT INTO habits_fts (rowid, name, description) VALUES (new.habit_id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO habits_fts (habits_fts) VALUES ('rebuild')",
+]
+
+
+def habit_search_index(cursor):
+    """
+    Create and fill the habit search index, or do nothing on SQLite builds
+    without FTS5 (searches then fall back to LIKE scans).
+    """
+    try:
+        cursor.execute(HABITS_FTS_TABLE)
+    except sqlite3.OperationalError as e:
+        if "no such module" in str(e):
+            return
+        raise
+    for step in HABITS_FTS_SYNC:
+        cursor.execute(step)
+
+
+def drop_habit_search_index(conn):
+    """
+    Remove the habit search index and its triggers from a scratch database,
+    so bulk inserts into it skip the per-row index updates.
+    """
+    for trigger in ("habits_fts_insert", "habits_fts_delete", "habits_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS habits_fts")
+
+
+# Ordered list of (version, description, steps). A step is either an SQL
+# string or a callable that receives the cursor.
+MIGRATIONS = [
+    (1, "base tables", BASE_SCHEMA),
+    (2, "habit and streak indexes", HABIT_INDEXES),
+    (3, "unique streak per habit and user", UNIQUE_STREAK),
+    (4, "completion event log", COMPLETION_LOG),
+    (5, "streak ranking indexes", STREAK_RANKING_INDEXES),
+    (6, "login sessions", SESSIONS),
+    (7, "habit paging index", HABIT_PAGING_INDEX),
+    (8, "habit names unique per user", PER_USER_HABIT_NAMES),
+    (9, "daily and weekly completion rollups", COMPLETION_ROLLUPS),
+    (10, "habit full-text search index", [habit_search_index]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+
+def get_version(conn) -> int:
+    """Return the schema version recorded in the database header."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target: int = SCHEMA_VERSION) -> list:
+    """
+    Upgrade the database to the target schema version.
+
+    Does nothing beyond reading ``PRAGMA user_version`` when the database is
+    already current, so it is cheap to call on every startup.
+
+    Args:
+        conn: An open database connection.
+        target (int): The version to migrate to (defaults to the latest).
+
+    Returns:
+        list: The versions that were applied, in order.
+    """
+    current = get_version(conn)
+    if current >= target:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+
+    # Table rebuilds drop and recreate tables, which must not cascade to the
+    # rows referencing them; the setting cannot change inside a transaction
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        return _apply(conn, current, target)
+    finally:
+        if foreign_keys:
+            conn.execute("PRAGMA foreign_keys = ON")
+
+
+def _apply(conn, current: int, target: int) -> list:
+    """Run the migrations after ``current`` up to ``target``, one transaction each."""
+    applied = []
+    for version, _description, steps in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        cursor = conn.cursor()
+        try:
+            # Take the write lock before looking at the version: another process
+            # migrating the same file may have applied this step meanwhile
+            cursor.execute("BEGIN IMMEDIATE")
+            if get_version(conn) >= version:
+                cursor.execute("COMMIT")
+                continue
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            # PRAGMA does not accept bound parameters; version is an int literal
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            cursor.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        applied.append(version)
+    return applied
@@ -0,0 +1,217 @@
+import sqlite3
+import threading
+from collections import deque
+
+
+class PoolTimeoutError(sqlite3.OperationalError):
+    """Raised when no pooled connection becomes available within the timeout."""
+
+
+class PooledConnection:
+    """A checked-out connection that is handed back to its pool instead of being closed.
+
+    Behaves like a ``sqlite3.Connection``: attribute access is forwarded to the
+    underlying connection, and using it as a context manager commits (or rolls
+    back on error) exactly like ``with sqlite3.connect(...) as conn:`` does.
+    The difference is that leaving the ``with`` block, or calling ``close()``,
+    returns the connection to the pool so the next caller can reuse it.
+
+    Only the outermost checkout commits or rolls back: a helper's nested
+    ``with get_connection()`` block runs inside its caller's transaction and
+    leaves it open, so the caller's half-finished work is never committed early.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    @property
+    def raw(self):
+        """The underlying ``sqlite3.Connection`` (for APIs that need the real object)."""
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._pool.depth() == 1:
+                # Commit on success, roll back on error (standard sqlite3 behaviour)
+                return self._conn.__exit__(exc_type, exc, tb)
+            return False
+        finally:
+            self.close()
+
+    def close(self):
+        """Release this checkout back to the pool (the connection stays open)."""
+        self._pool.release(self)
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections for a single database file.
+
+    Each thread checks out at most one connection at a time: nested calls to
+    ``connection()`` from the same thread return the same handle, so helper
+    functions that open their own ``with get_connection()`` block share the
+    caller's connection. The connection goes back to the pool once the
+    outermost checkout is released.
+
+    Args:
+        database (str): Path to the SQLite database file.
+        size (int): Maximum number of open connections.
+        timeout (float): Seconds to wait for a free connection before raising
+            ``PoolTimeoutError``.
+        init (callable, optional): Called with each new connection before its
+            first use, e.g. to apply PRAGMAs (see profiles.py).
+        **connect_kwargs: Extra keyword arguments passed to ``sqlite3.connect``.
+    """
+
+    def __init__(self, database, size=5, timeout=30.0, init=None, **connect_kwargs):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._init = init
+        self._connect_kwargs = connect_kwargs
+        self._idle = deque()
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    # ---------------------------
+    # Checkout / release
+    # ---------------------------
+
+    def connection(self):
+        """
+        Check out a connection for the current thread.
+
+        Returns:
+            PooledConnection: A handle that returns itself to the pool on close.
+        """
+        held = getattr(self._local, "handle", None)
+        if held is not None:
+            # Re-entrant checkout: the thread already holds a connection
+            self._local.depth += 1
+            with self._cond:
+                self.hits += 1
+            return held
+
+        conn = self._acquire()
+        handle = PooledConnection(self, conn)
+        self._local.handle = handle
+        self._local.depth = 1
+        return handle
+
+    def depth(self):
+        """Number of checkouts the current thread holds on its connection (0 if none)."""
+        return getattr(self._local, "depth", 0)
+
+    def release(self, handle):
+        """Release one checkout of ``handle``; the last release returns it to the pool."""
+        if getattr(self._local, "handle", None) is not handle:
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.handle = None
+
+        conn = handle.raw
+        # Never hand a half-finished transaction to the next caller
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._created -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def _acquire(self):
+        with self._cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed.")
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+            if self._created < self.size:
+                self.misses += 1
+                self._created += 1
+            else:
+                # Every connection is checked out: wait for one to come back
+                self.waits += 1
+                if not self._cond.wait_for(lambda: self._idle or self._closed, self.timeout):
+                    raise PoolTimeoutError(
+                        f"No connection available after {self.timeout}s (pool size {self.size})."
+                    )
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed.")
+                return self._idle.pop()
+
+        # Open the new connection outside the lock
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _connect(self):
+        # Connections may be used by different threads over their lifetime,
+        # but only ever by one thread at a time.
+        conn = sqlite3.connect(self.database, check_same_thread=False, **self._connect_kwargs)
+        if self._init is not None:
+            try:
+                self._init(conn)
+            except Exception:
+                conn.close()
+                raise
+        return conn
+
+    # ---------------------------
+    # Maintenance
+    # ---------------------------
+
+    def close(self):
+        """Close all idle connections; checked-out ones are closed when released."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Return a snapshot of the pool counters.
+
+        Returns:
+            dict: size, open, idle, hits, misses and waits.
+        """
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+            }
@@ -0,0 +1,99 @@
+"""
+Storage tuning profiles: named sets of PRAGMAs applied to every new connection.
+
+SQLite's defaults (rollback journal, ``synchronous=FULL``, a 2 MB page cache,
+no memory-mapped I/O) favour safety on any filesystem over speed. A profile
+trades between durability and speed in one consistent step:
+
+    default             SQLite's defaults, nothing is changed
+    durable             WAL, synchronous=FULL: every commit survives power loss
+    balanced            WAL, synchronous=NORMAL: a commit may be lost on power loss
+                        (never corrupted), larger cache, 256 MB mmap
+    throughput          WAL, synchronous=OFF: fastest writes; the last commits can
+                        be lost (or the file damaged) if the OS crashes
+    readonly-analytics  query_only, large cache and mmap, for report/replica readers
+
+``journal_mode=WAL`` is stored in the database file, so once any profile has
+switched a database to WAL it stays in WAL (readers no longer block the
+writer) even for connections using ``default``.
+
+The profile for the shared pools is taken from ``HABIT_TRACKER_PROFILE``
+(default ``default``) or set with ``db.configure_profile(name)``.
+"""
+
+# PRAGMA name -> value, applied in this order (journal_mode first)
+PROFILES = {
+    "default": {},
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16_000,  # negative: KiB, so 16 MB
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 5000,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64_000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256_000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 10_000,
+    },
+    "readonly-analytics": {
+        "query_only": 1,
+        "cache_size": -256_000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def check(name: str) -> str:
+    """
+    Return ``name`` if it is a known profile.
+
+    Raises:
+        ValueError: If there is no such profile.
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown storage profile '{name}'. Choose one of {', '.join(PROFILES)}.")
+    return name
+
+
+def is_read_only(name: str) -> bool:
+    """True if connections using the profile refuse writes."""
+    return bool(PROFILES[check(name)].get("query_only"))
+
+
+def apply(conn, name: str) -> None:
+    """Run the profile's PRAGMAs on an open connection (outside a transaction)."""
+    for pragma, value in PROFILES[check(name)].items():
+        # Both come from PROFILES, never from user input
+        conn.execute(f"PRAGMA {pragma} = {value}").fetchall()
+
+
+def initializer(name: str):
+    """
+    Return a connection initializer for ``pool.ConnectionPool(init=...)``,
+    or None for a profile without PRAGMAs.
+    """
+    if not PROFILES[check(name)]:
+        return None
+    return lambda conn: apply(conn, name)
+
+
+def settings(conn) -> dict:
+    """Read back the PRAGMAs profiles control, for reports and checks."""
+    return {pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            for pragma in ("journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store",
+                           "busy_timeout", "query_only")}
@@ -0,0 +1,312 @@
+"""
+Read-only replicas of the primary database for analytics.
+
+Long analytics reads on ``habit_tracker.db`` hold shared locks that make
+``main.py``'s write transactions wait (rollback-journal mode) or keep the WAL
+from being checkpointed. A ``ReplicaManager`` instead copies the primary into
+replica files with the online backup API (``sqlite3.Connection.backup``),
+so the long reads hit the copies and the primary is only read while copying:
+
+    replicas/replica-0.db, replicas/replica-1.db, ...   rotating copies
+    replicas/replicas.json                              primary path and copy times
+
+Each copy is written to a temporary file and renamed over the stalest slot,
+so a replica file never changes once it is in place. Readers therefore open
+replicas with ``immutable=1``: no locks at all, and a dashboard can never
+block completion logging.
+
+The copy is paced: a few hundred pages per step, with a short pause in
+between, so writers are never held up for longer than one step. When the
+primary is in WAL mode the copy is taken from one read snapshot, so
+concurrent commits neither stall nor restart it. In rollback-journal mode a
+commit between two steps makes SQLite start the copy over; after
+``max_restarts`` restarts the refresh gives up with ``ReplicaBusyError``
+rather than block the writers (switch the primary to WAL, e.g. the
+``balanced`` profile, to copy a busy database).
+
+A replica is as old as the moment its (last) copy pass started: the
+primary's modification time is recorded then, so a commit that lands while
+the copy runs marks the replica as behind.
+
+With ``HABIT_TRACKER_REPLICA_DIR`` set (and single-file storage) the
+analytics menu reads from the freshest replica and says how old it is.
+
+Usage:
+    python replica.py refresh [--db habit_tracker.db] [--dir replicas]
+    python replica.py watch --interval 60      # refresh periodically
+    python replica.py status
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+import profiles
+
+# Replica directory used by the analytics menu; None reads the primary
+REPLICA_DIR = os.environ.get("HABIT_TRACKER_REPLICA_DIR") or None
+
+# Pages copied per backup step, and the pause between steps (seconds)
+PAGES_PER_STEP = int(os.environ.get("HABIT_TRACKER_REPLICA_PAGES", "256"))
+STEP_SLEEP = 0.005
+
+# Times a copy of a rollback-journal primary may be restarted by commits before the refresh gives up
+MAX_RESTARTS = 3
+
+# Number of rotating replica files
+DEFAULT_SLOTS = 2
+
+STATE_FILE = "replicas.json"
+
+
+class ReplicaBusyError(sqlite3.OperationalError):
+    """Raised when commits to the primary keep restarting a replica copy."""
+
+
+def _load_state(directory: str) -> dict:
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {"primary": None, "replicas": {}}
+
+
+def _save_state(directory: str, state: dict) -> None:
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + ".tmp", "w") as handle:
+        json.dump(state, handle, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _modified_at(primary: str) -> float:
+    """Last write to the primary, counting commits still in its WAL file."""
+    return max((os.path.getmtime(path) for path in (primary, primary + "-wal") if os.path.exists(path)),
+               default=0.0)
+
+
+# ---------------------------
+# Copying
+# ---------------------------
+
+class ReplicaManager:
+    """Keeps rotating read-only copies of one primary database in a directory."""
+
+    def __init__(self, primary: str, directory: str, slots: int = DEFAULT_SLOTS,
+                 pages_per_step: int = PAGES_PER_STEP, step_sleep: float = STEP_SLEEP,
+                 max_restarts: int = MAX_RESTARTS):
+        self.primary = os.path.abspath(primary)
+        self.directory = directory
+        self.slots = slots
+        self.pages_per_step = pages_per_step
+        self.step_sleep = step_sleep
+        self.max_restarts = max_restarts
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def slot_path(self, slot: int) -> str:
+        return os.path.join(self.directory, f"replica-{slot}.db")
+
+    def refresh(self) -> dict:
+        """
+        Copy the primary over the stalest replica slot.
+
+        Returns:
+            dict: The new replica's path, copied_at (epoch seconds when the copy
+            started, which its data is as of), seconds taken, pages, backup steps
+            and restarts.
+
+        Raises:
+            ReplicaBusyError: Commits restarted the copy more than ``max_restarts`` times.
+        """
+        with self._lock:
+            state = _load_state(self.directory)
+            copies = state["replicas"] if state.get("primary") == self.primary else {}
+            slot = min(range(self.slots), key=lambda i: copies.get(self.slot_path(i), {}).get("copied_at", 0))
+            path = self.slot_path(slot)
+            staging = path + ".tmp"
+            if os.path.exists(staging):
+                os.remove(staging)
+
+            steps, restarts = [], 0
+            # Read-only, so closing it never checkpoints (writes) the primary
+            source = sqlite3.connect(f"file:{quote(self.primary)}?mode=ro", uri=True, isolation_level=None)
+            target = sqlite3.connect(staging)
+            try:
+                # Taken before the copy: anything committed from here on counts as newer than the replica
+                started = copied_at = time.time()
+                source_mtime = _modified_at(self.primary)
+                stamp = (copied_at, source_mtime)
+                if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                    # Copy from one snapshot; commits after it go to the WAL and do not restart the copy
+                    source.execute("BEGIN")
+                    source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+                def progress(status, remaining, total):
+                    nonlocal restarts, copied_at, source_mtime, stamp
+                    if steps and remaining >= steps[-1][0]:
+                        # A commit between the last two steps made SQLite start the copy over
+                        restarts += 1
+                        if restarts > self.max_restarts:
+                            raise ReplicaBusyError(f"Gave up copying {self.primary}: writes restarted the copy "
+                                                   f"{restarts} times.")
+                        copied_at, source_mtime = stamp
+                    steps.append((remaining, total))
+                    if remaining:
+                        # backup() only sleeps after a busy step; pause here so writers get their turn
+                        time.sleep(self.step_sleep)
+                    # No lock is held between steps; the next one starts from here
+                    stamp = (time.time(), _modified_at(self.primary))
+
+                source.backup(target, pages=self.pages_per_step, progress=progress)
+                if source.in_transaction:
+                    source.execute("COMMIT")
+                # Replicas are opened immutable, which needs a rollback-journal file
+                target.execute("PRAGMA journal_mode = DELETE")
+            except ReplicaBusyError:
+                target.close()
+                os.remove(staging)
+                raise
+            finally:
+                target.close()
+                source.close()
+
+            os.replace(staging, path)
+            info = {"copied_at": copied_at, "source_mtime": source_mtime,
+                    "seconds": round(time.time() - started, 3), "pages": steps[-1][1] if steps else 0,
+                    "steps": len(steps), "restarts": restarts}
+            copies[path] = info
+            _save_state(self.directory, {"primary": self.primary, "replicas": copies})
+            return {"path": path, **info}
+
+    def start(self, interval: float) -> None:
+        """Refresh in a background thread every ``interval`` seconds until ``stop``."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.refresh()
+                except sqlite3.Error as e:
+                    print(f"⚠️ Replica refresh failed: {e}", file=sys.stderr)
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=loop, name="replica-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh (an in-progress copy finishes first)."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+def freshest(directory: str) -> dict | None:
+    """
+    Describe the most recent replica in a directory.
+
+    Returns:
+        dict or None: path, primary, copied_at, age_seconds (since the copy) and
+        behind (True if the primary has been written since); None if there is no replica.
+    """
+    state = _load_state(directory)
+    copies = [(path, info) for path, info in state["replicas"].items() if os.path.exists(path)]
+    if not copies:
+        return None
+    path, info = max(copies, key=lambda item: item[1]["copied_at"])
+    primary = state["primary"]
+    return {
+        "path": path,
+        "primary": primary,
+        "copied_at": info["copied_at"],
+        "age_seconds": round(time.time() - info["copied_at"], 3),
+        "behind": _modified_at(primary) > info["source_mtime"] if primary else True,
+    }
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a replica read-only without taking any locks, tuned for analytics reads."""
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro&immutable=1", uri=True,
+                           check_same_thread=False)
+    profiles.apply(conn, "readonly-analytics")
+    return conn
+
+
+def connect_freshest(directory: str | None = None):
+    """
+    Open the freshest replica.
+
+    Args:
+        directory (str, optional): Replica directory (default: REPLICA_DIR).
+
+    Returns:
+        tuple: (connection, status from ``freshest``), or (None, None) when no
+        replica directory is configured or it holds no replica yet.
+    """
+    directory = directory or REPLICA_DIR
+    status = freshest(directory) if directory else None
+    if status is None:
+        return None, None
+    return connect(status["path"]), status
+
+
+def describe_age(status: dict) -> str:
+    """Human-readable staleness of a replica, e.g. 'up to date (copied 12s ago)'."""
+    seconds = status["age_seconds"]
+    age = f"{seconds:.0f}s" if seconds < 120 else f"{seconds / 60:.0f} min" if seconds < 7200 else \
+        f"{seconds / 3600:.1f} h"
+    return f"{'behind the primary' if status['behind'] else 'up to date'} (copied {age} ago)"
+
+
+# ---------------------------
+# Command line
+# ---------------------------
+
+def main(argv=None) -> int:
+    import argparse
+
+    import db
+
+    parser = argparse.ArgumentParser(description="Maintain read-only analytics replicas of the database.")
+    parser.add_argument("command", choices=("refresh", "watch", "status"))
+    parser.add_argument("--db", default=db.DATABASE_URL, help="primary database (default: %(default)s)")
+    parser.add_argument("--dir", default=REPLICA_DIR or "replicas", help="replica directory (default: %(default)s)")
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="rotating replica files")
+    parser.add_argument("--pages", type=int, default=PAGES_PER_STEP, help="pages copied per backup step")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between refreshes for 'watch'")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        status = freshest(args.dir)
+        print(json.dumps(status, indent=2) if status else f"No replica in {args.dir}.")
+        return 0 if status else 1
+
+    manager = ReplicaManager(args.db, args.dir, slots=args.slots, pages_per_step=args.pages)
+    while True:
+        try:
+            info = manager.refresh()
+        except ReplicaBusyError as e:
+            print(f"⚠️ {e}", file=sys.stderr)
+            if args.command == "refresh":
+                return 1
+        else:
+            print(f"✅ Copied {info['pages']} page(s) to {info['path']} in {info['seconds']:.2f}s "
+                  f"({info['steps']} step(s), {info['restarts']} restart(s)).")
+            if args.command == "refresh":
+                return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
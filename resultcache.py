@@ -0,0 +1,223 @@
+"""
+Versioned in-process cache for analytics results.
+
+Dashboards poll the same aggregates over and over, and each poll re-runs the
+query even when nothing was written in between. ``ResultCache.call(cursor,
+fn, *args, **kwargs)`` runs an analyze.py helper once and then serves its
+result from memory until the database changes.
+
+Entries are keyed on what the data is, not on which connection read it, so
+they survive reconnects, pool churn and the analytics menu reopening a
+replica. For a database file the cache keeps its own read-only watch
+connection, whose ``PRAGMA data_version`` moves whenever any connection (in
+this process or another) commits; together with the file's identity (device
+and inode, which change when a replica refresh renames a new copy into place)
+it forms the content token an entry was computed under. An entry whose token
+no longer matches is stale. A connection in the middle of a transaction, or
+one still reading a file that has since been replaced, may see other data
+than the file does now, so its calls are passed through uncached. In-memory
+databases are private to their connection and use its ``data_version`` and
+``total_changes`` instead.
+
+Entries are evicted least-recently-used first once there are more than
+``max_entries`` of them or their (pickled) size exceeds ``max_bytes``.
+Iterators, calls with unhashable arguments and sources that are not database
+cursors (snapshots) are passed through uncached. Cached results are shared
+between callers, so treat them as read-only.
+
+The process-wide cache used by the analytics menu is sized from
+``HABIT_TRACKER_CACHE_ENTRIES`` (default 1024, 0 disables it) and
+``HABIT_TRACKER_CACHE_MB`` (default 64).
+
+Usage:
+    import analyze, resultcache
+    cache = resultcache.get_cache()
+    with db.get_connection() as conn:
+        top = cache.call(conn.cursor(), analyze.fetch_top_streaks, k=10)
+    print(cache.info())
+"""
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from typing import Iterator
+from urllib.parse import quote
+
+MAX_ENTRIES = int(os.environ.get("HABIT_TRACKER_CACHE_ENTRIES", "1024"))
+MAX_BYTES = int(float(os.environ.get("HABIT_TRACKER_CACHE_MB", "64")) * 1024 * 1024)
+
+# Connections whose database is remembered, and database files watched for commits
+TRACKED_CONNECTIONS = 64
+TRACKED_DATABASES = 16
+
+
+def _sizeof(value) -> int:
+    # The pickled size tracks the memory a result holds well enough for a budget
+    import pickle
+
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _database_of(conn):
+    # The main database file identifies the data; None for in-memory databases
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main" and path:
+            return os.path.realpath(path)
+    return None
+
+
+def _identity(path):
+    # The file behind a path; a replica refresh renames a new file over the old name
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+class ResultCache:
+    """An LRU, size-bounded cache of analytics results, invalidated when the database changes."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "uncached": 0}
+        # key -> (token, result, size), least recently used first
+        self._entries = OrderedDict()
+        # id(conn) -> (conn, database, file identity when first seen); holding the
+        # connection keeps its id from being reused by another one
+        self._connections = OrderedDict()
+        # database -> (file identity, serial, watch connection)
+        self._watchers = OrderedDict()
+        self._serial = 0
+        self._lock = threading.Lock()
+
+    def _token(self, conn):
+        # (database, content token) for the data conn reads, or None if its results can't be shared
+        if conn.in_transaction:
+            return None
+        state = self._connections.get(id(conn))
+        if state is None or state[0] is not conn:
+            database = _database_of(conn)
+            state = (conn, database, _identity(database) if database else None)
+            self._connections[id(conn)] = state
+            if len(self._connections) > TRACKED_CONNECTIONS:
+                self._connections.popitem(last=False)
+        self._connections.move_to_end(id(conn))
+        _, database, identity = state
+        if database is None:
+            return (":memory:", id(conn)), (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+        if identity is None or _identity(database) != identity:
+            return None
+
+        watcher = self._watchers.get(database)
+        if watcher is None or watcher[0] != identity:
+            if watcher is not None:
+                watcher[2].close()
+            # A new watch connection starts counting afresh, so its tokens get a new serial
+            self._serial += 1
+            watcher = (identity, self._serial,
+                       sqlite3.connect(f"file:{quote(database)}?mode=ro", uri=True, check_same_thread=False))
+            self._watchers[database] = watcher
+            if len(self._watchers) > TRACKED_DATABASES:
+                self._watchers.popitem(last=False)[1][2].close()
+        self._watchers.move_to_end(database)
+        return database, (identity, watcher[1], watcher[2].execute("PRAGMA data_version").fetchone()[0])
+
+    def call(self, cursor, fn, *args, **kwargs):
+        """
+        Return ``fn(cursor, *args, **kwargs)``, from the cache if the database
+        has not changed since it was computed.
+
+        Args:
+            cursor: A database cursor (anything else is passed through uncached).
+            fn (callable): An analyze.py helper taking the cursor first.
+
+        Returns:
+            The helper's result.
+        """
+        conn = getattr(cursor, "connection", None)
+        key = (fn.__module__, fn.__qualname__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            conn = None
+        if conn is None:
+            self.stats["uncached"] += 1
+            return fn(cursor, *args, **kwargs)
+
+        with self._lock:
+            try:
+                version = self._token(conn)
+            except sqlite3.Error:
+                version = None
+            if version is not None:
+                database, token = version
+                key = (database,) + key
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] == token:
+                        self._entries.move_to_end(key)
+                        self.stats["hits"] += 1
+                        return entry[1]
+                    self._drop(key)
+                    self.stats["stale"] += 1
+                self.stats["misses"] += 1
+        if version is None:
+            self.stats["uncached"] += 1
+            return fn(cursor, *args, **kwargs)
+
+        result = fn(cursor, *args, **kwargs)
+        if isinstance(result, Iterator):
+            self.stats["uncached"] += 1
+            return result
+        size = _sizeof(result)
+        if size <= self.max_bytes:
+            with self._lock:
+                if key in self._entries:
+                    self._drop(key)
+                self._entries[key] = (token, result, size)
+                self.bytes += size
+                while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+                    self.stats["evictions"] += 1
+        return result
+
+    def _drop(self, key):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        """Forget every entry and close the watch connections (statistics are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            for _, _, watcher in self._watchers.values():
+                watcher.close()
+            self._watchers.clear()
+
+    def info(self) -> dict:
+        """Hit/miss statistics, the hit rate and the current number and size of entries."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                    "entries": len(self._entries), "bytes": self.bytes}
+
+
+# ---------------------------
+# Process-wide cache
+# ---------------------------
+
+_cache = None
+
+
+def get_cache():
+    """Return the process-wide cache, or None if HABIT_TRACKER_CACHE_ENTRIES is 0."""
+    global _cache
+    if _cache is None and MAX_ENTRIES > 0:
+        _cache = ResultCache()
+    return _cache
@@ -0,0 +1,125 @@
+"""
+Daily and weekly completion rollups.
+
+Calendar questions ("completions per week for this habit", "how many habits
+were done each day this month") would otherwise scan the raw ``completions``
+log. Two rollup tables keep one row per habit and period instead:
+
+    completion_daily(habit_id, period_start = the day, user_id, completions)
+    completion_weekly(habit_id, period_start = the Monday, user_id, completions)
+
+They are maintained incrementally by every writer of the log -
+``completions.record_completion`` (and so ``log_completion``), bulk
+ingestion and the synthetic data generator - so reads cost O(periods in the
+range) no matter how many events were logged. ``rebuild`` recomputes them
+from the log when they need repairing.
+
+Usage:
+    python rollups.py rebuild
+"""
+import sys
+from datetime import date, timedelta
+
+from db import get_connection
+
+# Periodicity -> rollup table
+TABLES = {"daily": "completion_daily", "weekly": "completion_weekly"}
+
+# SQL expression giving the Monday on or before an ISO 'YYYY-MM-DD' column
+SQL_WEEK_START = "date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')"
+
+# Period expression per rollup, applied to the completed_on column
+_PERIOD_START = {
+    "daily": "{column}",
+    "weekly": SQL_WEEK_START,
+}
+
+
+def week_start(day: date) -> date:
+    """Return the Monday of the week containing ``day``."""
+    return day - timedelta(days=day.weekday())
+
+
+def period_start(day: date, periodicity: str) -> date:
+    """Return the first day of the daily or weekly period containing ``day``."""
+    return week_start(day) if periodicity == "weekly" else day
+
+
+# ---------------------------
+# Incremental maintenance
+# ---------------------------
+
+def record(cursor, habit_id: int, user_id: int, completed_on: date, count: int = 1) -> None:
+    """
+    Add completions on one day to both rollups (two single-row upserts).
+
+    The caller commits, together with the completion itself.
+    """
+    for periodicity, table in TABLES.items():
+        cursor.execute(f"""
+            INSERT INTO {table} (habit_id, period_start, user_id, completions)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (habit_id, period_start) DO UPDATE SET completions = completions + excluded.completions
+        """, (habit_id, period_start(completed_on, periodicity).isoformat(), user_id, count))
+
+
+def add_completions(cursor, where: str = "true", params=(), source: str = "completions") -> None:
+    """
+    Add a set of logged completions to both rollups with one grouped upsert each.
+
+    Args:
+        cursor: The database cursor object.
+        where (str): Condition selecting the new rows of ``source`` (e.g. "completion_id > ?").
+        params: Parameters of ``where``.
+        source (str): Table holding the rows (e.g. an attached database's completions).
+    """
+    for periodicity, table in TABLES.items():
+        start = _PERIOD_START[periodicity].format(column="completed_on")
+        cursor.execute(f"""
+            INSERT INTO {table} (habit_id, period_start, user_id, completions)
+            SELECT habit_id, {start}, user_id, COUNT(*)
+            FROM {source}
+            WHERE {where}
+            GROUP BY habit_id, {start}
+            ON CONFLICT (habit_id, period_start) DO UPDATE SET completions = completions + excluded.completions
+        """, params)
+
+
+def rebuild(conn, habit_ids=None) -> int:
+    """
+    Recompute the rollups from the completion log and commit.
+
+    Args:
+        conn: An open database connection.
+        habit_ids (iterable of int, optional): Only these habits; None rebuilds
+            everything (leaving out completions of habits that no longer exist).
+
+    Returns:
+        int: The number of daily rollup rows written.
+    """
+    cursor = conn.cursor()
+    if habit_ids is None:
+        where, params = "habit_id IN (SELECT habit_id FROM habits)", ()
+    else:
+        habit_ids = [int(habit_id) for habit_id in habit_ids]
+        where, params = f"habit_id IN ({', '.join('?' * len(habit_ids))})", habit_ids
+    try:
+        for table in TABLES.values():
+            cursor.execute(f"DELETE FROM {table} WHERE {where}", params)
+        add_completions(cursor, where, params)
+        cursor.execute(f"SELECT COUNT(*) FROM completion_daily WHERE {where}", params)
+        rows = cursor.fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return rows
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python rollups.py rebuild")
+        sys.exit(2)
+    with get_connection() as conn:
+        rebuilt = rebuild(conn)
+    print(f"✅ Rebuilt {rebuilt} daily rollup row(s) from the completion log.")
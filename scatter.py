@@ -0,0 +1,176 @@
+"""
+Parallel scatter-gather analytics over many database files.
+
+Global questions ("longest streak across all habits", "how many habits have
+a 30-day run") over shards, archived partitions or per-node exports are
+answered by running the same analyze.py helper against every file in a
+``ProcessPoolExecutor`` - one SQLite connection and one core per file - and
+merging the partial results in the parent with the MERGES table from
+shards.py (top-K, counts, histograms, concatenation, ...). Each worker only
+sends back its partial result, so the work scales with the number of cores
+until the disk becomes the limit.
+
+Files are opened read-only; the helpers must be listed in ``shards.MERGES``.
+``fetch_population_streaks`` assumes every habit lives in one file (true for
+shards, not for time-partitioned archives).
+
+In sharded mode the analytics menu uses this executor when
+``HABIT_TRACKER_ANALYTICS_WORKERS`` is greater than 1.
+
+Usage:
+    python scatter.py counts shards/shard-*.db
+    python scatter.py top shards/shard-*.db archive/*.db -k 10 --by longest_streak
+    python scatter.py histogram shards/shard-*.db --workers 8 --timing
+"""
+import os
+import sqlite3
+import sys
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from shards import MERGES, bind_arguments
+
+# Default number of worker processes
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def run_on_database(path: str, name: str, arguments: dict):
+    """
+    Run ``analyze.<name>(cursor, **arguments)`` on one database file, read-only.
+
+    This is the function the worker processes execute; streaming helpers are
+    materialised so their rows can be sent back.
+    """
+    import analyze
+
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        result = getattr(analyze, name)(conn.cursor(), **arguments)
+        return list(result) if isinstance(result, Iterator) else result
+    finally:
+        conn.close()
+
+
+def _concat(results, arguments):
+    return [row for result in results for row in result]
+
+
+class ScatterGather:
+    """Runs analyze helpers against a fixed set of database files in parallel.
+
+    The worker processes are started on first use and reused until ``close()``
+    (or the end of a ``with`` block).
+
+    Args:
+        paths (iterable of str): Database files to query.
+        workers (int, optional): Worker processes (default: one per core, at
+            most one per file). With 1 the files are queried in this process.
+    """
+
+    def __init__(self, paths, workers=None):
+        self.paths = list(paths)
+        if not self.paths:
+            raise ValueError("At least one database file is required.")
+        self.workers = max(1, min(workers or DEFAULT_WORKERS, len(self.paths)))
+        self._executor = None
+
+    def gather(self, name: str, calls: dict) -> list:
+        """
+        Run one helper per file and collect the partial results.
+
+        Args:
+            name (str): Name of the analyze.py helper.
+            calls (dict): File index -> keyword arguments for that file.
+
+        Returns:
+            list: The partial results, in file index order.
+        """
+        calls = {index: {k: v for k, v in arguments.items() if k != "cursor"}
+                 for index, arguments in sorted(calls.items())}
+        if self.workers == 1 or len(calls) == 1:
+            return [run_on_database(self.paths[index], name, arguments) for index, arguments in calls.items()]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        futures = [self._executor.submit(run_on_database, self.paths[index], name, arguments)
+                   for index, arguments in calls.items()]
+        return [future.result() for future in futures]
+
+    def query(self, fn, *args, **kwargs):
+        """
+        Run ``fn(cursor, *args, **kwargs)`` against every file and merge the results.
+
+        Returns:
+            The merged result, shaped like ``fn``'s result on a single database
+            (lists for the streaming ``iter_*`` helpers).
+        """
+        name = fn.__name__
+        if name not in MERGES:
+            raise ValueError(f"{name} cannot be run across databases.")
+        arguments = bind_arguments(fn, args, kwargs)
+        results = self.gather(name, {index: arguments for index in range(len(self.paths))})
+        return (MERGES[name] or _concat)(results, arguments)
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ---------------------------
+# Command line
+# ---------------------------
+
+def main(argv=None) -> int:
+    import argparse
+    import json
+
+    import analyze
+
+    queries = {
+        "counts": lambda run, args: run(analyze.fetch_counts),
+        "longest": lambda run, args: run(analyze.fetch_longest_streak),
+        "top": lambda run, args: run(analyze.fetch_top_streaks, k=args.k, periodicity=args.periodicity,
+                                     by=args.by),
+        "histogram": lambda run, args: run(analyze.fetch_streak_histogram, by=args.by,
+                                           periodicity=args.periodicity),
+    }
+
+    parser = argparse.ArgumentParser(description="Run an analytics query across many database files.")
+    parser.add_argument("query", choices=queries)
+    parser.add_argument("files", nargs="+", help="database files (shards, archives, exports)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes (default: %(default)s)")
+    parser.add_argument("-k", type=int, default=10, help="rows for 'top'")
+    parser.add_argument("--by", choices=analyze.STREAK_METRICS, default="longest_streak")
+    parser.add_argument("--periodicity", choices=("daily", "weekly"))
+    parser.add_argument("--timing", action="store_true", help="also time one worker against --workers")
+    args = parser.parse_args(argv)
+
+    with ScatterGather(args.files, args.workers) as executor:
+        print(json.dumps(queries[args.query](executor.query, args), default=str))
+
+        if args.timing:
+            # Timed after the first run, so the workers are up and the files are cached
+            serial = ScatterGather(args.files, 1)
+            timings = {}
+            for label, runner in (("1 worker", serial), (f"{executor.workers} workers", executor)):
+                start = time.perf_counter()
+                queries[args.query](runner.query, args)
+                timings[label] = time.perf_counter() - start
+            one, many = timings.values()
+            print(f"{len(args.files)} files: " + ", ".join(f"{label} {seconds:.3f}s" for label, seconds
+                                                          in timings.items()) + f" ({one / many:.2f}x)",
+                  file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
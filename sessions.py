@@ -0,0 +1,187 @@
+"""
+Authenticated sessions, so clients check their credentials once per login
+instead of once per action.
+
+``login`` verifies a username and password, stores a random token in the
+``sessions`` table and keeps the resulting Session in an in-process cache.
+Later actions pass the Session (or its token) instead of credentials, and
+``authenticate_token`` / ``validate`` resolve it with one dictionary lookup
+and an expiry check. The table lets a token outlive the process that created
+it - e.g. a token printed by ``cli.py login`` and used by later invocations -
+in which case the first lookup in a new process reads it from the database
+and caches it.
+"""
+import os
+import secrets
+import threading
+import time
+
+import tracker
+
+# Session lifetime in seconds (override with HABIT_TRACKER_SESSION_TTL)
+DEFAULT_TTL = int(os.environ.get("HABIT_TRACKER_SESSION_TTL", str(12 * 60 * 60)))
+
+# token -> Session for every session this process has created or resolved
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class SessionExpiredError(tracker.AuthenticationError):
+    """The session token is unknown, has been revoked or has expired."""
+
+
+class Session:
+    """An authenticated user session.
+
+    Attributes:
+        token (str): Random, URL-safe session token.
+        user_id (int): ID of the authenticated user.
+        username (str): The authenticated user's name.
+        expires_at (float): Expiry time as a Unix timestamp.
+    """
+
+    def __init__(self, token, user_id, username, expires_at):
+        self.token = token
+        self.user_id = user_id
+        self.username = username
+        self.expires_at = expires_at
+
+    def expired(self, now=None) -> bool:
+        """Return True once the session's lifetime has passed."""
+        return (time.time() if now is None else now) >= self.expires_at
+
+    def __repr__(self):
+        return f"Session(user_id={self.user_id}, username={self.username!r}, expires_at={self.expires_at})"
+
+
+# ---------------------------
+# Login and logout
+# ---------------------------
+
+def login(cursor, username: str, password: str, ttl: int = DEFAULT_TTL) -> Session:
+    """
+    Check a username and password and open a session for the user.
+
+    The caller commits the transaction.
+
+    Args:
+        cursor: The database cursor object.
+        username (str): The user's name.
+        password (str): The user's password.
+        ttl (int): Session lifetime in seconds.
+
+    Returns:
+        Session: The new session.
+
+    Raises:
+        AuthenticationError: If the credentials do not match a user.
+    """
+    user_id, username = tracker.authenticate(cursor, username, password)
+    # The user ID prefix routes the token to the user's shard (see token_user_id)
+    session = Session(f"{user_id}.{secrets.token_urlsafe(32)}", user_id, username, time.time() + ttl)
+    cursor.execute(
+        "INSERT INTO sessions (token, user_id, expires_at) VALUES (?, ?, ?)",
+        (session.token, session.user_id, session.expires_at)
+    )
+    with _cache_lock:
+        _cache[session.token] = session
+    return session
+
+
+def logout(cursor, token: str) -> None:
+    """End a session. The caller commits the transaction."""
+    with _cache_lock:
+        _cache.pop(token, None)
+    cursor.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+
+def revoke_user(cursor, user_id: int) -> None:
+    """End every session of a user, e.g. when the account is deleted."""
+    with _cache_lock:
+        for token in [t for t, s in _cache.items() if s.user_id == user_id]:
+            del _cache[token]
+    cursor.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+
+def purge_expired(cursor) -> int:
+    """
+    Delete expired sessions from the cache and the database.
+
+    Returns:
+        int: The number of session rows deleted.
+    """
+    now = time.time()
+    with _cache_lock:
+        for token in [t for t, s in _cache.items() if s.expired(now)]:
+            del _cache[token]
+    cursor.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+    return cursor.rowcount
+
+
+# ---------------------------
+# Authentication
+# ---------------------------
+
+def authenticate_token(token: str, cursor=None) -> Session:
+    """
+    Resolve a session token to its Session.
+
+    The hot path is a single cache lookup. Tokens created by another process
+    are looked up in the database when a cursor is given, then cached.
+
+    Raises:
+        SessionExpiredError: If the token is unknown, revoked or expired.
+    """
+    session = _cache.get(token)
+    if session is None and cursor is not None:
+        cursor.execute("""
+            SELECT s.token, s.user_id, u.username, s.expires_at
+            FROM sessions s
+            JOIN users u ON u.user_id = s.user_id
+            WHERE s.token = ?
+        """, (token,))
+        row = cursor.fetchone()
+        if row:
+            session = Session(*row)
+            with _cache_lock:
+                _cache[token] = session
+    if session is None:
+        raise SessionExpiredError("Invalid or expired session. Please log in again.")
+    if session.expired():
+        with _cache_lock:
+            _cache.pop(token, None)
+        raise SessionExpiredError("Session expired. Please log in again.")
+    return session
+
+
+def token_user_id(token: str):
+    """
+    Return the user ID a token was issued to, read from its prefix without a
+    lookup, or None if it has none. It only picks the database (shard) to look
+    the token up in; authenticate_token still decides whether it is valid.
+    """
+    user_id, dot, _ = token.partition(".")
+    return int(user_id) if dot and user_id.isdigit() else None
+
+
+def is_active(session: Session) -> bool:
+    """Return True while a Session has not been logged out, revoked or expired."""
+    return session.token in _cache and not session.expired()
+
+
+def validate(session: Session) -> Session:
+    """
+    Check that a Session is still live (see ``is_active``).
+
+    Raises:
+        SessionExpiredError: If it is not.
+    """
+    if not is_active(session):
+        raise SessionExpiredError("Session expired. Please log in again.")
+    return session
+
+
+def clear_cache() -> None:
+    """Forget all cached sessions (they can still be resolved from the database)."""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,451 @@
+"""
+Sharded storage: users hash-partitioned across several SQLite files.
+
+SQLite allows one writer per database file, so with a single file every
+``log_completion`` waits for every other one. In sharded mode each user and
+everything they own (habits, streaks, completions, sessions) lives in one of
+N shard files, and writers for users on different shards never contend::
+
+    shards/
+        directory.db      username -> shard, plus the shard count
+        shard-000.db      an ordinary habit tracker database
+        shard-001.db
+        ...
+
+Routing:
+    - by username: the directory, falling back to ``crc32(username) % N`` for
+      usernames not registered yet. Registration claims the directory row, so
+      a username stays on its shard even after shards are added.
+    - by user or habit ID: IDs are globally unique because shard ``i`` hands
+      out IDs from ``i * SHARD_SPAN + 1`` (its AUTOINCREMENT counters are
+      seeded there), so ``id // SHARD_SPAN`` is the shard - no lookup needed.
+    - global analytics: ``ShardMap.query`` runs an analyze.py helper on every
+      shard (or only the shards owning the requested users/habits) and merges
+      the partial results.
+
+Every process (or node sharing the filesystem) computes the same routes, and
+the directory is only written when a user registers.
+
+Enable with ``HABIT_TRACKER_SHARD_DIR=shards`` (and ``HABIT_TRACKER_SHARDS=8``
+for the shard count of a new layout) or ``db.configure_shards("shards", 8)``.
+
+Usage:
+    python shards.py init shards --count 8
+    python shards.py info shards
+    python shards.py route shards alice
+"""
+import heapq
+import os
+import sys
+import threading
+import zlib
+from itertools import chain
+
+import migrations
+from pool import ConnectionPool
+
+# IDs per shard: shard i owns IDs i * SHARD_SPAN + 1 .. (i + 1) * SHARD_SPAN
+SHARD_BITS = 40
+SHARD_SPAN = 1 << SHARD_BITS
+
+# Shard count used when a new layout is created without one
+DEFAULT_SHARD_COUNT = 4
+
+DIRECTORY_FILE = "directory.db"
+
+DIRECTORY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS shard_users (
+        username TEXT PRIMARY KEY,
+        shard INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS shard_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+]
+
+
+class ShardRoutingError(ValueError):
+    """A connection was requested in sharded mode without a user to route by."""
+
+
+def shard_of_id(row_id: int) -> int:
+    """Return the shard that handed out a user, habit or streak ID."""
+    return int(row_id) // SHARD_SPAN
+
+
+def hash_shard(username: str, count: int) -> int:
+    """Return the default shard of a username (stable across processes and platforms)."""
+    return zlib.crc32(username.encode("utf-8")) % count
+
+
+# ---------------------------
+# Merging partial results
+# ---------------------------
+# Each analyze helper that ShardMap.query supports has a merge function taking
+# the per-shard results and the call's bound arguments.
+
+def _concat(results, arguments):
+    return list(chain.from_iterable(results))
+
+
+def _first(results, arguments):
+    return next((result for result in results if result is not None), None)
+
+
+def _longest(results, arguments):
+    found = [result for result in results if result]
+    return max(found, key=lambda row: row[1]) if found else None
+
+
+def _top_k(results, arguments):
+    return heapq.nlargest(arguments["k"], chain.from_iterable(results), key=lambda row: row[1])
+
+
+def _union(results, arguments):
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+def _add(results, arguments):
+    totals = {}
+    for result in results:
+        for key, value in result.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def _add_histograms(results, arguments):
+    return dict(sorted(_add(results, arguments).items()))
+
+
+def _best_matches(results, arguments):
+    # Same order as search_habits: score, then the shorter name
+    return heapq.nsmallest(arguments["limit"], chain.from_iterable(results),
+                           key=lambda row: (row[3], len(row[1]), row[0]))
+
+
+def _concat_arrays(results, arguments):
+    # Shards hold disjoint, ascending ID ranges, so concatenating keeps the
+    # per-habit arrays sorted by habit_id and the per-run arrays in habit order
+    import numpy as np
+
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+
+MERGES = {
+    "iter_all_habits": None,  # streamed shard after shard
+    "iter_habits_by_periodicity": None,
+    "iter_all_streaks": None,
+    "fetch_all_habits": _concat,
+    "fetch_habits_by_periodicity": _concat,
+    "fetch_all_streaks": _concat,
+    "fetch_streak_for_habit": _first,
+    "fetch_longest_streak": _longest,
+    "fetch_top_streaks": _top_k,
+    "fetch_population_streaks": _concat_arrays,
+    "fetch_habit_names": _union,
+    "fetch_counts": _add,
+    "fetch_streak_histogram": _add_histograms,
+    "fetch_completion_heatmap": _add_histograms,
+    "fetch_habits_done_per_day": _add_histograms,
+    "fetch_weekly_completions": _concat,
+    "fetch_adherence": _first,
+    "search_habits": _best_matches,
+}
+
+
+def bind_arguments(fn, args, kwargs) -> dict:
+    """Return the arguments of ``fn(cursor, *args, **kwargs)`` by name, defaults included."""
+    import inspect
+
+    bound = inspect.signature(fn).bind(None, *args, **kwargs)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def route_arguments(arguments: dict, count: int) -> dict:
+    """
+    Split a call's arguments between the shards that own the requested rows.
+
+    Calls restricted to a user (``user_id``), a habit (``habit_id``), a set of
+    users (``user_ids``) or a set of habits (``habit_ids``) only need the owning
+    shards; anything else goes to every shard.
+
+    Returns:
+        dict: shard -> arguments for the call on that shard.
+    """
+    for key in ("user_id", "habit_id"):
+        if arguments.get(key) is not None:
+            shard = shard_of_id(arguments[key])
+            return {shard: arguments} if 0 <= shard < count else {}
+    for key in ("user_ids", "habit_ids"):
+        if arguments.get(key) is not None:
+            groups = {}
+            for row_id in arguments[key]:
+                groups.setdefault(shard_of_id(row_id), []).append(int(row_id))
+            # IDs outside every shard's range cannot match anything
+            return {shard: {**arguments, key: ids} for shard, ids in sorted(groups.items()) if 0 <= shard < count}
+    return {shard: arguments for shard in range(count)}
+
+
+# ---------------------------
+# Shard map
+# ---------------------------
+
+class ShardMap:
+    """The shard files under one directory, with a connection pool per file.
+
+    Args:
+        root (str): Directory holding directory.db and the shard files.
+        count (int, optional): Number of shards. An existing layout keeps its
+            count unless a larger one is given, which adds shards; new users
+            are then spread over all of them while existing users stay put.
+        pool_size (int): Maximum open connections per shard.
+        workers (int): Processes that ``query`` fans out to (see scatter.py);
+            1 queries the shards one after another in this process.
+        **connect_kwargs: Extra keyword arguments for the shard pools (``init``, or ``sqlite3.connect`` options).
+    """
+
+    def __init__(self, root, count=None, pool_size=5, workers=1, **connect_kwargs):
+        self.root = root
+        self.workers = workers
+        self._scatter = None
+        os.makedirs(root, exist_ok=True)
+        self._pool_size = pool_size
+        self._connect_kwargs = connect_kwargs
+        self._pools = {}
+        self._lock = threading.Lock()
+        # username -> shard for directory hits (rows are never moved)
+        self._routes = {}
+
+        self.directory = ConnectionPool(os.path.join(root, DIRECTORY_FILE), size=pool_size)
+        with self.directory.connection() as conn:
+            for statement in DIRECTORY_SCHEMA:
+                conn.execute(statement)
+            row = conn.execute("SELECT value FROM shard_meta WHERE key = 'count'").fetchone()
+            stored = row[0] if row else 0
+            self.count = max(stored, count or 0) or DEFAULT_SHARD_COUNT
+            if self.count != stored:
+                conn.execute("INSERT OR REPLACE INTO shard_meta (key, value) VALUES ('count', ?)", (self.count,))
+            conn.commit()
+
+    def path(self, shard: int) -> str:
+        """Return the database file of a shard."""
+        if not 0 <= shard < self.count:
+            raise ShardRoutingError(f"Shard {shard} does not exist (there are {self.count}).")
+        return os.path.join(self.root, f"shard-{shard:03d}.db")
+
+    def paths(self) -> list:
+        return [self.path(shard) for shard in range(self.count)]
+
+    def pool(self, shard: int) -> ConnectionPool:
+        """Return the connection pool of a shard, opening it on first use."""
+        pool = self._pools.get(shard)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(shard)
+                if pool is None:
+                    pool = self._pools[shard] = ConnectionPool(self.path(shard), size=self._pool_size,
+                                                               **self._connect_kwargs)
+        return pool
+
+    # ---------------------------
+    # Routing
+    # ---------------------------
+
+    def shard_for_username(self, username: str, claim: bool = False) -> int:
+        """
+        Return the shard holding (or that will hold) a username.
+
+        Args:
+            username (str): The username.
+            claim (bool): Record the route in the directory (done on registration),
+                so the user stays on this shard if shards are added later.
+        """
+        shard = self._routes.get(username)
+        if shard is not None:
+            return shard
+        with self.directory.connection() as conn:
+            if claim:
+                conn.execute("INSERT OR IGNORE INTO shard_users (username, shard) VALUES (?, ?)",
+                             (username, hash_shard(username, self.count)))
+                conn.commit()
+            row = conn.execute("SELECT shard FROM shard_users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return hash_shard(username, self.count)
+        self._routes[username] = row[0]
+        return row[0]
+
+    def shard_for(self, username=None, user_id=None, claim=False) -> int:
+        """Return the shard for a user ID (preferred, no lookup) or a username."""
+        if user_id is not None:
+            shard = shard_of_id(user_id)
+            # No shard handed out this ID, so no user has it; any shard will say so
+            return shard if 0 <= shard < self.count else 0
+        if username is not None:
+            return self.shard_for_username(username, claim)
+        raise ShardRoutingError("Sharded mode needs a username or user ID to pick a database.")
+
+    def connection(self, username=None, user_id=None, claim=False):
+        """
+        Check out a connection to the shard of a user.
+
+        Returns:
+            PooledConnection: A pooled connection to the user's shard.
+
+        Raises:
+            ShardRoutingError: If neither a username nor a user ID is given.
+        """
+        return self.pool(self.shard_for(username, user_id, claim)).connection()
+
+    # ---------------------------
+    # Scatter-gather
+    # ---------------------------
+
+    def query(self, fn, *args, **kwargs):
+        """
+        Run an analyze.py helper ``fn(cursor, *args, **kwargs)`` across the shards.
+
+        The call only visits the shards owning the requested user(s) or habits
+        (see ``route_arguments``), and the partial results are merged as listed
+        in MERGES. With more than one worker the shards are queried in parallel
+        processes. ``iter_*`` helpers return a generator that streams the shards
+        one after another.
+        """
+        name = fn.__name__
+        if name not in MERGES:
+            raise ValueError(f"{name} cannot be run across shards.")
+        arguments = bind_arguments(fn, args, kwargs)
+        # A call no shard can answer still gets an (empty) answer of the right shape
+        calls = route_arguments(arguments, self.count) or {0: arguments}
+        merge = MERGES[name]
+        if merge is None:
+            return self._stream(fn, calls)
+
+        if self.workers > 1 and len(calls) > 1:
+            if self._scatter is None:
+                from scatter import ScatterGather
+                self._scatter = ScatterGather(self.paths(), self.workers)
+            return merge(self._scatter.gather(name, calls), arguments)
+
+        results = []
+        for shard, call in calls.items():
+            with self.pool(shard).connection() as conn:
+                call = {**call, "cursor": conn.cursor()}
+                results.append(fn(**call))
+        return merge(results, arguments)
+
+    def _stream(self, fn, calls):
+        for shard, call in calls.items():
+            with self.pool(shard).connection() as conn:
+                yield from fn(**{**call, "cursor": conn.cursor()})
+
+    # ---------------------------
+    # Maintenance
+    # ---------------------------
+
+    def migrate(self) -> dict:
+        """
+        Bring every shard's schema up to date and seed its ID counters.
+
+        Returns:
+            dict: shard -> list of migration versions applied.
+        """
+        applied = {}
+        for shard in range(self.count):
+            with self.pool(shard).connection() as conn:
+                applied[shard] = migrations.migrate(conn)
+                seed_id_ranges(conn, shard)
+                conn.commit()
+        return applied
+
+    def info(self) -> list:
+        """Return users, habits and file size per shard."""
+        rows = []
+        for shard in range(self.count):
+            with self.pool(shard).connection() as conn:
+                users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+                habits = conn.execute("SELECT COUNT(*) FROM habits").fetchone()[0]
+            rows.append({"shard": shard, "path": self.path(shard), "users": users, "habits": habits,
+                         "bytes": os.path.getsize(self.path(shard))})
+        return rows
+
+    def close(self):
+        """Close every shard pool and the directory."""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools = {}
+            if self._scatter is not None:
+                self._scatter.close()
+                self._scatter = None
+        self.directory.close()
+
+
+def seed_id_ranges(conn, shard: int) -> None:
+    """
+    Start every AUTOINCREMENT counter of a shard database at ``shard * SHARD_SPAN``
+    (unless it is already past that), so its IDs never collide with other shards'.
+    """
+    base = shard * SHARD_SPAN
+    if not base:
+        return
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE '%AUTOINCREMENT%'"
+    )]
+    for table in tables:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ? AND seq < ?", (base, table, base))
+        conn.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        """, (table, base, table))
+
+
+# ---------------------------
+# Command line
+# ---------------------------
+
+def main(argv=None) -> int:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Create and inspect a sharded habit tracker layout.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("init", help="create (or grow) a layout and migrate every shard")
+    p.add_argument("root")
+    p.add_argument("--count", type=int, default=DEFAULT_SHARD_COUNT)
+
+    p = commands.add_parser("info", help="users, habits and size per shard")
+    p.add_argument("root")
+
+    p = commands.add_parser("route", help="show the shard of a username")
+    p.add_argument("root")
+    p.add_argument("username")
+    args = parser.parse_args(argv)
+
+    shard_map = ShardMap(args.root, args.count if args.command == "init" else None)
+    try:
+        if args.command == "init":
+            shard_map.migrate()
+            print(json.dumps({"root": args.root, "count": shard_map.count}))
+        elif args.command == "info":
+            for row in shard_map.info():
+                print(json.dumps(row))
+        else:
+            shard = shard_map.shard_for_username(args.username)
+            print(json.dumps({"username": args.username, "shard": shard, "path": shard_map.path(shard)}))
+    finally:
+        shard_map.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+Memory-mapped columnar snapshots of the completion history.
+
+Population analytics over the live database pay for a long read transaction
+and for converting every row to Python objects. ``export`` copies the
+completion log once into a directory of fixed-width NumPy arrays, ordered by
+(habit_id, day):
+
+    habit_id.npy   int64, one entry per completion
+    user_id.npy    int64, one entry per completion
+    day.npy        int32 days since 1970-01-01, one entry per completion
+    habits.npy     int64 habit IDs, ascending
+    habit_user.npy int64 owner of each habit (aligned with habits.npy)
+    weekly.npy     bool, True for weekly habits (aligned with habits.npy)
+    offsets.npy    int64, habit i's completions are rows offsets[i]:offsets[i + 1]
+    meta.json      row counts, source and export time
+
+``Snapshot`` opens the columns with ``numpy.memmap`` (through ``np.load``), so
+opening costs a few file mappings however large the history is, and a habit's
+days are a zero-copy slice of ``day.npy``. The habit table and offsets are
+read on first use. The snapshot-aware analyze.py helpers
+(``fetch_population_streaks``, ``fetch_completion_heatmap``,
+``fetch_habits_done_per_day`` and ``fetch_weekly_completions``) accept a
+Snapshot in place of the cursor; see ``analyze.analytics_runner`` for running
+the menu's analytics against a snapshot.
+
+A snapshot is a point-in-time copy; export again to refresh it.
+
+Usage:
+    python snapshot.py export snapshots/latest [--db habit_tracker.db]
+    python snapshot.py info snapshots/latest
+"""
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import date
+from functools import cached_property
+from urllib.parse import quote
+
+import numpy as np
+
+from completions import EPOCH_ORDINAL, SQL_DAY_NUMBER
+
+# Bumped when the on-disk layout changes
+FORMAT_VERSION = 1
+
+# Rows converted per fetchmany() call while exporting
+EXPORT_CHUNK = 100_000
+
+# Column name -> dtype of the per-completion arrays
+COLUMNS = {"habit_id": np.int64, "user_id": np.int64, "day": np.int32}
+
+
+class SnapshotError(ValueError):
+    """Raised when a directory is not a readable snapshot."""
+
+
+# ---------------------------
+# Export
+# ---------------------------
+
+def export(database: str, path: str, chunk_size: int = EXPORT_CHUNK) -> dict:
+    """
+    Write the completion history of a database file to a snapshot directory.
+
+    The database is read in one read-only transaction, so the snapshot is
+    consistent even while other processes keep writing. The columns are
+    written to ``<path>.tmp`` and moved into place at the end, replacing an
+    older snapshot at ``path``.
+
+    Args:
+        database (str): Path of the SQLite database.
+        path (str): Snapshot directory to create.
+        chunk_size (int): Rows converted per fetchmany() call.
+
+    Returns:
+        dict: The snapshot's metadata (rows, habits, source, exported_at, ...).
+    """
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(database))}?mode=ro", uri=True)
+    staging = path.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        # Completions left behind by a deleted habit are not part of the history
+        cursor.execute("SELECT COUNT(*) FROM completions c JOIN habits h ON h.habit_id = c.habit_id")
+        rows = cursor.fetchone()[0]
+
+        columns = {name: np.lib.format.open_memmap(os.path.join(staging, f"{name}.npy"), mode="w+",
+                                                   dtype=dtype, shape=(rows,))
+                   for name, dtype in COLUMNS.items()}
+        # idx_completions_habit_day returns the rows in this order without sorting
+        cursor.execute(f"""
+            SELECT c.habit_id, c.user_id, {SQL_DAY_NUMBER.format(column="c.completed_on")}
+            FROM completions c
+            JOIN habits h ON h.habit_id = c.habit_id
+            ORDER BY c.habit_id, c.completed_on
+        """)
+        written = 0
+        while written < rows:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            block = np.array(chunk, dtype=np.int64)
+            for index, name in enumerate(COLUMNS):
+                columns[name][written:written + len(block)] = block[:, index]
+            written += len(block)
+
+        cursor.execute("SELECT habit_id, user_id, periodicity = 'weekly' FROM habits ORDER BY habit_id")
+        habits = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+        conn.rollback()
+    finally:
+        conn.close()
+
+    habit_ids = columns["habit_id"]
+    offsets = np.append(np.searchsorted(habit_ids, habits[:, 0]), rows).astype(np.int64)
+    for column in columns.values():
+        column.flush()
+    del columns, habit_ids
+    np.save(os.path.join(staging, "habits.npy"), habits[:, 0])
+    np.save(os.path.join(staging, "habit_user.npy"), habits[:, 1])
+    np.save(os.path.join(staging, "weekly.npy"), habits[:, 2].astype(bool))
+    np.save(os.path.join(staging, "offsets.npy"), offsets)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "rows": rows,
+        "habits": len(habits),
+        "source": os.path.abspath(database),
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(staging, "meta.json"), "w") as handle:
+        json.dump(meta, handle)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(staging, path)
+    return meta
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+
+def _day(value: date) -> int:
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def _iso_days(days, counts) -> dict:
+    return {date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat(): int(count) for day, count in zip(days, counts)}
+
+
+class Snapshot:
+    """
+    A snapshot directory opened read-only with memory-mapped columns.
+
+    Opening reads meta.json and maps the per-completion columns; the habit
+    table (``habits``, ``habit_user``, ``weekly``) and ``offsets`` are loaded
+    when first used.
+    """
+
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            raise SnapshotError(f"{path} is not a snapshot (no meta.json).")
+        with open(meta_path) as handle:
+            self.meta = json.load(handle)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise SnapshotError(f"{path} has snapshot format {self.meta.get('format')}, expected {FORMAT_VERSION}.")
+        self.path = path
+        # Empty arrays cannot be memory-mapped
+        mmap_mode = "r" if self.meta["rows"] else None
+        self.habit_id = self._load("habit_id", mmap_mode)
+        self.user_id = self._load("user_id", mmap_mode)
+        self.day = self._load("day", mmap_mode)
+
+    def _load(self, name: str, mmap_mode=None) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode=mmap_mode)
+
+    @cached_property
+    def habits(self) -> np.ndarray:
+        return self._load("habits")
+
+    @cached_property
+    def habit_user(self) -> np.ndarray:
+        return self._load("habit_user")
+
+    @cached_property
+    def weekly(self) -> np.ndarray:
+        return self._load("weekly")
+
+    @cached_property
+    def offsets(self) -> np.ndarray:
+        return self._load("offsets")
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def _habit_index(self, habit_id: int) -> int | None:
+        index = int(np.searchsorted(self.habits, habit_id))
+        return index if index < self.habits.size and self.habits[index] == habit_id else None
+
+    def days_of(self, habit_id: int):
+        """Return the day numbers of one habit's completions, oldest first (a view, not a copy)."""
+        index = self._habit_index(habit_id)
+        if index is None:
+            return self.day[:0]
+        return self.day[self.offsets[index]:self.offsets[index + 1]]
+
+    def _rows(self, habit_id=None, user_id=None, user_ids=None) -> np.ndarray | slice:
+        """Row selection for a habit, a user or a set of users (a slice of everything when unfiltered)."""
+        if habit_id is not None:
+            index = self._habit_index(habit_id)
+            return slice(0, 0) if index is None else slice(self.offsets[index], self.offsets[index + 1])
+        if user_id is not None:
+            user_ids = [user_id]
+        if user_ids is None:
+            return slice(0, len(self))
+        # Each habit's rows are contiguous, so gather the owners' habit ranges in order
+        owned = np.flatnonzero(np.isin(self.habit_user, np.asarray(list(user_ids), dtype=np.int64)))
+        starts, ends = self.offsets[owned], self.offsets[owned + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64)
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def completion_days(self, user_ids=None) -> dict:
+        """
+        The completion history as grouped arrays, in the shape of
+        ``streak_engine.load_completion_days`` (ordered by habit and day).
+
+        Without ``user_ids`` the columns are returned without copying.
+        """
+        rows = self._rows(user_ids=user_ids)
+        habit_ids = self.habit_id[rows]
+        weekly_habits = self.habits[self.weekly]
+        return {
+            "habit_id": habit_ids,
+            "user_id": self.user_id[rows],
+            "day": self.day[rows],
+            "weekly": np.isin(habit_ids, weekly_habits),
+        }
+
+    def _window(self, rows, start: date, end: date):
+        habit_ids, days = self.habit_id[rows], self.day[rows]
+        inside = (days >= _day(start)) & (days <= _day(end))
+        return habit_ids[inside], days[inside]
+
+    def completion_heatmap(self, habit_id=None, user_id=None, start: date = None, end: date = None) -> dict:
+        """Completions per day between ``start`` and ``end``; see ``analyze.fetch_completion_heatmap``."""
+        _, days = self._window(self._rows(habit_id, user_id), start, end)
+        return _iso_days(*np.unique(days, return_counts=True))
+
+    def weekly_completions(self, habit_id: int, start: date, end: date) -> list:
+        """Completions per week for one habit; see ``analyze.fetch_weekly_completions``."""
+        days = self.days_of(habit_id)
+        # Day 0 (1970-01-01) was a Thursday, three days after its week's Monday
+        mondays = days - (days + 3) % 7
+        inside = (days >= _day(start) - start.weekday()) & (mondays <= _day(end))
+        return list(_iso_days(*np.unique(mondays[inside], return_counts=True)).items())
+
+    def habits_done_per_day(self, start: date, end: date, user_id=None) -> dict:
+        """Distinct habits completed per day; see ``analyze.fetch_habits_done_per_day``."""
+        habit_ids, days = self._window(self._rows(user_id=user_id), start, end)
+        # Rows are ordered by (habit, day), so repeats within a day are adjacent
+        first = np.ones(days.size, dtype=bool)
+        first[1:] = (habit_ids[1:] != habit_ids[:-1]) | (days[1:] != days[:-1])
+        return _iso_days(*np.unique(days[first], return_counts=True))
+
+
+def open_snapshot(path: str) -> Snapshot:
+    """Open a snapshot directory written by ``export``."""
+    return Snapshot(path)
+
+
+# ---------------------------
+# Command line
+# ---------------------------
+
+def main(argv=None) -> int:
+    import argparse
+
+    import db
+
+    parser = argparse.ArgumentParser(description="Export or inspect a columnar completion snapshot.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("export", help="write a snapshot of a database's completion history")
+    p.add_argument("path", help="snapshot directory")
+    p.add_argument("--db", default=db.DATABASE_URL, help="database file (default: %(default)s)")
+    p = commands.add_parser("info", help="show a snapshot's metadata and open time")
+    p.add_argument("path", help="snapshot directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        started = time.perf_counter()
+        meta = export(args.db, args.path)
+        print(f"✅ Exported {meta['rows']} completion(s) of {meta['habits']} habit(s) to {args.path} "
+              f"in {time.perf_counter() - started:.2f}s.")
+    else:
+        started = time.perf_counter()
+        snap = open_snapshot(args.path)
+        opened = time.perf_counter() - started
+        print(json.dumps({**snap.meta, "open_ms": round(opened * 1000, 3)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
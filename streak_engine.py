@@ -0,0 +1,161 @@
+"""
+Vectorized streak computation over completion date arrays.
+
+Completions are handled as flat, grouped NumPy arrays - one entry per
+completion with the owning habit's ID and the completion's period number (see
+``completions.period_of``) - so the streaks of every habit in a population are
+computed with a handful of sort/diff/reduce passes instead of a Python loop per
+completion.
+
+Runs are found by marking a "break" wherever the habit changes or the period
+does not follow the previous one; the break positions are the run boundaries,
+and reductions over them give run lengths, current and longest streaks and the
+gaps between runs.
+"""
+import numpy as np
+
+from completions import EPOCH_ORDINAL, SQL_DAY_NUMBER
+
+
+# ---------------------------
+# Array preparation
+# ---------------------------
+
+def to_periods(days, weekly):
+    """
+    Convert day numbers to streak periods.
+
+    Args:
+        days (array-like): Days since 1970-01-01.
+        weekly (array-like of bool or bool): True where the habit is weekly.
+
+    Returns:
+        numpy.ndarray: Day numbers for daily habits, Monday-based week numbers for weekly ones.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    return np.where(weekly, (days + 3) // 7, days)
+
+
+def days_from_dates(dates):
+    """Convert an iterable of ``datetime.date`` objects to an int64 array of day numbers."""
+    return np.fromiter((d.toordinal() - EPOCH_ORDINAL for d in dates), dtype=np.int64)
+
+
+def load_completion_days(cursor, user_ids=None):
+    """
+    Load completion history as grouped arrays, ordered by habit and day.
+
+    Args:
+        cursor: The database cursor object.
+        user_ids (iterable of int, optional): Restrict to these users (default: everyone).
+
+    Returns:
+        dict: ``habit_id``, ``user_id``, ``day`` (int64 arrays) and ``weekly`` (bool array),
+        one entry per completion.
+    """
+    day = SQL_DAY_NUMBER.format(column="c.completed_on")
+    query = f"""
+        SELECT c.habit_id, c.user_id, {day}, h.periodicity = 'weekly'
+        FROM completions c
+        JOIN habits h ON h.habit_id = c.habit_id
+    """
+    params = ()
+    if user_ids is not None:
+        params = tuple(user_ids)
+        query += f" WHERE c.user_id IN ({', '.join('?' * len(params))})"
+    cursor.execute(query + " ORDER BY c.habit_id, c.completed_on", params)
+
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+    return {
+        "habit_id": rows[:, 0],
+        "user_id": rows[:, 1],
+        "day": rows[:, 2],
+        "weekly": rows[:, 3].astype(bool),
+    }
+
+
+# ---------------------------
+# Streak computation
+# ---------------------------
+
+def compute_streaks(habit_ids, periods, assume_sorted=False):
+    """
+    Compute runs, current and longest streaks for many habits at once.
+
+    Repeated completions within one period count once.
+
+    Args:
+        habit_ids (array-like of int): Habit ID of each completion.
+        periods (array-like of int): Period number of each completion (see ``to_periods``).
+        assume_sorted (bool): Skip sorting when the input is already ordered by
+            (habit_id, period), e.g. straight from ``load_completion_days``.
+
+    Returns:
+        dict: Per habit (sorted by ID): ``habit_id``, ``periods`` (distinct periods completed),
+        ``current``, ``longest`` and ``last_period``. Per run, in habit/period order:
+        ``run_habit``, ``run_start``, ``run_end``, ``run_length`` and ``gap_before``
+        (missed periods since the habit's previous run, 0 for its first run).
+    """
+    habit_ids = np.asarray(habit_ids, dtype=np.int64)
+    periods = np.asarray(periods, dtype=np.int64)
+    if not assume_sorted:
+        order = np.lexsort((periods, habit_ids))
+        habit_ids, periods = habit_ids[order], periods[order]
+
+    if habit_ids.size:
+        # Drop repeated completions within the same period
+        keep = np.ones(habit_ids.size, dtype=bool)
+        keep[1:] = (habit_ids[1:] != habit_ids[:-1]) | (periods[1:] != periods[:-1])
+        habit_ids, periods = habit_ids[keep], periods[keep]
+
+    n = habit_ids.size
+    new_habit = np.ones(n, dtype=bool)
+    new_habit[1:] = habit_ids[1:] != habit_ids[:-1]
+    breaks = new_habit.copy()
+    breaks[1:] |= periods[1:] != periods[:-1] + 1
+
+    # Run boundaries and lengths
+    run_starts = np.flatnonzero(breaks)
+    run_ends = np.append(run_starts[1:], n)[:run_starts.size] - 1
+    run_length = run_ends - run_starts + 1
+    run_habit = habit_ids[run_starts]
+    run_start = periods[run_starts]
+    run_end = periods[run_ends]
+
+    # Gaps: periods skipped between consecutive runs of the same habit
+    first_run = new_habit[run_starts]
+    gap_before = np.zeros(run_starts.size, dtype=np.int64)
+    gap_before[1:] = run_start[1:] - run_end[:-1] - 1
+    gap_before[first_run] = 0
+
+    # Per-habit reductions over the runs
+    habit_run_starts = np.flatnonzero(first_run)
+    habit_run_ends = np.append(habit_run_starts[1:], run_starts.size)[:habit_run_starts.size] - 1
+    habit_starts = np.flatnonzero(new_habit)
+    if habit_run_starts.size:
+        longest = np.maximum.reduceat(run_length, habit_run_starts)
+    else:
+        longest = np.zeros(0, dtype=np.int64)
+
+    return {
+        "habit_id": habit_ids[habit_starts],
+        "periods": np.diff(np.append(habit_starts, n))[:habit_starts.size],
+        "current": run_length[habit_run_ends],
+        "longest": longest,
+        "last_period": run_end[habit_run_ends],
+        "run_habit": run_habit,
+        "run_start": run_start,
+        "run_end": run_end,
+        "run_length": run_length,
+        "gap_before": gap_before,
+    }
+
+
+def compute_streaks_from_days(habit_ids, days, weekly, assume_sorted=False):
+    """
+    Convenience wrapper: convert day numbers to periods and compute streaks.
+
+    Sorting by day and by period give the same order, so ``assume_sorted``
+    may be used with input ordered by (habit_id, day).
+    """
+    return compute_streaks(habit_ids, to_periods(days, weekly), assume_sorted=assume_sorted)
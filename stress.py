@@ -0,0 +1,238 @@
+"""
+Multi-process concurrency stress test for one database file.
+
+Spawns N worker processes that run a mix of main.py writes (log a completion,
+add a habit, delete a habit) and reads (top streaks, habit listing) against
+the same SQLite file for a fixed time, then reports throughput, latency
+percentiles per operation and the errors that reached the caller. Lock
+conflicts are absorbed by BEGIN IMMEDIATE, SQLite's busy timeout and the
+retry layer in db.py (``db.retrying``); the retries each worker needed are
+reported too.
+
+Usage:
+    python stress.py --processes 8 --seconds 10
+    python stress.py --processes 16 --profile balanced --json stress.json
+    python stress.py --processes 8 --mix log=1            # writes only
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
+
+import analyze
+import db
+import main
+import migrations
+import profiles
+
+# Operation -> share of the calls each worker makes
+DEFAULT_MIX = {"log": 0.6, "add_habit": 0.1, "delete_habit": 0.05, "top_streaks": 0.15, "view_habits": 0.1}
+
+HABITS_PER_USER = 5
+
+
+def prepare(path: str, users: int, habits_per_user: int = HABITS_PER_USER, profile=None) -> None:
+    """
+    Create a database with ``users`` users (user1.., password 'pw') and their habits.
+    The profile is applied here first, so the workers don't race to switch the
+    file's journal mode when they connect.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        if profile:
+            profiles.apply(conn, profile)
+        migrations.migrate(conn)
+        with conn:
+            conn.executemany("INSERT INTO users (user_id, username, password) VALUES (?, ?, 'pw')",
+                             ((u, f"user{u}") for u in range(1, users + 1)))
+            conn.executemany("""
+                INSERT INTO habits (habit_id, name, description, periodicity, created_at, user_id)
+                VALUES (?, ?, 'stress', ?, '2024-01-01 00:00:00', ?)
+            """, (((u - 1) * habits_per_user + h, f"habit {h}", "weekly" if h == habits_per_user else "daily", u)
+                  for u in range(1, users + 1) for h in range(1, habits_per_user + 1)))
+    finally:
+        conn.close()
+
+
+# ---------------------------
+# Worker process
+# ---------------------------
+
+def _worker(path, worker, seconds, start_at, users, mix, profile) -> dict:
+    db.DATABASE_URL = path
+    db.POOL_SIZE = 1
+    if profile:
+        db.configure_profile(profile)
+    db.close_pool()
+    rng = random.Random(worker)
+    added = []
+    samples = {op: [] for op in mix}
+    errors = Counter()
+
+    def log():
+        user = rng.randint(1, users)
+        habit_id = (user - 1) * HABITS_PER_USER + rng.randint(1, HABITS_PER_USER)
+        main.log_completion(f"user{user}", user, habit_id, date(2024, 1, 1) + timedelta(rng.randrange(365)))
+
+    def add_habit():
+        user = rng.randint(1, users)
+        name = f"stress {worker}-{len(added)}-{rng.random():.6f}"
+        main.add_habit(f"user{user}", user, name, "stress", "daily")
+        added.append((user, name))
+
+    def delete_habit():
+        if not added:
+            return add_habit()
+        user, name = added.pop()
+        with db.get_connection() as conn:
+            row = conn.execute("SELECT habit_id FROM habits WHERE user_id = ? AND name = ?", (user, name)).fetchone()
+        if row:
+            main.delete_habit(f"user{user}", "pw", row[0])
+
+    def top_streaks():
+        with db.get_connection() as conn:
+            analyze.fetch_top_streaks(conn.cursor(), k=10, user_id=rng.randint(1, users), by="longest_streak")
+
+    def view_habits():
+        user = rng.randint(1, users)
+        main.view_habit(f"user{user}", "pw", page_size=50)
+
+    operations = {"log": log, "add_habit": add_habit, "delete_habit": delete_habit,
+                  "top_streaks": top_streaks, "view_habits": view_habits}
+    names = list(mix)
+    weights = [mix[name] for name in names]
+
+    with mock.patch.object(main.questionary, "print"), mock.patch.object(main.questionary, "confirm") as confirm:
+        confirm.return_value.ask.return_value = True
+        time.sleep(max(0.0, start_at - time.time()))
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            op = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                operations[op]()
+            except Exception as e:
+                errors[f"{op}: {type(e).__name__}: {e}"] += 1
+                continue
+            samples[op].append(time.perf_counter() - started)
+    db.close_pool()
+    return {"samples": samples, "errors": dict(errors), **db.RETRY_STATS}
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+
+def _percentiles(samples) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {"count": 0}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))] * 1000, 3)
+
+    return {"count": len(samples), "p50_ms": pct(50), "p99_ms": pct(99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def run(processes: int = 4, seconds: float = 5.0, users: int = 50, mix=None, profile=None, path=None) -> dict:
+    """
+    Run the stress test and summarise it.
+
+    Args:
+        processes (int): Worker processes hitting the database at once.
+        seconds (float): How long each worker runs.
+        users (int): Users (with HABITS_PER_USER habits each) in a fresh database.
+        mix (dict, optional): Operation -> weight (default DEFAULT_MIX).
+        profile (str, optional): Storage profile for the workers (see profiles.py).
+        path (str, optional): Database to create; a temporary file by default.
+
+    Returns:
+        dict: processes, seconds, operations, throughput (ops/s), latency (overall and
+        per operation: count, p50_ms, p99_ms, max_ms), errors (message -> count),
+        retries and gave_up.
+    """
+    mix = mix or DEFAULT_MIX
+    workdir = None
+    if path is None:
+        workdir = tempfile.mkdtemp(prefix="stress-")
+        path = os.path.join(workdir, "stress.db")
+    prepare(path, users, profile=profile)
+    try:
+        start_at = time.time() + 0.5
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(_worker, [path] * processes, range(processes), [seconds] * processes,
+                                        [start_at] * processes, [users] * processes, [mix] * processes,
+                                        [profile] * processes))
+    finally:
+        if workdir is not None:
+            for name in os.listdir(workdir):
+                os.remove(os.path.join(workdir, name))
+            os.rmdir(workdir)
+
+    errors = Counter()
+    per_op = {op: [] for op in mix}
+    for result in results:
+        errors.update(result["errors"])
+        for op, samples in result["samples"].items():
+            per_op[op].extend(samples)
+    every = [sample for samples in per_op.values() for sample in samples]
+    return {
+        "processes": processes,
+        "seconds": seconds,
+        "profile": profile or db.PROFILE,
+        "operations": len(every),
+        "throughput": round(len(every) / seconds, 1),
+        "latency": {"all": _percentiles(every), **{op: _percentiles(samples) for op, samples in per_op.items()}},
+        "errors": dict(errors),
+        "error_count": sum(errors.values()),
+        "retries": sum(result["retries"] for result in results),
+        "gave_up": sum(result["gave_up"] for result in results),
+    }
+
+
+def main_cli(argv=None) -> int:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Hammer one database file from several processes.")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--profile", help="storage profile for the workers (see profiles.py)")
+    parser.add_argument("--mix", help="operation weights, e.g. log=6,top_streaks=4 "
+                                      f"(operations: {', '.join(DEFAULT_MIX)})")
+    parser.add_argument("--db", help="database file to create (default: a temporary file)")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    mix = None
+    if args.mix:
+        mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            parser.error(f"unknown operation(s): {', '.join(sorted(unknown))}")
+
+    report = run(args.processes, args.seconds, args.users, mix, args.profile, args.db)
+    print(f"{report['processes']} processes, {report['seconds']}s, profile {report['profile']}: "
+          f"{report['operations']} ops, {report['throughput']} ops/s, "
+          f"{report['error_count']} error(s), {report['retries']} retry(ies)")
+    for op, stats in report["latency"].items():
+        if stats["count"]:
+            print(f"  {op:<14} n={stats['count']:<7} p50 {stats['p50_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms  "
+                  f"max {stats['max_ms']:>8.3f} ms")
+    for message, count in report["errors"].items():
+        print(f"  ❌ {count} x {message}")
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(report, handle, indent=2)
+    return 1 if report["error_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
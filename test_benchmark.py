@@ -0,0 +1,30 @@
+import benchmark
+import db
+
+
+def test_run_times_every_case(tmp_path):
+    """A tiny run builds the synthetic database and reports percentiles for every case."""
+    url = db.DATABASE_URL
+    report = benchmark.run(scale=300, iterations=3, max_seconds=0.01, cache_dir=str(tmp_path))
+    assert db.DATABASE_URL == url
+    assert report["meta"]["completions"] == 300
+    assert set(report["results"]) == set(benchmark.CASES)
+    for result in report["results"].values():
+        assert result["iterations"] >= 3
+        assert result["p50_ms"] <= result["p90_ms"] <= result["p99_ms"] <= result["max_ms"]
+
+    # The cached database is reused and left unchanged by the write cases
+    again = benchmark.run(scale=300, iterations=1, max_seconds=0.01, only="analyze.fetch_all_habits",
+                          cache_dir=str(tmp_path))
+    assert list(again["results"]) == ["analyze.fetch_all_habits"]
+    assert again["meta"]["build_seconds"] == report["meta"]["build_seconds"]
+
+
+def test_compare_flags_regressions():
+    """Cases slower than the baseline by more than the threshold are flagged."""
+    baseline = {"results": {"a": {"p50_ms": 1.0}, "b": {"p50_ms": 1.0}}}
+    current = {"results": {"a": {"p50_ms": 1.1}, "b": {"p50_ms": 1.5}, "c": {"p50_ms": 9.0}}}
+    rows = {row["name"]: row for row in benchmark.compare(current, baseline, threshold=0.25)}
+    assert set(rows) == {"a", "b"}
+    assert not rows["a"]["regressed"]
+    assert rows["b"]["regressed"]
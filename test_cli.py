@@ -0,0 +1,176 @@
+import io
+import json
+import sqlite3
+
+import pytest
+
+import cli
+import db
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """Fixture pointing the shared pool at a fresh, migrated database file."""
+    monkeypatch.setattr(db, "DATABASE_URL", str(tmp_path / "cli.db"))
+    db.ensure_schema()
+    with db.get_connection() as conn:
+        yield conn
+    db.close_pool()
+
+
+def run(conn, commands, **kwargs):
+    out = io.StringIO()
+    failures = cli.run_batch(conn, commands.strip().splitlines(), out=out, **kwargs)
+    return failures, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def test_batch_runs_commands_over_one_connection(conn):
+    """A batch registers a user, adds and logs a habit, and queries it without prompting."""
+    failures, results = run(conn, """
+        # set up a user and a habit
+        register alice secret
+        add-habit --username alice --user-id 1 --name "Morning Run" --periodicity daily
+        log --username alice --user-id 1 --habit-id 1 --at 2024-03-01T07:00:00
+        log --username alice --user-id 1 --habit-id 1 --at 2024-03-02T07:00:00
+        list --username alice --password secret
+        analytics top -k 1 --by longest_streak
+        analytics search "morn" --user-id 1
+    """)
+    assert failures == 0
+    assert [r["line"] for r in results] == [2, 3, 4, 5, 6, 7, 8]
+    assert results[0]["result"] == {"user_id": 1, "username": "alice"}
+    assert results[3]["result"]["current_streak"] == 2
+    assert results[4]["result"][0]["name"] == "Morning Run"
+    assert results[5]["result"] == [{"name": "Morning Run", "longest_streak": 2}]
+    assert [match["name"] for match in results[6]["result"]] == ["Morning Run"]
+
+
+def test_batch_reports_errors_and_continues(conn):
+    """Failed or malformed commands are reported as JSON and do not stop the batch."""
+    failures, results = run(conn, """
+        list --username nobody --password wrong
+        log --username alice
+        register bob pw
+    """)
+    assert failures == 2
+    assert results[0]["error"] == "AuthenticationError"
+    assert results[1]["error"] == "UsageError"
+    assert results[2]["ok"] is True
+
+
+def test_batch_reports_failed_ingest_and_continues(conn, tmp_path):
+    """An unreadable or malformed ingest file fails its own line only."""
+    malformed = tmp_path / "malformed.csv"
+    malformed.write_text("user_id,habit_id,timestamp\n1,1,2024-03-01\n1,one,2024-03-02\n")
+    failures, results = run(conn, f"""
+        register alice secret
+        add-habit --username alice --user-id 1 --name Run --periodicity daily
+        ingest {tmp_path / "missing.csv"}
+        ingest {malformed}
+        log --username alice --user-id 1 --habit-id 1 --at 2024-03-03T07:00:00
+    """)
+    assert failures == 2
+    assert [r["ok"] for r in results] == [True, True, False, False, True]
+    assert results[2]["error"] == "FileNotFoundError"
+    assert results[3]["error"] == "ValueError" and "line 3" in results[3]["message"]
+    assert conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 1
+
+
+def test_writes_retry_while_another_process_holds_the_lock(conn, tmp_path, monkeypatch):
+    """Every write command that finds the database locked backs off, retries and succeeds."""
+    events = tmp_path / "events.csv"
+    events.write_text("user_id,habit_id,timestamp\n1,1,2024-03-02T07:00:00\n")
+    # Fail at once instead of waiting in SQLite's busy handler, so the retry layer is what waits
+    conn.execute("PRAGMA busy_timeout = 0")
+    holder = sqlite3.connect(db.DATABASE_URL, isolation_level=None)
+
+    def back_off(seconds):
+        # The other process finishes its transaction while this one backs off
+        if holder.in_transaction:
+            holder.execute("ROLLBACK")
+
+    monkeypatch.setattr(db.time, "sleep", back_off)
+    commands = [
+        "register alice secret",
+        "login alice secret",
+        "add-habit --username alice --user-id 1 --name Run",
+        "log --username alice --user-id 1 --habit-id 1 --at 2024-03-01T07:00:00",
+        f"ingest {events}",
+        "rebuild-streaks",
+        "rebuild-rollups",
+    ]
+    retries = db.RETRY_STATS["retries"]
+    for command in commands:
+        holder.execute("BEGIN IMMEDIATE")
+        failures, results = run(conn, command)
+        assert failures == 0, results
+    holder.close()
+    assert db.RETRY_STATS["retries"] - retries == len(commands)
+    assert conn.execute("SELECT current_streak FROM streak WHERE habit_id = 1").fetchone()[0] == 2
+
+
+def test_batch_stop_on_error(conn):
+    """--stop-on-error ends the batch at the first failure."""
+    failures, results = run(conn, """
+        list --username nobody --password wrong
+        register bob pw
+    """, stop_on_error=True)
+    assert failures == 1
+    assert len(results) == 1
+
+
+def test_single_command_prints_json(tmp_path, capsys):
+    """A single command prints one JSON object and sets the exit code."""
+    path = str(tmp_path / "single.db")
+    assert cli.main(["--db", path, "register", "carol", "pw"]) == 0
+    assert json.loads(capsys.readouterr().out) == {"ok": True, "result": {"user_id": 1, "username": "carol"}}
+    assert cli.main(["--db", path, "register", "carol", "pw"]) == 1
+    assert json.loads(capsys.readouterr().out)["error"] == "DuplicateError"
+    db.close_pool()
+
+
+def test_batch_login_session(conn):
+    """After login, batch commands without credentials act in the session."""
+    failures, results = run(conn, """
+        register alice secret
+        login alice secret
+        add-habit --name Read --periodicity daily
+        log --habit-id 1 --at 2024-03-01T07:00:00
+        list
+    """)
+    assert failures == 0
+    token = results[1]["result"]["token"]
+    assert results[3]["result"]["count"] == 1
+    assert results[4]["result"][0]["name"] == "Read"
+
+    failures, results = run(conn, f"""
+        logout --token {token}
+        list --token {token}
+        list
+    """)
+    assert failures == 2
+    assert results[1]["error"] == "SessionExpiredError"
+    assert results[2]["error"] == "InvalidInputError"
+
+
+def test_list_pages(conn):
+    """list returns single pages with a next token, or streams every page as its own line."""
+    habits = "\n".join(f"add-habit --name H{i} --periodicity {'weekly' if i % 2 else 'daily'}" for i in range(5))
+    failures, _ = run(conn, f"register alice secret\nlogin alice secret\n{habits}")
+    assert failures == 0
+
+    failures, results = run(conn, "login alice secret\nlist --page-size 2")
+    page = results[1]["result"]
+    assert [h["name"] for h in page["habits"]] == ["H0", "H1"]
+
+    failures, results = run(conn, f"login alice secret\nlist --page-size 2 --after {page['next']}")
+    assert [h["name"] for h in results[1]["result"]["habits"]] == ["H2", "H3"]
+
+    failures, results = run(conn, "login alice secret\nlist --page-size 2 --stream\nlist --periodicity weekly")
+    pages = [r for r in results if r.get("page")]
+    assert [r["page"] for r in pages] == [1, 2, 3]
+    assert pages[-1]["result"]["next"] is None
+    assert [h["name"] for h in results[-1]["result"]] == ["H1", "H3"]
+
+    failures, results = run(conn, "login alice secret\nlist --after not-a-token")
+    assert results[1]["error"] == "InvalidInputError"
@@ -0,0 +1,106 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import migrations
+from completions import advance, period_of, rebuild_streaks, record_completion
+
+
+@pytest.fixture
+def conn():
+    """Fixture providing a migrated in-memory database with one daily and one weekly habit."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'daily', 'now', 1)")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Shop', 'weekly', 'now', 1)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def streak_row(conn, habit_id):
+    return conn.execute("""
+        SELECT count, current_streak, longest_streak, last_period
+        FROM streak WHERE habit_id = ?
+    """, (habit_id,)).fetchone()
+
+
+def test_period_of_weekly_starts_on_monday():
+    """Weekly periods change between Sunday and Monday."""
+    sunday, monday = date(2024, 1, 7), date(2024, 1, 8)
+    assert period_of(sunday, "weekly") == period_of(date(2024, 1, 1), "weekly")
+    assert period_of(monday, "weekly") == period_of(sunday, "weekly") + 1
+    assert period_of(monday, "daily") == period_of(sunday, "daily") + 1
+
+
+def test_advance_rules():
+    """Consecutive periods extend the run, repeats are ignored and gaps reset it."""
+    assert advance(0, 0, None, 10) == (1, 1, 10)
+    assert advance(1, 1, 10, 11) == (2, 2, 11)
+    assert advance(2, 2, 11, 11) == (2, 2, 11)
+    assert advance(2, 2, 11, 14) == (1, 2, 14)
+    assert advance(1, 2, 14, 12) == (1, 2, 14)
+
+
+def test_record_completion_daily(conn):
+    """Daily completions build a streak that resets after a missed day."""
+    start = datetime(2024, 3, 1, 8, 0)
+    for offset in (0, 1, 2, 4, 5):
+        record_completion(conn.cursor(), 1, 1, "daily", start + timedelta(days=offset))
+    count, current, longest, _ = streak_row(conn, 1)
+    assert (count, current, longest) == (5, 2, 3)
+    assert conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 5
+
+
+def test_record_completion_weekly(conn):
+    """Weekly habits only need one completion per calendar week."""
+    summary = None
+    for day in (date(2024, 3, 4), date(2024, 3, 8), date(2024, 3, 11), date(2024, 3, 27)):
+        summary = record_completion(conn.cursor(), 1, 2, "weekly", day)
+    assert summary["count"] == 4
+    assert summary["current_streak"] == 1
+    assert summary["longest_streak"] == 2
+
+
+def test_rebuild_matches_incremental_and_handles_backfill(conn):
+    """Rebuilding from the log reproduces the incremental summary, including out-of-order events."""
+    days = [date(2024, 3, d) for d in (1, 2, 3, 7, 8)]
+    for day in days:
+        record_completion(conn.cursor(), 1, 1, "daily", day)
+    incremental = streak_row(conn, 1)
+
+    # Wipe the summary and recompute it from the log
+    conn.execute("UPDATE streak SET count = 0, current_streak = 0, longest_streak = 0, last_period = NULL")
+    assert rebuild_streaks(conn) == 1
+    assert streak_row(conn, 1) == incremental
+
+    # Back-filling the missing days only shows up after a rebuild
+    for missing in (4, 5, 6):
+        record_completion(conn.cursor(), 1, 1, "daily", date(2024, 3, missing))
+    assert streak_row(conn, 1)[2] == 3
+    rebuild_streaks(conn)
+    assert streak_row(conn, 1)[1:3] == (8, 8)
+
+
+def test_deleting_habits_and_users_removes_their_completions(conn):
+    """Deleting a habit or a user leaves no completion or streak rows behind."""
+    import tracker
+
+    conn.execute("INSERT INTO users (username, password) VALUES ('bob', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Read', 'daily', 'now', 2)")
+    for user_id, habit_id, periodicity in ((1, 1, "daily"), (1, 2, "weekly"), (2, 3, "daily")):
+        for day in (1, 2, 3):
+            record_completion(conn.cursor(), user_id, habit_id, periodicity, datetime(2024, 3, day, 8, 0))
+    conn.commit()
+
+    tracker.delete_habit(conn.cursor(), 1, 1)
+    tracker.delete_habit(conn.cursor(), 1, 3)  # Bob's habit: not Ann's to delete
+    assert conn.execute("SELECT DISTINCT habit_id FROM completions ORDER BY 1").fetchall() == [(2,), (3,)]
+    assert conn.execute("SELECT habit_id FROM streak ORDER BY 1").fetchall() == [(2,), (3,)]
+
+    tracker.delete_user(conn.cursor(), 2)
+    assert conn.execute("SELECT DISTINCT habit_id FROM completions").fetchall() == [(2,)]
+    assert conn.execute("SELECT habit_id FROM streak").fetchall() == [(2,)]
+    assert conn.execute("SELECT habit_id FROM habits").fetchall() == [(2,)]
@@ -154,3 +154,18 @@ def test_delete_user_cancel(mock_db):
         with patch('main.questionary.print') as mock_print:
             main.delete_user("testuser", "password123")
             mock_print.assert_called_once_with("❎ Account deletion canceled.")
+
+def test_log_completion_with_session(mock_db):
+    """
+        Test case for the 'log_completion' function with a logged-in session.
+        Verifies that no username/user ID lookup is made before logging the completion.
+        """
+    conn, cursor = mock_db
+    cursor.fetchone.side_effect = [("daily",), None]
+    session = main.sessions.Session("token", 123, "testuser", float("inf"))
+    with patch.dict(main.sessions._cache, {"token": session}):
+        with patch('main.questionary.print') as mock_print:
+            main.log_completion(habit_id=1, completed_at="2023-01-01", session=session)
+            assert not any("FROM users" in c[0][0] for c in cursor.execute.call_args_list)
+            conn.commit.assert_called_once()
+            mock_print.assert_any_call("🔥 Total completions so far: 1")
@@ -0,0 +1,105 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import datagen
+from completions import rebuild_streaks
+
+END = date(2024, 6, 30)
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            table: conn.execute(f"SELECT {columns} FROM {table} ORDER BY 1, 2, 3").fetchall()
+            for table, columns in (
+                ("users", "user_id, username, password"),
+                ("habits", "habit_id, user_id, name, periodicity, is_active, last_completed_at"),
+                ("completions", "habit_id, user_id, completed_at, completed_on"),
+                ("streak", "habit_id, user_id, count, last_completed_date, current_streak, longest_streak, "
+                           "last_period"),
+            )
+        }
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def generated(tmp_path):
+    """Fixture generating a small database in several shards."""
+    path = str(tmp_path / "synthetic.db")
+    stats = datagen.generate(path, users=12, days=120, seed=7, workers=1, end=END, shard_users=5)
+    return path, stats
+
+
+def test_output_does_not_depend_on_sharding(generated, tmp_path):
+    """The same seed gives the same data whether users are split into 3 shards or 1."""
+    path, stats = generated
+    assert stats["shards"] == 3
+    assert stats["users"] == 12
+    assert stats["completions"] > 0
+
+    single = str(tmp_path / "single.db")
+    datagen.generate(single, users=12, days=120, seed=7, workers=1, end=END)
+    assert dump(single) == dump(path)
+
+    parallel = str(tmp_path / "parallel.db")
+    datagen.generate(parallel, users=12, days=120, seed=7, workers=2, end=END, shard_users=4)
+    assert dump(parallel) == dump(path)
+
+    other_seed = str(tmp_path / "other.db")
+    datagen.generate(other_seed, users=12, days=120, seed=8, workers=1, end=END)
+    assert dump(other_seed)["completions"] != dump(path)["completions"]
+
+
+def test_streaks_match_the_completion_log(generated):
+    """Streaks computed during generation equal a rebuild from the merged log."""
+    path, _stats = generated
+    before = dump(path)["streak"]
+    conn = sqlite3.connect(path)
+    rebuild_streaks(conn)
+    conn.close()
+    assert dump(path)["streak"] == before
+
+
+def test_simulated_user_history_has_matching_streaks(tmp_path):
+    """A simulated history of an existing user comes with the streaks a rebuild would give."""
+    path = str(tmp_path / "demo.db")
+    datagen.generate(path, users=2, days=30, seed=3, workers=1, end=END)
+    conn = sqlite3.connect(path)
+    written = datagen.simulate_user_history(conn, 2, days=90, seed=5, end=END)
+    conn.close()
+    after = dump(path)
+    assert written == sum(row[1] == 2 for row in after["completions"])
+    conn = sqlite3.connect(path)
+    rebuild_streaks(conn)
+    conn.close()
+    assert dump(path)["streak"] == after["streak"]
+
+
+def test_users_share_template_names_and_offsets(generated):
+    """Every user gets templates by name, and a second run appends after the existing IDs."""
+    path, _stats = generated
+    habits = dump(path)["habits"]
+    assert len({name for _id, _user, name, *_ in habits}) <= len(datagen.PREDEFINED_HABITS)
+    assert all(len([h for h in habits if h[1] == user]) >= 2 for user in range(1, 13))
+
+    datagen.generate(path, users=2, days=30, seed=1, workers=1, end=END, prefix="extra")
+    users = dump(path)["users"]
+    assert users[-2:] == [(13, "extra1", "password"), (14, "extra2", "password")]
+
+
+def test_failed_merge_cleans_up(generated, tmp_path):
+    """A shard that cannot be merged leaves the target as it was and no scratch files behind."""
+    path, _stats = generated
+    before = dump(path)
+    with pytest.raises(sqlite3.IntegrityError):
+        # The usernames are taken, so the first merge fails while workers are still generating
+        datagen.generate(path, users=12, days=30, seed=1, workers=2, end=END, shard_users=4)
+    assert dump(path) == before
+    assert not list(tmp_path.glob("datagen-*"))
+    conn = sqlite3.connect(path)
+    assert [row[1] for row in conn.execute("PRAGMA database_list")] == ["main"]
+    conn.close()
@@ -0,0 +1,67 @@
+import sqlite3
+
+import pytest
+
+import migrations
+import tracker
+from habit import Habit, Streak, User, habit_row, select_list, streak_row, user_row
+
+
+@pytest.fixture
+def conn():
+    """Fixture providing a migrated in-memory database with one user, habit and streak."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO habits (name, description, periodicity, created_at, user_id) "
+                 "VALUES ('Run', 'Morning run', 'daily', '2024-01-01', 1)")
+    conn.execute("INSERT INTO streak (habit_id, user_id, count, current_streak, longest_streak) VALUES (1, 1, 4, 2, 3)")
+    yield conn
+    conn.close()
+
+
+def test_models_have_no_instance_dict():
+    """Slotted models do not carry a per-instance __dict__."""
+    habit = Habit(1, 1, "Run", "", "daily", "2024-01-01")
+    assert not hasattr(habit, "__dict__")
+    with pytest.raises(AttributeError):
+        habit.colour = "red"
+
+
+def test_columns_exist_in_tables(conn):
+    """Every model column is a column of its table."""
+    for model, table in ((User, "users"), (Habit, "habits"), (Streak, "streak")):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        assert set(model.COLUMNS) <= columns
+
+
+def test_row_factories_build_models(conn):
+    """The row factories map selected rows straight onto model attributes."""
+    for model, factory, table in ((User, user_row, "users"), (Habit, habit_row, "habits"),
+                                  (Streak, streak_row, "streak")):
+        cursor = conn.cursor()
+        cursor.row_factory = factory
+        obj = cursor.execute(f"SELECT {select_list(model)} FROM {table}").fetchone()
+        assert isinstance(obj, model)
+
+    cursor = conn.cursor()
+    cursor.row_factory = habit_row
+    habits = cursor.execute(f"SELECT {select_list(Habit)} FROM habits WHERE user_id = 1").fetchall()
+    assert [(h.name, h.description, h.is_active) for h in habits] == [("Run", "Morning run", "Yes")]
+    assert select_list(Habit, "h").startswith("h.habit_id, h.user_id")
+
+
+def test_tracker_lists_habits_as_models(conn):
+    """With as_objects, the habit listings build Habit objects and page on their IDs."""
+    conn.execute("INSERT INTO habits (name, description, periodicity, created_at, user_id) "
+                 "VALUES ('Read', '', 'weekly', '2024-01-02', 1)")
+    cursor = conn.cursor()
+    habits = tracker.list_habits(cursor, 1, as_objects=True)
+    assert all(isinstance(h, Habit) for h in habits)
+    assert [(h.habit_id, h.name, h.periodicity) for h in habits] == \
+        [(h[0], h[1], h[3]) for h in tracker.list_habits(cursor, 1)]
+
+    first, after = tracker.list_habits_page(cursor, 1, limit=1, as_objects=True)
+    second, last = tracker.list_habits_page(cursor, 1, after, limit=1, as_objects=True)
+    assert [h.name for h in first + second] == ["Run", "Read"] and last is None
+    assert cursor.row_factory is None and cursor.execute("SELECT 1").fetchone() == (1,)
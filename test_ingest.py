@@ -0,0 +1,102 @@
+import sqlite3
+import time
+from datetime import date, datetime, timezone
+
+import pytest
+
+import migrations
+from completions import rebuild_streaks
+from ingest import ingest_completions, read_events
+from tracker import log_completion
+
+
+@pytest.fixture
+def conn():
+    """Fixture providing a migrated in-memory database with two habits for user 1."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO users (username, password) VALUES ('bob', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'daily', 'now', 1)")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Shop', 'weekly', 'now', 1)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def summaries(conn):
+    return conn.execute("""
+        SELECT habit_id, count, current_streak, longest_streak, last_period, last_completed_date
+        FROM streak ORDER BY habit_id
+    """).fetchall()
+
+
+def test_ingest_inserts_and_rejects(conn):
+    """Valid events are logged; unknown habits, foreign users and bad timestamps are rejected."""
+    events = [
+        (1, 1, "2024-03-01 07:30:00"),
+        (1, 1, datetime(2024, 3, 2, 7, 30)),
+        (1, 2, date(2024, 3, 4)),
+        (1, 1, 1709452800),  # 2024-03-03 08:00:00 UTC as epoch seconds, stored as local time
+        (2, 1, "2024-03-05"),  # habit 1 belongs to user 1, not 2
+        (1, 99, "2024-03-05"),  # no such habit
+        (1, 1, "not a date"),
+    ]
+    stats = ingest_completions(events, conn, batch_size=3)
+    assert stats["received"] == 7
+    assert stats["inserted"] == 4
+    assert stats["rejected"] == 3
+    assert stats["habits"] == 2
+    assert conn.execute("SELECT last_completed_at FROM habits WHERE habit_id = 1").fetchone()[0] == \
+        datetime.fromtimestamp(1709452800).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def test_ingest_streaks_match_rebuild(conn):
+    """Set-based streak updates agree with the single-pass rebuild, even for unordered input."""
+    days = [5, 1, 2, 3, 9, 10, 4, 20]
+    ingest_completions([(1, 1, f"2024-03-{d:02d}") for d in days], conn, batch_size=3)
+    ingest_completions([(1, 2, f"2024-03-{d:02d}") for d in (4, 12, 14, 25)], conn)
+    after_ingest = summaries(conn)
+
+    rebuild_streaks(conn)
+    assert summaries(conn) == after_ingest
+    # Daily: 1-5 is the longest run, 20 is the latest; weekly: 4, 12/14 consecutive weeks
+    assert after_ingest[0][1:4] == (8, 1, 5)
+    assert after_ingest[1][1:4] == (4, 1, 2)
+
+
+def test_ingest_adds_to_existing_count(conn):
+    """Counts accumulate across ingestions like repeated interactive logging would."""
+    ingest_completions([(1, 1, "2024-03-01")], conn)
+    ingest_completions([(1, 1, "2024-03-02")], conn)
+    assert summaries(conn)[0][1:4] == (2, 2, 2)
+
+
+@pytest.fixture
+def utc_plus_5(monkeypatch):
+    """Fixture running a test in a fixed UTC+05:00 local time zone."""
+    monkeypatch.setenv("TZ", "TEST-5")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_completion_just_after_local_midnight(conn, utc_plus_5):
+    """Ingested and interactively logged completions land on the same local day."""
+    instant = datetime(2024, 3, 2, 0, 30).timestamp()  # 00:30 local is 19:30 UTC the day before
+    utc = datetime.fromtimestamp(instant, timezone.utc)
+    ingest_completions([(1, 1, instant), (1, 1, utc.isoformat())], conn)
+    summary = log_completion(conn.cursor(), 1, 2, utc)
+
+    assert summary["completed_on"] == "2024-03-02"
+    assert conn.execute("SELECT DISTINCT completed_at, completed_on FROM completions").fetchall() == \
+        [("2024-03-02 00:30:00", "2024-03-02")]
+    assert conn.execute("SELECT DISTINCT period_start FROM completion_daily").fetchall() == [("2024-03-02",)]
+
+
+def test_read_events_skips_header(tmp_path):
+    """CSV rows are parsed into typed events and the header line is ignored."""
+    path = tmp_path / "events.csv"
+    path.write_text("user_id,habit_id,timestamp\n1,2,2024-03-01 10:00:00\n1,3,1709452800\n")
+    assert list(read_events(str(path))) == [(1, 2, "2024-03-01 10:00:00"), (1, 3, 1709452800.0)]
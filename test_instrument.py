@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+import analyze
+import db
+import instrument
+
+
+@pytest.fixture
+def instrumented(tmp_path, monkeypatch):
+    """Fixture pointing db at a fresh database with instrumentation enabled."""
+    monkeypatch.setattr(db, "DATABASE_URL", str(tmp_path / "instrumented.db"))
+    monkeypatch.setattr(instrument, "_config", dict(instrument._config))
+    instrument.enable(slow_ms=1e9, slow_log=str(tmp_path / "slow.log"), stats_file=str(tmp_path / "stats.json"))
+    instrument.STATS.reset()
+    db.configure_pool()
+    db.ensure_schema()
+    yield tmp_path
+    db.close_pool()
+    instrument.STATS.reset()
+
+
+def test_normalize_replaces_literals():
+    """Literals, IN lists and whitespace do not split otherwise identical statements."""
+    assert instrument.normalize("SELECT * FROM habits\n  WHERE habit_id = 5 AND name = 'it''s'") == \
+        "SELECT * FROM habits WHERE habit_id = ? AND name = ?"
+    assert instrument.normalize("DELETE FROM t WHERE id IN (?, ?, ?);") == "DELETE FROM t WHERE id IN (?...)"
+    assert instrument.normalize("SELECT col1 FROM t2") == "SELECT col1 FROM t2"
+
+
+def test_statements_are_counted_with_rows_and_origin(instrumented):
+    """Calls, rows fetched and the analyze function issuing them are recorded per statement."""
+    db.insert_user("alice", "pw")
+    user_id = db.insert_user("alice", "pw")
+    db.initialize_predefined_habits(user_id)
+
+    with db.get_connection() as conn:
+        habits = analyze.fetch_all_habits(conn.cursor())
+    assert len(habits) == 5
+
+    entries = instrument.STATS.snapshot()
+    lookup = entries["SELECT user_id FROM users WHERE username = ?"]
+    assert lookup["calls"] == 2
+    assert lookup["rows"] == 1
+
+    select = next(e for sql, e in entries.items() if sql.startswith("SELECT") and "FROM habits" in sql
+                  and "analyze.iter_all_habits" in e["origins"])
+    assert select["rows"] == 5
+    assert select["traced"] >= 1
+
+    # The implicit transaction is only visible to the trace callback
+    assert entries["BEGIN"]["traced"] >= 1
+
+    rows = instrument.report(entries, top=50, modules=("analyze",))
+    assert [r["origins"][0] for r in rows] == ["analyze.iter_all_habits"]
+    assert rows[0]["p95_ms"] >= rows[0]["p50_ms"]
+
+
+def test_slow_queries_are_logged_with_plan(instrumented, monkeypatch):
+    """Statements over the threshold land in the slow log with their query plan."""
+    monkeypatch.setitem(instrument._config, "slow_ms", 0)
+    with db.get_connection() as conn:
+        conn.execute("SELECT habit_id FROM habits WHERE user_id = ?", (1,)).fetchall()
+
+    log = (instrumented / "slow.log").read_text()
+    assert "SELECT habit_id FROM habits WHERE user_id = ?;" in log
+    assert "idx_habits_user" in log
+    # EXPLAIN itself is not recorded as a statement
+    assert not any(sql.startswith("EXPLAIN") for sql in instrument.STATS.snapshot())
+
+
+def test_save_merges_runs_and_report_command(instrumented, capsys):
+    """Saved statistics accumulate across runs and feed the report command."""
+    stats_file = instrumented / "stats.json"
+    for _ in range(2):
+        with db.get_connection() as conn:
+            analyze.fetch_all_habits(conn.cursor())
+        instrument.save()
+
+    entries = json.loads(stats_file.read_text())
+    select = next(e for e in entries.values() if "analyze.iter_all_habits" in e["origins"])
+    assert select["calls"] == 2
+
+    assert instrument.main(["report", "--stats", str(stats_file), "--by", "calls"]) == 0
+    out = capsys.readouterr().out
+    assert "analyze.iter_all_habits" in out
+
+
+def test_disabled_by_default_adds_nothing(monkeypatch):
+    """Without enabling, connections are plain sqlite3 connections."""
+    monkeypatch.setattr(instrument, "_config", dict(instrument._config, enabled=False))
+    assert instrument.connect_kwargs() == {}
@@ -0,0 +1,136 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+@pytest.fixture
+def conn():
+    """Fixture providing an empty in-memory database."""
+    conn = sqlite3.connect(":memory:")
+    yield conn
+    conn.close()
+
+
+def index_names(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")
+    return {row[0] for row in rows}
+
+
+def test_migrate_fresh_database(conn):
+    """A new database is brought to the latest version with every index in place."""
+    applied = migrations.migrate(conn)
+    assert applied == [m[0] for m in migrations.MIGRATIONS]
+    assert migrations.get_version(conn) == migrations.SCHEMA_VERSION
+    assert {"idx_habits_user_name", "idx_habits_periodicity_name",
+            "idx_streak_user", "idx_streak_habit_user"} <= index_names(conn)
+
+
+def test_migrate_legacy_database_deduplicates_streaks(conn):
+    """A pre-migration database keeps its data and loses duplicate streak rows."""
+    for statement in migrations.BASE_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'daily', 'now', 1)")
+    conn.execute("INSERT INTO streak (habit_id, user_id, count) VALUES (1, 1, 2)")
+    conn.execute("INSERT INTO streak (habit_id, user_id, count) VALUES (1, 1, 7)")
+    conn.commit()
+
+    migrations.migrate(conn)
+
+    assert conn.execute("SELECT count FROM streak").fetchall() == [(7,)]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO streak (habit_id, user_id, count) VALUES (1, 1, 1)")
+
+
+def test_current_schema_runs_no_ddl(conn):
+    """Once the schema is current, migrate() only reads the version."""
+    migrations.migrate(conn)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    assert migrations.migrate(conn) == []
+    assert statements == ["PRAGMA user_version"]
+
+
+def test_failed_migration_rolls_back(conn, monkeypatch):
+    """A failing step leaves the database at the previous version."""
+    broken = migrations.MIGRATIONS + [
+        (migrations.SCHEMA_VERSION + 1, "broken", ["CREATE TABLE extra (id INTEGER)", "NOT VALID SQL"]),
+    ]
+    monkeypatch.setattr(migrations, "MIGRATIONS", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(conn, target=migrations.SCHEMA_VERSION + 1)
+    assert migrations.get_version(conn) == migrations.SCHEMA_VERSION
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'extra'").fetchone() is None
+
+
+def test_concurrent_migrations_apply_each_version_once(tmp_path):
+    """A process that read an old version before another migrated the file skips the applied steps."""
+    path = str(tmp_path / "race.db")
+    first, second = sqlite3.connect(path), sqlite3.connect(path)
+    try:
+        stale = migrations.get_version(first)
+        assert migrations.migrate(second) == [m[0] for m in migrations.MIGRATIONS]
+        assert migrations._apply(first, stale, migrations.SCHEMA_VERSION) == []
+        assert migrations.get_version(first) == migrations.SCHEMA_VERSION
+    finally:
+        first.close()
+        second.close()
+
+
+def _migrate_file(path):
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        return migrations.migrate(conn)
+    finally:
+        conn.close()
+
+
+def test_parallel_processes_migrate_one_file(tmp_path):
+    """Several processes migrating a fresh file together all succeed, and every step runs once."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    path = str(tmp_path / "parallel.db")
+    with ProcessPoolExecutor(4) as executor:
+        applied = list(executor.map(_migrate_file, [path] * 4))
+    versions = sorted(version for versions in applied for version in versions)
+    assert versions == [m[0] for m in migrations.MIGRATIONS]
+
+
+def test_habit_names_become_unique_per_user(conn):
+    """The habits rebuild keeps rows, streaks and ID high-water mark, and scopes name uniqueness to the user."""
+    conn.execute("PRAGMA foreign_keys = ON")
+    migrations.migrate(conn, target=7)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw'), ('bob', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'daily', 'now', 1)")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Gone', 'daily', 'now', 1)")
+    conn.execute("DELETE FROM habits WHERE habit_id = 2")
+    conn.execute("INSERT INTO streak (habit_id, user_id, count) VALUES (1, 1, 3)")
+    conn.commit()
+
+    migrations.migrate(conn)
+
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert conn.execute("SELECT habit_id, name FROM habits").fetchall() == [(1, "Run")]
+    assert conn.execute("SELECT count FROM streak").fetchall() == [(3,)]
+    bob_run = conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) "
+                           "VALUES ('Run', 'daily', 'now', 2)").lastrowid
+    assert bob_run == 3
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'weekly', 'now', 1)")
+
+
+def test_habits_rebuild_keeps_high_water_mark_when_empty(conn):
+    """IDs of deleted habits are not reused even when no habit is left to copy."""
+    migrations.migrate(conn, target=7)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Gone', 'daily', 'now', 1)")
+    conn.execute("DELETE FROM habits")
+    conn.commit()
+
+    migrations.migrate(conn)
+
+    assert conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) "
+                        "VALUES ('Run', 'daily', 'now', 1)").lastrowid == 2
+    assert conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'habits'").fetchall() == [(2,)]
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from pool import ConnectionPool, PoolTimeoutError
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """Fixture providing a small connection pool on a temporary database file."""
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2, timeout=0.2)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE items (value INTEGER)")
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused(pool):
+    """A released connection is handed out again instead of opening a new one."""
+    with pool.connection() as conn:
+        first = conn.raw
+    with pool.connection() as conn:
+        second = conn.raw
+    assert first is second
+    stats = pool.stats()
+    assert stats["open"] == 1
+    assert stats["misses"] == 1
+    assert stats["hits"] >= 2
+
+
+def test_nested_checkout_shares_connection(pool):
+    """Nested checkouts on one thread return the same handle until the outermost release."""
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+        assert pool.stats()["idle"] == 0
+    assert pool.stats()["idle"] == 1
+
+
+def test_nested_exit_leaves_the_transaction_to_the_caller(pool):
+    """Only the outermost with block commits; an error there also undoes the helper's writes."""
+    def helper():
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items VALUES (2)")
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO items VALUES (1)")
+            helper()
+            assert conn.in_transaction
+            raise RuntimeError("caller failed halfway")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO items VALUES (1)")
+        helper()
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 2
+
+
+def test_context_manager_commits(pool):
+    """Leaving the with block commits the transaction before releasing the connection."""
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO items VALUES (1)")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 1
+
+
+def test_uncommitted_work_is_rolled_back_on_release(pool):
+    """A connection closed mid-transaction is rolled back before reuse."""
+    conn = pool.connection()
+    conn.execute("INSERT INTO items VALUES (1)")
+    conn.close()
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+
+
+def test_threads_wait_for_free_connection(pool):
+    """When every connection is checked out, other threads wait and then time out."""
+    held = []
+    errors = []
+    release = threading.Event()
+
+    def hold():
+        with pool.connection() as conn:
+            held.append(conn)
+            release.wait()
+
+    def try_checkout():
+        try:
+            pool.connection().close()
+        except PoolTimeoutError as e:
+            errors.append(e)
+
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for t in holders:
+        t.start()
+    while len(held) < 2:
+        pass
+
+    waiter = threading.Thread(target=try_checkout)
+    waiter.start()
+    waiter.join()
+    release.set()
+    for t in holders:
+        t.join()
+
+    assert len(errors) == 1
+    assert pool.stats()["waits"] == 1
+    assert pool.stats()["open"] == 2
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+import db
+import profiles
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fixture pointing the shared pool at a fresh database file and restoring the profile afterwards."""
+    monkeypatch.setattr(db, "DATABASE_URL", str(tmp_path / "profiles.db"))
+    db.ensure_schema()
+    yield
+    db.configure_profile("default")
+
+
+def test_profile_applies_pragmas_to_pooled_connections(database):
+    """Connections checked out after switching profile carry the profile's settings."""
+    db.configure_profile("balanced")
+    with db.get_connection() as conn:
+        settings = profiles.settings(conn)
+        conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    assert settings["journal_mode"] == "wal"
+    assert settings["synchronous"] == 1  # NORMAL
+    assert settings["cache_size"] == -64_000
+    assert settings["temp_store"] == 2  # MEMORY
+    assert settings["busy_timeout"] == 5000
+
+    db.configure_profile("durable")
+    with db.get_connection() as conn:
+        assert profiles.settings(conn)["synchronous"] == 2  # FULL
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+
+def test_readonly_profile_refuses_writes(database):
+    """The analytics profile reads but cannot write."""
+    db.configure_profile("readonly-analytics")
+    assert profiles.is_read_only(db.PROFILE)
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM habits").fetchone() == (0,)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+
+
+def test_unknown_profile_is_rejected(database):
+    """Misspelt profile names fail loudly instead of silently using the defaults."""
+    with pytest.raises(ValueError):
+        db.configure_profile("fast")
+    assert db.PROFILE == "default"
+    assert profiles.initializer("default") is None
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import analyze
+import migrations
+import replica
+
+
+@pytest.fixture
+def primary(tmp_path):
+    """Fixture providing a migrated primary database file with a few users."""
+    path = str(tmp_path / "primary.db")
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'pw')", [("ann",), ("bob",)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def users(conn):
+    return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def test_refresh_rotates_and_reports_staleness(primary, tmp_path):
+    """Copies go to the stalest slot, are read-only and report when the primary moved on."""
+    manager = replica.ReplicaManager(primary, str(tmp_path / "replicas"), pages_per_step=2)
+    first = manager.refresh()
+    status = replica.freshest(manager.directory)
+    assert status["path"] == first["path"] and not status["behind"]
+
+    conn = replica.connect(first["path"])
+    assert users(conn) == 2
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM users")
+    conn.close()
+
+    with sqlite3.connect(primary) as writer:
+        writer.execute("INSERT INTO users (username, password) VALUES ('cy', 'pw')")
+    writer.close()
+    assert replica.freshest(manager.directory)["behind"]
+
+    second = manager.refresh()
+    assert second["path"] != first["path"]
+    conn, status = replica.connect_freshest(manager.directory)
+    assert status["path"] == second["path"] and not status["behind"]
+    assert users(conn) == 3
+    conn.close()
+
+
+def test_wal_copy_does_not_block_writers(primary, tmp_path):
+    """In WAL mode a slow, paced copy runs from one snapshot while a writer keeps committing."""
+    with sqlite3.connect(primary) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                         [(f"user{i}", "x" * 500) for i in range(2000)])
+    conn.close()
+
+    done, commits, errors = threading.Event(), [], []
+
+    def write():
+        conn = sqlite3.connect(primary, timeout=0.05)
+        while not done.is_set():
+            try:
+                with conn:
+                    conn.execute("INSERT INTO users (username, password) VALUES (?, 'pw')", (f"w{len(commits)}",))
+                commits.append(1)
+            except sqlite3.OperationalError as e:
+                errors.append(e)
+        conn.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        info = replica.ReplicaManager(primary, str(tmp_path / "replicas"), pages_per_step=4,
+                                      step_sleep=0.001).refresh()
+    finally:
+        done.set()
+        writer.join()
+
+    assert info["steps"] > 1
+    assert commits and not errors
+    conn = replica.connect(info["path"])
+    assert 2002 <= users(conn) <= 2002 + len(commits)
+    assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+    conn.close()
+
+
+def test_rollback_journal_copy_is_paced_under_writes(primary, tmp_path, monkeypatch):
+    """Without WAL the copy still goes step by step: writers commit while it runs, restarting it."""
+    with sqlite3.connect(primary) as conn:
+        conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)",
+                         ((f"pad{i}", "x" * 500) for i in range(200)))
+    conn.close()
+    manager = replica.ReplicaManager(primary, str(tmp_path / "replicas"), pages_per_step=2, step_sleep=0.02,
+                                     max_restarts=10)
+    commits, stepping, real_sleep = [], threading.Event(), time.sleep
+
+    def pause(seconds):
+        stepping.set()
+        real_sleep(seconds)
+
+    monkeypatch.setattr(replica.time, "sleep", pause)
+
+    def write(staging, count, forever=None):
+        # Start in the first pause between two steps of the copy
+        stepping.wait(5)
+        # A busy timeout far shorter than the copy: it only has to wait for one step
+        conn = sqlite3.connect(primary, timeout=0.1)
+        while len(commits) < count or (forever and not forever.is_set()):
+            with conn:
+                conn.execute("INSERT INTO users (username, password) VALUES (?, 'pw')", (f"w{len(commits)}",))
+            commits.append(os.path.exists(staging))
+            time.sleep(0.02)
+        conn.close()
+
+    writer = threading.Thread(target=write, args=(manager.slot_path(0) + ".tmp", 3))
+    writer.start()
+    info = manager.refresh()
+    writer.join()
+    assert commits == [True] * 3
+    assert info["steps"] > 1 and 1 <= info["restarts"] <= 3
+    conn = replica.connect(info["path"])
+    assert users(conn) == 205
+    conn.close()
+    assert not replica.freshest(manager.directory)["behind"]
+
+    # Writes that never let up make the refresh give up instead of blocking them
+    manager.max_restarts = 2
+    done = threading.Event()
+    stepping.clear()
+    writer = threading.Thread(target=write, args=(manager.slot_path(1) + ".tmp", 0, done))
+    writer.start()
+    try:
+        with pytest.raises(replica.ReplicaBusyError):
+            manager.refresh()
+    finally:
+        done.set()
+        writer.join()
+    monkeypatch.undo()
+    assert not os.path.exists(manager.slot_path(1) + ".tmp")
+    assert replica.freshest(manager.directory)["path"] == info["path"]
+
+    # A commit landing after the copy started but before the replica is in place makes it "behind"
+    real_replace = replica.os.replace
+
+    def commit_then_replace(source, target):
+        with sqlite3.connect(primary) as conn:
+            conn.execute("INSERT INTO users (username, password) VALUES (?, 'pw')", (f"late {target}",))
+        conn.close()
+        real_replace(source, target)
+
+    monkeypatch.setattr(replica.os, "replace", commit_then_replace)
+    manager = replica.ReplicaManager(primary, str(tmp_path / "replicas"))
+    manager.refresh()
+    monkeypatch.undo()
+    assert replica.freshest(manager.directory)["behind"]
+
+
+def test_analytics_read_the_freshest_replica(primary, tmp_path, monkeypatch):
+    """With a replica directory configured, analytics run on the replica and announce it."""
+    directory = str(tmp_path / "replicas")
+    replica.ReplicaManager(primary, directory).refresh()
+    monkeypatch.setattr(replica, "REPLICA_DIR", directory)
+
+    seen = []
+    with analyze.analytics_runner(on_replica=seen.append) as run:
+        assert run(analyze.fetch_counts)["users"] == 2
+    assert seen and seen[0]["primary"].endswith("primary.db")
+    assert "up to date" in replica.describe_age(seen[0])
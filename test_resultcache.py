@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+import analyze
+import db
+import replica
+import resultcache
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fixture pointing the shared pool at a fresh database with one user and two habits."""
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(db, "DATABASE_URL", path)
+    db.ensure_schema()
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+        conn.executemany("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES (?, 'daily', 'now', 1)",
+                         [("Run",), ("Read",)])
+    yield path
+    db.close_pool()
+
+
+def test_repeated_calls_are_served_from_the_cache(database):
+    """The second identical call is a hit; different arguments are separate entries."""
+    cache = resultcache.ResultCache()
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    assert sorted(cache.call(cursor, analyze.fetch_all_habits)) == ["Read", "Run"]
+    assert sorted(cache.call(cursor, analyze.fetch_all_habits)) == ["Read", "Run"]
+    assert cache.call(cursor, analyze.fetch_habits_by_periodicity, "weekly") == []
+    assert sorted(cache.call(cursor, analyze.iter_all_habits)) == ["Read", "Run"]
+    info = cache.info()
+    assert (info["hits"], info["misses"], info["uncached"], info["entries"]) == (1, 3, 1, 2)
+    conn.close()
+
+
+def test_writes_from_any_connection_invalidate(database):
+    """Commits made on the reading connection or on any other connection are noticed."""
+    cache = resultcache.ResultCache()
+    reader = sqlite3.connect(database)
+    cursor = reader.cursor()
+    assert sorted(cache.call(cursor, analyze.fetch_all_habits)) == ["Read", "Run"]
+
+    with sqlite3.connect(database) as writer:
+        writer.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Swim', 'daily', 'now', 1)")
+    assert sorted(cache.call(cursor, analyze.fetch_all_habits)) == ["Read", "Run", "Swim"]
+
+    reader.execute("DELETE FROM habits WHERE name = 'Run'")
+    reader.commit()
+    assert sorted(cache.call(cursor, analyze.fetch_all_habits)) == ["Read", "Swim"]
+
+    # A write still pending in a transaction is only visible to its own connection
+    reader.execute("DELETE FROM habits WHERE name = 'Swim'")
+    assert cache.call(cursor, analyze.fetch_all_habits) == ["Read"]
+    reader.rollback()
+    assert cache.info()["stale"] == 2 and cache.info()["uncached"] == 1
+    assert sorted(cache.call(cursor, analyze.fetch_all_habits)) == ["Read", "Swim"]
+    assert cache.info()["hits"] == 1
+    reader.close()
+
+
+def test_hits_survive_reconnects(database, tmp_path):
+    """Entries belong to the data, so new pool connections and reopened replicas still hit."""
+    cache = resultcache.ResultCache()
+    with db.get_connection() as conn:
+        assert sorted(cache.call(conn.cursor(), analyze.fetch_all_habits)) == ["Read", "Run"]
+    db.close_pool()
+    with db.get_connection() as conn:
+        assert sorted(cache.call(conn.cursor(), analyze.fetch_all_habits)) == ["Read", "Run"]
+    assert (cache.info()["hits"], cache.info()["misses"]) == (1, 1)
+
+    manager = replica.ReplicaManager(database, str(tmp_path / "replicas"), slots=1)
+    path = manager.refresh()["path"]
+    for _ in range(2):
+        conn = replica.connect(path)
+        assert sorted(cache.call(conn.cursor(), analyze.fetch_all_habits)) == ["Read", "Run"]
+        conn.close()
+    assert (cache.info()["hits"], cache.info()["misses"]) == (2, 2)
+
+    # A refresh renames a new copy into place: connections to it see the new data, while one
+    # still open on the old copy is passed through rather than mixed up with it
+    stale = replica.connect(path)
+    assert sorted(cache.call(stale.cursor(), analyze.fetch_all_habits)) == ["Read", "Run"]
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Swim', 'daily', 'now', 1)")
+    manager.refresh()
+    conn = replica.connect(path)
+    assert sorted(cache.call(conn.cursor(), analyze.fetch_all_habits)) == ["Read", "Run", "Swim"]
+    assert sorted(cache.call(stale.cursor(), analyze.fetch_all_habits)) == ["Read", "Run"]
+    assert cache.info()["uncached"] == 1
+    conn.close()
+    stale.close()
+    cache.clear()
+
+
+def test_eviction_is_least_recently_used_and_size_bounded(database):
+    """The cache keeps at most max_entries results and never more than max_bytes."""
+    cache = resultcache.ResultCache(max_entries=2)
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    cache.call(cursor, analyze.fetch_streak_for_habit, "Run")
+    cache.call(cursor, analyze.fetch_streak_for_habit, "Read")
+    cache.call(cursor, analyze.fetch_streak_for_habit, "Run")  # now most recently used
+    cache.call(cursor, analyze.fetch_streak_for_habit, "Swim")
+    assert cache.info()["evictions"] == 1
+    cache.call(cursor, analyze.fetch_streak_for_habit, "Run")
+    assert cache.info()["hits"] == 2
+
+    tiny = resultcache.ResultCache(max_bytes=10)
+    tiny.call(cursor, analyze.fetch_all_habits)
+    assert tiny.info()["entries"] == 0 and tiny.bytes == 0
+    conn.close()
+
+
+def test_analytics_runner_uses_the_process_cache(database, monkeypatch):
+    """Menu queries go through the shared cache unless it is turned off."""
+    monkeypatch.setattr(resultcache, "_cache", resultcache.ResultCache())
+    with analyze.analytics_runner() as run:
+        run(analyze.fetch_top_streaks, k=5)
+        run(analyze.fetch_top_streaks, k=5)
+    assert resultcache.get_cache().info()["hits"] == 1
+    with analyze.analytics_runner(cached=False) as run:
+        run(analyze.fetch_top_streaks, k=5)
+    assert resultcache.get_cache().info()["misses"] == 1
@@ -0,0 +1,119 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+import analyze
+import migrations
+import rollups
+from completions import record_completion
+from ingest import ingest_completions
+
+
+@pytest.fixture
+def conn():
+    """Fixture providing a migrated in-memory database with a daily and a weekly habit for user 1."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) "
+                 "VALUES ('Run', 'daily', '2024-03-01 08:00:00', 1)")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) "
+                 "VALUES ('Shop', 'weekly', '2024-03-01 08:00:00', 1)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def rollup_rows(conn):
+    return {table: conn.execute(f"SELECT * FROM {table} ORDER BY habit_id, period_start").fetchall()
+            for table in rollups.TABLES.values()}
+
+
+def test_incremental_rollups_match_rebuild(conn):
+    """Rollups kept up by logging and bulk ingestion equal a rebuild from the log."""
+    cursor = conn.cursor()
+    for day in (1, 1, 2, 4, 11):
+        record_completion(cursor, 1, 1, "daily", date(2024, 3, day))
+    record_completion(cursor, 1, 2, "weekly", date(2024, 3, 5))
+    conn.commit()
+    ingest_completions([(1, 1, "2024-03-02 19:00:00"), (1, 2, "2024-03-07"), (1, 2, "2024-03-12")], conn)
+
+    incremental = rollup_rows(conn)
+    assert incremental["completion_daily"][:3] == [(1, "2024-03-01", 1, 2), (1, "2024-03-02", 1, 2),
+                                                   (1, "2024-03-04", 1, 1)]
+    # 2024-03-04 and 2024-03-11 are Mondays
+    assert incremental["completion_weekly"] == [(1, "2024-02-26", 1, 4), (1, "2024-03-04", 1, 1),
+                                                (1, "2024-03-11", 1, 1), (2, "2024-03-04", 1, 2),
+                                                (2, "2024-03-11", 1, 1)]
+
+    assert rollups.rebuild(conn) == len(incremental["completion_daily"])
+    assert rollup_rows(conn) == incremental
+
+
+def test_migration_backfills_existing_completions(tmp_path):
+    """Databases upgraded to the rollup migration get rollups for their existing log."""
+    conn = sqlite3.connect(tmp_path / "old.db")
+    migrations.migrate(conn, target=8)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'daily', 'now', 1)")
+    conn.executemany("INSERT INTO completions (habit_id, user_id, completed_at, completed_on) VALUES (1, 1, ?, ?)",
+                     [(f"{day} 08:00:00", day) for day in ("2024-03-09", "2024-03-10", "2024-03-10")])
+    conn.commit()
+
+    migrations.migrate(conn)
+    assert conn.execute("SELECT period_start, completions FROM completion_daily").fetchall() == [
+        ("2024-03-09", 1), ("2024-03-10", 2)]
+    assert conn.execute("SELECT period_start, completions FROM completion_weekly").fetchall() == [("2024-03-04", 3)]
+    conn.close()
+
+
+def test_calendar_analytics(conn):
+    """Heatmap, per-day, weekly and adherence reads are answered from the rollups."""
+    cursor = conn.cursor()
+    for day in (1, 2, 2, 3, 5):
+        record_completion(cursor, 1, 1, "daily", date(2024, 3, day))
+    for day in (2, 13):
+        record_completion(cursor, 1, 2, "weekly", date(2024, 3, day))
+    conn.commit()
+
+    assert analyze.fetch_completion_heatmap(cursor, habit_id=1, start="2024-03-02", end="2024-03-05") == {
+        "2024-03-02": 2, "2024-03-03": 1, "2024-03-05": 1}
+    assert analyze.fetch_completion_heatmap(cursor, user_id=1, start="2024-03-01", end="2024-03-02") == {
+        "2024-03-01": 1, "2024-03-02": 3}
+    assert analyze.fetch_habits_done_per_day(cursor, date(2024, 3, 1), date(2024, 3, 31)) == {
+        "2024-03-01": 1, "2024-03-02": 2, "2024-03-03": 1, "2024-03-05": 1, "2024-03-13": 1}
+    assert analyze.fetch_weekly_completions(cursor, 1, "2024-03-01", "2024-03-31") == [
+        ("2024-02-26", 4), ("2024-03-04", 1)]
+
+    # Counted from creation (2024-03-01): 4 of 7 days, and 2 of 3 weeks
+    assert analyze.fetch_adherence(cursor, 1, "2024-02-01", "2024-03-07") == {
+        "habit_id": 1, "periodicity": "daily", "periods": 7, "completed": 4, "rate": 0.5714}
+    assert analyze.fetch_adherence(cursor, 2, end="2024-03-17")["completed"] == 2
+    assert analyze.fetch_adherence(cursor, 2, end="2024-03-17")["periods"] == 3
+    assert analyze.fetch_adherence(cursor, 99) is None
+
+
+def test_deleted_habits_leave_calendar_analytics(conn):
+    """A deleted habit's completions disappear from the rollups and the analytics reading them."""
+    import tracker
+
+    cursor = conn.cursor()
+    for habit_id, periodicity in ((1, "daily"), (2, "weekly")):
+        record_completion(cursor, 1, habit_id, periodicity, date(2024, 3, 4))
+    conn.commit()
+    window = {"start": "2024-03-01", "end": "2024-03-10"}
+    assert analyze.fetch_habits_done_per_day(cursor, **window) == {"2024-03-04": 2}
+
+    tracker.delete_habit(cursor, 1, 2)
+    conn.commit()
+    assert analyze.fetch_habits_done_per_day(cursor, **window) == {"2024-03-04": 1}
+    assert analyze.fetch_completion_heatmap(cursor, user_id=1, **window) == {"2024-03-04": 1}
+    assert analyze.fetch_weekly_completions(cursor, 2, **window) == []
+    assert analyze.fetch_adherence(cursor, 2, **window) is None
+
+    # Logs left behind by deletes before rows were removed with the habit are skipped by a rebuild
+    conn.execute("INSERT INTO completions (habit_id, user_id, completed_at, completed_on) "
+                 "VALUES (99, 1, '2024-03-04 08:00:00', '2024-03-04')")
+    rollups.rebuild(conn)
+    assert analyze.fetch_habits_done_per_day(cursor, **window) == {"2024-03-04": 1}
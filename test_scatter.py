@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+import analyze
+import datagen
+import db
+from scatter import ScatterGather, run_on_database
+
+
+@pytest.fixture(scope="module")
+def databases(tmp_path_factory):
+    """Fixture providing three small generated databases with different histories."""
+    root = tmp_path_factory.mktemp("scatter")
+    paths = []
+    for i in range(3):
+        path = str(root / f"part-{i}.db")
+        datagen.generate(path, users=4, days=90, seed=i, workers=1, end=date(2024, 6, 1))
+        paths.append(path)
+    return paths
+
+
+def test_parallel_matches_serial(databases):
+    """Worker processes return exactly what querying the files in turn returns."""
+    with ScatterGather(databases, 1) as serial, ScatterGather(databases, 2) as parallel:
+        for fn, kwargs in ((analyze.fetch_counts, {}),
+                           (analyze.fetch_top_streaks, {"k": 5, "by": "longest_streak"}),
+                           (analyze.fetch_streak_histogram, {"periodicity": "daily"}),
+                           (analyze.iter_all_habits, {})):
+            assert parallel.query(fn, **kwargs) == serial.query(fn, **kwargs)
+
+
+def test_partial_results_are_merged(databases):
+    """Counts and histograms add up and top-K is the global top-K."""
+    with ScatterGather(databases, 2) as executor:
+        counts = executor.query(analyze.fetch_counts)
+        histogram = executor.query(analyze.fetch_streak_histogram, by="count")
+        top = executor.query(analyze.fetch_top_streaks, k=4)
+        longest = executor.query(analyze.fetch_longest_streak)
+        streaks = executor.query(analyze.fetch_all_streaks)
+
+    assert counts["users"] == 12
+    assert counts["habits"] == sum(run_on_database(path, "fetch_counts", {})["habits"] for path in databases)
+    assert sum(histogram.values()) == len(streaks)
+    assert list(histogram) == sorted(histogram)
+    assert [value for _, value in top] == sorted((value for _, value in streaks), reverse=True)[:4]
+    assert longest[1] == top[0][1]
+
+
+def test_sharded_analytics_use_workers(tmp_path, monkeypatch):
+    """With workers configured, the shard map fans cross-shard queries out to processes."""
+    monkeypatch.setattr(db, "SHARD_COUNT", 3)
+    monkeypatch.setattr(db, "ANALYTICS_WORKERS", 2)
+    shard_map = db.configure_shards(str(tmp_path / "shards"))
+    try:
+        db.ensure_schema()
+        for i in range(6):
+            db.insert_user(f"user{i}", "pw")
+        with analyze.analytics_runner() as run:
+            assert run(analyze.fetch_counts)["users"] == 6
+        assert shard_map._scatter is not None
+    finally:
+        db.configure_shards(None)
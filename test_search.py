@@ -0,0 +1,111 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import analyze
+import migrations
+
+
+@pytest.fixture
+def conn():
+    """Fixture providing a migrated in-memory database with habits for two users."""
+    conn = sqlite3.connect(":memory:")
+    conn.execute("PRAGMA foreign_keys = ON")
+    migrations.migrate(conn)
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'pw')", [("ann",), ("bob",)])
+    conn.executemany("""
+        INSERT INTO habits (name, description, periodicity, created_at, user_id) VALUES (?, ?, 'daily', 'now', ?)
+    """, [
+        ("Meditate", "Ten minutes, then read", 1),
+        ("Read", "Twenty pages of a novel", 1),
+        ("Morning run", "5k around the park", 2),
+        ("Café visit", None, 2),
+    ])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def names(matches):
+    return [match[1] for match in matches]
+
+
+def test_prefix_search_ranks_name_matches_first(conn):
+    """Word prefixes match names and descriptions; a name match outranks a description match."""
+    cursor = conn.cursor()
+    assert names(analyze.search_habits(cursor, "rea")) == ["Read", "Meditate"]
+    assert names(analyze.search_habits(cursor, "med REA")) == ["Meditate"]
+    assert names(analyze.search_habits(cursor, "cafe")) == ["Café visit"]
+    # Words longer than the indexed prefixes are checked against the text
+    assert names(analyze.search_habits(cursor, "meditat")) == ["Meditate"]
+    assert names(analyze.search_habits(cursor, "meditated")) == []
+    assert names(analyze.search_habits(cursor, "rea", user_id=2)) == []
+    assert names(analyze.search_habits(cursor, "r", limit=1)) == ["Read"]
+    # FTS5 syntax in the query is treated as plain words
+    assert analyze.search_habits(cursor, '"; DROP TABLE habits; --') == []
+    assert analyze.search_habits(cursor, "  ") == []
+
+
+def test_every_match_is_ranked_before_the_limit(conn):
+    """The best match is found however many habits match before it, for all habits and per user."""
+    insert = "INSERT INTO habits (name, description, periodicity, created_at, user_id) VALUES (?, ?, 'daily', 'now', ?)"
+    conn.executemany(insert, [(f"Stretch legs and back, round {i}", "Slowly", 1 + i % 2) for i in range(300)])
+    conn.execute(insert, ("Stretch", None, 2))
+    cursor = conn.cursor()
+    assert names(analyze.search_habits(cursor, "stretch", limit=1)) == ["Stretch"]
+    assert names(analyze.search_habits(cursor, "stretch", limit=1, user_id=2)) == ["Stretch"]
+    assert names(analyze.search_habits(cursor, "stretch", limit=1, user_id=1)) == ["Stretch legs and back, round 0"]
+    # A user's habits are searched through the index too, so words match from their start
+    assert names(analyze.search_habits(cursor, "ark", user_id=2)) == []
+    assert names(analyze.search_habits(cursor, "par", user_id=2)) == ["Morning run"]
+
+
+def test_triggers_keep_the_index_in_sync(conn):
+    """Renames, edits, deletes and account deletion are reflected in searches."""
+    cursor = conn.cursor()
+    conn.execute("UPDATE habits SET name = 'Jog' WHERE name = 'Morning run'")
+    conn.execute("UPDATE habits SET description = 'Flat white' WHERE name = 'Café visit'")
+    conn.execute("UPDATE habits SET last_completed_at = '2024-03-01 08:00:00'")
+    conn.execute("DELETE FROM habits WHERE name = 'Read'")
+    assert names(analyze.search_habits(cursor, "morn")) == []
+    assert names(analyze.search_habits(cursor, "jog")) == ["Jog"]
+    assert names(analyze.search_habits(cursor, "white")) == ["Café visit"]
+    assert names(analyze.search_habits(cursor, "read")) == ["Meditate"]
+
+    conn.execute("DELETE FROM users WHERE username = 'bob'")
+    assert analyze.search_habits(cursor, "jog") == []
+    conn.execute("INSERT INTO habits_fts (habits_fts) VALUES ('integrity-check')")
+
+
+def test_search_falls_back_to_like_without_fts5(conn):
+    """Without FTS5 the migration skips the index and the same searches still work."""
+    class NoFts5:
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        def execute(self, sql, *args):
+            if "fts5" in sql:
+                raise sqlite3.OperationalError("no such module: fts5")
+            return self.cursor.execute(sql, *args)
+
+    migrations.drop_habit_search_index(conn)
+    migrations.habit_search_index(NoFts5(conn.cursor()))
+    cursor = conn.cursor()
+    assert not analyze.has_search_index(cursor)
+    assert names(analyze.search_habits(cursor, "rea")) == ["Read", "Meditate"]
+    assert names(analyze.search_habits(cursor, "med rea")) == ["Meditate"]
+    assert names(analyze.search_habits(cursor, "park", user_id=2)) == ["Morning run"]
+    assert names(analyze.search_habits(cursor, "park", user_id=1)) == []
+
+
+def test_search_menu_option(conn):
+    """The analytics menu prompts for a query and lists the matches."""
+    with patch("analyze.get_connection", return_value=conn), \
+            patch("analyze.replica.connect_freshest", return_value=(None, None)), \
+            patch("questionary.select") as select, patch("questionary.text") as text, \
+            patch("questionary.print") as mock_print:
+        select.return_value.ask.side_effect = ["Search habits", "Back to Main Menu"]
+        text.return_value.ask.return_value = "run"
+        analyze.run_analytics()
+    mock_print.assert_any_call("- Morning run: 5k around the park")
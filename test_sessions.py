@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+import migrations
+import sessions
+import tracker
+
+
+@pytest.fixture
+def cursor():
+    """Fixture providing a migrated in-memory database with one user and an empty session cache."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw')")
+    sessions.clear_cache()
+    yield conn.cursor()
+    sessions.clear_cache()
+    conn.close()
+
+
+def test_login_and_cached_lookup(cursor):
+    """A token resolves from the cache without touching the database."""
+    session = sessions.login(cursor, "ann", "pw")
+    assert (session.user_id, session.username) == (1, "ann")
+    cursor.connection.close()
+    assert sessions.authenticate_token(session.token) is session
+    assert sessions.validate(session) is session
+
+
+def test_wrong_password_is_rejected(cursor):
+    """Bad credentials do not open a session."""
+    with pytest.raises(tracker.AuthenticationError):
+        sessions.login(cursor, "ann", "nope")
+
+
+def test_token_from_another_process_is_loaded_once(cursor):
+    """A token missing from the cache is read from the sessions table and then cached."""
+    token = sessions.login(cursor, "ann", "pw").token
+    sessions.clear_cache()
+    with pytest.raises(sessions.SessionExpiredError):
+        sessions.authenticate_token(token)
+    session = sessions.authenticate_token(token, cursor)
+    assert session.username == "ann"
+    assert sessions.authenticate_token(token) is session
+
+
+def test_expired_and_revoked_sessions(cursor):
+    """Expired, logged-out and revoked sessions are refused."""
+    expired = sessions.login(cursor, "ann", "pw", ttl=-1)
+    with pytest.raises(sessions.SessionExpiredError):
+        sessions.authenticate_token(expired.token, cursor)
+    assert sessions.purge_expired(cursor) == 1
+
+    session = sessions.login(cursor, "ann", "pw")
+    sessions.logout(cursor, session.token)
+    assert not sessions.is_active(session)
+    with pytest.raises(sessions.SessionExpiredError):
+        sessions.authenticate_token(session.token, cursor)
+
+    session = sessions.login(cursor, "ann", "pw")
+    sessions.revoke_user(cursor, 1)
+    with pytest.raises(sessions.SessionExpiredError):
+        sessions.validate(session)
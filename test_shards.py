@@ -0,0 +1,165 @@
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+
+import analyze
+import cli
+import db
+import main
+import sessions
+import shards
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    """Fixture switching db to a fresh 3-shard layout with 12 registered users."""
+    shard_map = db.configure_shards(str(tmp_path / "shards"), 3)
+    db.ensure_schema()
+    with patch("main.questionary.print"):
+        for i in range(12):
+            main.register(f"user{i}", "pw")
+    yield shard_map
+    db.configure_shards(None)
+    sessions.clear_cache()
+
+
+def _user_id(shard_map, username):
+    with db.get_connection(username=username) as conn:
+        return conn.execute("SELECT user_id FROM users WHERE username = ?", (username,)).fetchone()[0]
+
+
+def test_users_are_spread_and_ids_name_their_shard(sharded):
+    """Each user lives on its hashed shard and its ID encodes that shard."""
+    counts = [row["users"] for row in sharded.info()]
+    assert sum(counts) == 12
+    assert all(counts)
+    for i in range(12):
+        username = f"user{i}"
+        shard = shards.hash_shard(username, 3)
+        assert sharded.shard_for_username(username) == shard
+        assert shards.shard_of_id(_user_id(sharded, username)) == shard
+
+
+def test_main_actions_are_routed(sharded):
+    """Adding, logging and listing work for users on different shards."""
+    with patch("main.questionary.print") as mock_print, \
+            patch("main.questionary.confirm") as mock_confirm:
+        mock_confirm.return_value.ask.return_value = True
+        for username in ("user0", "user1", "user2"):
+            user_id = _user_id(sharded, username)
+            main.add_habit(username, user_id, "Run", "daily run", "daily")
+            with db.get_connection(user_id=user_id) as conn:
+                habit_id = conn.execute("SELECT habit_id FROM habits WHERE user_id = ?", (user_id,)).fetchone()[0]
+            assert shards.shard_of_id(habit_id) == shards.shard_of_id(user_id)
+            main.log_completion(username, user_id, habit_id, "2024-01-01")
+
+            session = main.login(username, "pw")
+            main.view_habit(session=session)
+            main.logout(session)
+
+    printed = [call.args[0] for call in mock_print.call_args_list]
+    assert sum("Logged completion" in line for line in printed) == 3
+    assert "📋 Habits for 'user2':" in printed
+
+
+def test_analytics_are_merged_across_shards(sharded):
+    """Global queries gather every shard; per-user and per-habit queries visit only the owners."""
+    habits = {}
+    for i in range(6):
+        username = f"user{i}"
+        user_id = _user_id(sharded, username)
+        with db.get_connection(user_id=user_id) as conn:
+            cursor = conn.cursor()
+            habit_id = main.tracker.add_habit(cursor, user_id, f"habit {i}", "", "daily")
+            for day in range(1, i + 2):
+                main.tracker.log_completion(cursor, user_id, habit_id, f"2024-01-{day:02d}")
+            conn.commit()
+        habits[habit_id] = (f"habit {i}", user_id)
+
+    with analyze.analytics_runner() as run:
+        assert sorted(run(analyze.fetch_all_habits)) == sorted(name for name, _ in habits.values())
+        assert sorted(run(analyze.iter_all_habits)) == sorted(name for name, _ in habits.values())
+        assert run(analyze.fetch_longest_streak) == ("habit 5", 6)
+        assert run(analyze.fetch_top_streaks, k=3) == [("habit 5", 6), ("habit 4", 5), ("habit 3", 4)]
+        assert run(analyze.fetch_top_streaks, k=3, user_id=_user_id(sharded, "user2")) == [("habit 2", 3)]
+        assert run(analyze.fetch_habit_names, list(habits)) == {h: name for h, (name, _) in habits.items()}
+        assert len(run(analyze.search_habits, "habit", limit=4)) == 4
+        assert [row[1] for row in run(analyze.search_habits, "hab", user_id=_user_id(sharded, "user3"))] == ["habit 3"]
+
+        streaks = run(analyze.fetch_population_streaks)
+        assert list(streaks["habit_id"]) == sorted(habits)
+        assert sorted(streaks["longest"]) == [1, 2, 3, 4, 5, 6]
+
+        user_ids = [user_id for _, user_id in habits.values()][:2]
+        subset = run(analyze.fetch_population_streaks, user_ids=user_ids)
+        assert sorted(subset["user_id"]) == sorted(user_ids)
+
+
+def test_routing_needs_a_user_and_survives_growth(sharded, tmp_path):
+    """Unrouted connections are refused, and registered users stay put when shards are added."""
+    with pytest.raises(shards.ShardRoutingError):
+        db.get_connection()
+
+    before = {f"user{i}": sharded.shard_for_username(f"user{i}") for i in range(12)}
+    grown = db.configure_shards(sharded.root, 7)
+    db.ensure_schema()
+    assert grown.count == 7
+    assert {name: grown.shard_for_username(name) for name in before} == before
+    reopened = shards.ShardMap(sharded.root)
+    assert reopened.count == 7
+    reopened.close()
+
+
+def test_cli_routes_each_command_to_its_users_shard(sharded, capsys):
+    """The command line works in sharded mode, with tokens routed by their user ID."""
+    assert cli.main(["register", "zoe", "pw"]) == 0
+    assert json.loads(capsys.readouterr().out)["ok"]
+    with db.get_connection(username="zoe") as conn:
+        zoe = conn.execute("SELECT user_id FROM users WHERE username = 'zoe'").fetchone()[0]
+
+    assert cli.main(["login", "zoe", "pw"]) == 0
+    token = json.loads(capsys.readouterr().out)["result"]["token"]
+    sessions.clear_cache()  # as if the token came from another process
+
+    def batch(commands):
+        out = io.StringIO()
+        failures = cli.run_batch(None, commands.strip().splitlines(), out=out)
+        return failures, [json.loads(line) for line in out.getvalue().splitlines()]
+
+    failures, results = batch(f"""
+        add-habit --token {token} --name Swim
+        add-habit --username user3 --user-id {_user_id(sharded, "user3")} --name Swim
+    """)
+    assert failures == 0
+    habit_id = results[0]["result"]["habit_id"]
+    assert shards.shard_of_id(habit_id) == shards.shard_of_id(zoe)
+
+    failures, results = batch(f"""
+        log --token {token} --habit-id {habit_id} --at 2024-03-01T07:00:00
+        list --token {token}
+        analytics top -k 5
+        analytics search swim
+        rebuild-streaks
+        ingest events.csv
+    """)
+    assert failures == 1
+    assert [r["ok"] for r in results] == [True] * 5 + [False]
+    assert [h["name"] for h in results[1]["result"]] == ["Swim"]
+    assert results[2]["result"] == [{"name": "Swim", "count": 1}]
+    assert len(results[3]["result"]) == 2
+    assert results[4]["result"] == {"streaks": 1}
+    assert results[5]["error"] == "ShardRoutingError"
+
+
+def test_seeded_id_ranges_add_no_rows(sharded, tmp_path):
+    """Seeding ID ranges (also of shards added later) leaves only registered users in the counts."""
+    db.configure_shards(sharded.root, 5)
+    db.ensure_schema()
+    with analyze.analytics_runner() as run:
+        assert run(analyze.fetch_counts)["users"] == 12
+        assert run(analyze.fetch_counts)["habits"] == 0
+        assert run(analyze.fetch_all_habits) == []
+    with db.get_shard_map().directory.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM shard_users").fetchone()[0] == 12
@@ -0,0 +1,115 @@
+import sqlite3
+from datetime import date
+
+import numpy as np
+import pytest
+
+import analyze
+import datagen
+import db
+import snapshot
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """Fixture providing a generated database and a snapshot of it."""
+    root = tmp_path_factory.mktemp("snapshot")
+    path = str(root / "source.db")
+    datagen.generate(path, users=5, days=60, seed=3, workers=1, end=date(2024, 6, 1))
+    snapshot.export(path, str(root / "snap"), chunk_size=97)
+    conn = sqlite3.connect(path)
+    yield conn.cursor(), snapshot.open_snapshot(str(root / "snap"))
+    conn.close()
+
+
+def test_export_layout(source):
+    """Columns are fixed-width, memory-mapped and grouped by habit through the offsets."""
+    cursor, snap = source
+    cursor.execute("SELECT COUNT(*) FROM completions")
+    assert len(snap) == cursor.fetchone()[0] > 0
+    assert isinstance(snap.day, np.memmap) and snap.day.dtype == np.int32
+    assert snap.offsets[-1] == len(snap) and np.all(np.diff(snap.offsets) >= 0)
+
+    habit_id = int(snap.habits[0])
+    days = snap.days_of(habit_id)
+    assert isinstance(days, np.memmap)  # a view on the mapped file
+    cursor.execute("SELECT COUNT(*) FROM completions WHERE habit_id = ?", (habit_id,))
+    assert days.size == cursor.fetchone()[0]
+    assert snap.days_of(10 ** 9).size == 0
+
+
+def test_analytics_match_live_database(source):
+    """The snapshot-aware helpers give the same answers from the snapshot as from the database."""
+    cursor, snap = source
+    for user_ids in (None, [2, 4]):
+        live = analyze.fetch_population_streaks(cursor, user_ids)
+        mapped = analyze.fetch_population_streaks(snap, user_ids)
+        assert set(live) == set(mapped)
+        for key in live:
+            assert np.array_equal(live[key], mapped[key]), key
+
+    window = {"start": "2024-04-01", "end": "2024-06-01"}
+    assert analyze.fetch_habits_done_per_day(snap, **window) == analyze.fetch_habits_done_per_day(cursor, **window)
+    assert analyze.fetch_habits_done_per_day(snap, user_id=3, **window) == \
+        analyze.fetch_habits_done_per_day(cursor, user_id=3, **window)
+    habit_id = int(snap.habits[-1])
+    for kwargs in ({}, {"user_id": 1}, {"habit_id": habit_id}):
+        live = analyze.fetch_completion_heatmap(cursor, **kwargs, **window)
+        assert live and analyze.fetch_completion_heatmap(snap, **kwargs, **window) == live
+    for habit_id in snap.habits[[0, -1]]:
+        live = analyze.fetch_weekly_completions(cursor, int(habit_id), **window)
+        assert live and analyze.fetch_weekly_completions(snap, int(habit_id), **window) == live
+
+
+def test_habit_table_loads_on_first_use(source):
+    """Opening a snapshot maps the columns only; the habit table and offsets load when needed."""
+    _, snap = source
+    opened = snapshot.open_snapshot(snap.path)
+    assert not {"habits", "habit_user", "weekly", "offsets"} & set(vars(opened))
+    assert opened.days_of(int(snap.habits[0])).size > 0
+    assert {"habits", "offsets"} <= set(vars(opened))
+
+
+def test_runner_reads_the_snapshot_and_reports_fallbacks(source, monkeypatch):
+    """Snapshot-aware helpers read the snapshot; the others read the database and are reported."""
+    cursor, snap = source
+    monkeypatch.setattr(db, "DATABASE_URL", snap.meta["source"])
+    calls, fallbacks = [], []
+    monkeypatch.setattr(snap, "habits_done_per_day", lambda *args: calls.append(args) or {})
+    window = {"start": "2024-04-01", "end": "2024-06-01"}
+    try:
+        with analyze.analytics_runner(cached=False, snapshot=snap, on_fallback=fallbacks.append) as run:
+            assert run(analyze.fetch_habits_done_per_day, **window) == {}
+            assert len(calls) == 1 and fallbacks == []
+            assert run(analyze.fetch_top_streaks, k=3) == analyze.fetch_top_streaks(cursor, k=3)
+            assert fallbacks == ["fetch_top_streaks"]
+    finally:
+        db.close_pool()
+
+
+def test_export_skips_completions_of_deleted_habits(tmp_path):
+    """Completions left behind by a deleted habit stay out of the snapshot and its offsets."""
+    path = str(tmp_path / "source.db")
+    datagen.generate(path, users=3, days=30, seed=5, workers=1, end=date(2024, 6, 1))
+    conn = sqlite3.connect(path)
+    deleted, second = [row[0] for row in conn.execute("SELECT habit_id FROM habits ORDER BY habit_id LIMIT 2")]
+    # A raw delete, as older releases did, keeps the habit's completion rows
+    conn.execute("DELETE FROM habits WHERE habit_id = ?", (deleted,))
+    conn.commit()
+
+    snapshot.export(path, str(tmp_path / "snap"))
+    snap = snapshot.open_snapshot(str(tmp_path / "snap"))
+    assert deleted not in snap.habits
+    assert snap.days_of(deleted).size == 0
+    assert snap.days_of(second).size == \
+        conn.execute("SELECT COUNT(*) FROM completions WHERE habit_id = ?", (second,)).fetchone()[0]
+    mapped = analyze.fetch_population_streaks(snap)
+    assert deleted not in mapped["habit_id"]
+    assert np.array_equal(mapped["habit_id"], analyze.fetch_population_streaks(conn.cursor())["habit_id"])
+    conn.close()
+
+
+def test_open_rejects_other_directories(tmp_path):
+    """Opening a directory that is not a snapshot fails with SnapshotError."""
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.open_snapshot(str(tmp_path))
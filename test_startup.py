@@ -0,0 +1,23 @@
+import json
+import subprocess
+import sys
+
+import bench_startup
+
+
+def test_core_imports_skip_ui_and_numpy():
+    """Importing the core modules and the batch CLI does not load questionary or NumPy."""
+    code = ("import sys, json; import db, tracker, analyze, cli; "
+            f"print(json.dumps([m for m in {bench_startup.HEAVY_MODULES!r} if m in sys.modules]))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=bench_startup.HERE,
+                         check=True, capture_output=True, text=True).stdout
+    assert json.loads(out) == []
+
+
+def test_benchmark_report():
+    """One benchmark round reports every measurement against its budget."""
+    report = bench_startup.run(runs=1)
+    assert set(report["measurements"]) == set(bench_startup.BUDGETS_MS)
+    for measurement in report["measurements"].values():
+        assert measurement["median_ms"] > 0
+        assert "ok" in measurement
@@ -0,0 +1,88 @@
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+import migrations
+from analyze import fetch_population_streaks
+from completions import advance, record_completion
+from streak_engine import compute_streaks, compute_streaks_from_days, to_periods
+
+
+def scalar_streaks(periods):
+    """Reference implementation folding sorted periods one by one."""
+    current, longest, last = 0, 0, None
+    for period in sorted(periods):
+        current, longest, last = advance(current, longest, last, period)
+    return current, longest, last
+
+
+def test_runs_and_gaps():
+    """Run boundaries, lengths and gaps are reported per habit."""
+    result = compute_streaks([7, 7, 7, 7, 7, 3], [1, 2, 3, 6, 7, 10])
+    assert result["habit_id"].tolist() == [3, 7]
+    assert result["current"].tolist() == [1, 2]
+    assert result["longest"].tolist() == [1, 3]
+    assert result["run_start"].tolist() == [10, 1, 6]
+    assert result["run_length"].tolist() == [1, 3, 2]
+    assert result["gap_before"].tolist() == [0, 0, 2]
+
+
+def test_repeated_periods_count_once():
+    """Two completions in the same week do not lengthen a weekly streak."""
+    days = np.array([0, 1, 4, 11])  # Thu, Fri, Mon (next week), Mon (week after)
+    result = compute_streaks_from_days([1, 1, 1, 1], days, True)
+    assert to_periods(days, True).tolist() == [0, 0, 1, 2]
+    assert result["periods"].tolist() == [3]
+    assert result["longest"].tolist() == [3]
+
+
+def test_empty_input():
+    """No completions yields empty per-habit arrays."""
+    result = compute_streaks([], [])
+    assert result["habit_id"].size == 0
+    assert result["longest"].size == 0
+
+
+def test_matches_scalar_fold_on_random_data():
+    """The vectorized engine agrees with the incremental O(1) fold for many habits."""
+    rng = random.Random(42)
+    habit_ids, periods, expected = [], [], {}
+    for habit_id in range(1, 200):
+        days = [rng.randrange(0, 120) for _ in range(rng.randrange(1, 60))]
+        habit_ids += [habit_id] * len(days)
+        periods += days
+        expected[habit_id] = scalar_streaks(days)
+
+    result = compute_streaks(habit_ids, periods)
+    for i, habit_id in enumerate(result["habit_id"].tolist()):
+        assert (result["current"][i], result["longest"][i], result["last_period"][i]) == expected[habit_id]
+
+
+@pytest.fixture
+def cursor():
+    """Fixture providing a migrated in-memory database cursor with two users' habits."""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('ann', 'pw'), ('bob', 'pw')")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Run', 'daily', 'now', 1)")
+    conn.execute("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES ('Shop', 'weekly', 'now', 2)")
+    yield conn.cursor()
+    conn.close()
+
+
+def test_population_streaks_match_logged_summaries(cursor):
+    """analyze.fetch_population_streaks reproduces the incrementally maintained streaks."""
+    for day in ("2024-03-01", "2024-03-02", "2024-03-04", "2024-03-05", "2024-03-06"):
+        record_completion(cursor, 1, 1, "daily", day)
+    for day in ("2024-03-04", "2024-03-11", "2024-03-25"):
+        record_completion(cursor, 2, 2, "weekly", day)
+
+    result = fetch_population_streaks(cursor)
+    cursor.execute("SELECT habit_id, user_id, current_streak, longest_streak FROM streak ORDER BY habit_id")
+    assert list(zip(result["habit_id"].tolist(), result["user_id"].tolist(),
+                    result["current"].tolist(), result["longest"].tolist())) == cursor.fetchall()
+
+    only_bob = fetch_population_streaks(cursor, user_ids=[2])
+    assert only_bob["habit_id"].tolist() == [2]
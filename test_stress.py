@@ -0,0 +1,61 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import db
+import stress
+
+
+def locked():
+    return sqlite3.OperationalError("database is locked")
+
+
+@pytest.fixture
+def no_sleep():
+    """Fixture skipping the backoff sleeps and resetting the retry counters."""
+    with patch("db.time.sleep") as sleep, patch.dict(db.RETRY_STATS, {"retries": 0, "gave_up": 0}):
+        yield sleep
+
+
+def test_retrying_retries_lock_errors(no_sleep):
+    """A block that hits a locked database is run again until it succeeds."""
+    failures = [locked(), locked()]
+    runs = 0
+    for attempt in db.retrying(attempts=5):
+        with attempt:
+            runs += 1
+            if failures:
+                raise failures.pop()
+    assert runs == 3
+    assert db.RETRY_STATS == {"retries": 2, "gave_up": 0}
+    assert no_sleep.call_count == 2
+    assert all(0 <= call.args[0] <= db.RETRY_MAX_DELAY for call in no_sleep.call_args_list)
+
+
+def test_retrying_gives_up_and_passes_other_errors(no_sleep):
+    """Lock errors propagate after the last try; any other error propagates at once."""
+    runs = 0
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        for attempt in db.retrying(attempts=3):
+            with attempt:
+                runs += 1
+                raise locked()
+    assert runs == 3 and db.RETRY_STATS == {"retries": 2, "gave_up": 1}
+
+    runs = 0
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        for attempt in db.retrying(attempts=3):
+            with attempt:
+                runs += 1
+                raise sqlite3.OperationalError("no such table: nope")
+    assert runs == 1
+
+
+def test_stress_run_has_no_errors(tmp_path):
+    """Two processes writing and reading the same file for a second report no errors."""
+    report = stress.run(processes=2, seconds=1.0, users=5, profile="balanced", path=str(tmp_path / "stress.db"))
+    assert report["error_count"] == 0, report["errors"]
+    assert report["operations"] > 0 and report["latency"]["log"]["count"] > 0
+    with sqlite3.connect(tmp_path / "stress.db") as conn:
+        assert conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] > 0
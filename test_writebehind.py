@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+import db
+import main
+import tracker
+import writebehind
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Fixture pointing the shared pool at a fresh database with two users and three habits."""
+    monkeypatch.setattr(db, "DATABASE_URL", str(tmp_path / "wb.db"))
+    db.ensure_schema()
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO users (username, password) VALUES (?, 'pw')", [("ann",), ("bob",)])
+        conn.executemany("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES (?, ?, 'now', ?)",
+                         [("Run", "daily", 1), ("Read", "daily", 1), ("Shop", "weekly", 2)])
+    yield
+    writebehind.disable()
+    db.close_pool()
+
+
+def completions(habit_id):
+    with db.get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM completions WHERE habit_id = ?", (habit_id,)).fetchone()[0]
+
+
+def test_concurrent_completions_share_commits(database):
+    """Completions from many callers are committed in batches and acknowledged with their summary."""
+    queue = writebehind.WriteBehindQueue(batch_size=16, max_delay_ms=20)
+    days = [f"2024-03-{day:02d}" for day in range(1, 31)]
+    with ThreadPoolExecutor(10) as executor:
+        summaries = list(executor.map(lambda day: queue.submit(1, 1, day).result(timeout=5), days))
+    queue.close()
+
+    assert completions(1) == 30
+    assert queue.stats["events"] == 30 and queue.stats["batches"] < 30
+    assert max(summary["count"] for summary in summaries) == 30
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT longest_streak FROM streak WHERE habit_id = 1").fetchone()[0] == 30
+
+
+def test_rejected_completion_does_not_fail_its_batch(database):
+    """A completion of someone else's habit fails alone; the rest of the batch is committed."""
+    queue = writebehind.WriteBehindQueue(batch_size=10, max_delay_ms=50)
+    good = queue.submit(1, 1, "2024-03-01")
+    bad = queue.submit(1, 3, "2024-03-01")  # habit 3 belongs to bob
+    other = queue.submit(1, 2, "2024-03-01")
+    with pytest.raises(tracker.HabitNotFoundError):
+        bad.result(timeout=5)
+    assert good.result(timeout=5)["count"] == 1 and other.result(timeout=5)["count"] == 1
+    queue.close()
+    assert (completions(1), completions(2), completions(3)) == (1, 1, 0)
+
+
+def test_close_flushes_pending_completions(database):
+    """Closing commits everything still queued, then refuses new completions."""
+    queue = writebehind.WriteBehindQueue(batch_size=1000, max_delay_ms=10_000)
+    futures = [queue.submit(1, 2, f"2024-04-{day:02d}") for day in range(1, 8)]
+    assert queue.flush(timeout=5)
+    assert all(future.done() for future in futures) and completions(2) == 7
+
+    queue.submit(1, 2, "2024-04-08")
+    queue.close()
+    assert completions(2) == 8
+    with pytest.raises(RuntimeError):
+        queue.submit(1, 2)
+
+
+def test_writer_survives_errors_outside_a_batch(database):
+    """A failure before a batch reaches the database fails its futures; the writer keeps going."""
+    queue = writebehind.WriteBehindQueue(max_delay_ms=1)
+    with patch("writebehind.get_shard_map", side_effect=OSError("shard layout unavailable")):
+        with pytest.raises(OSError):
+            queue.submit(1, 1, "2024-03-01").result(timeout=5)
+    assert queue.submit(1, 1, "2024-03-02").result(timeout=5)["count"] == 1
+    queue.close()
+    assert queue.stats["failed"] == 1
+
+
+def test_close_races_with_submit_and_flush(database):
+    """Every accepted completion is resolved by close, and flush after close returns at once."""
+    queue = writebehind.WriteBehindQueue(batch_size=4, max_delay_ms=1)
+    accepted = []
+
+    def submit_until_closed(habit_id):
+        for day in range(1, 29):
+            try:
+                accepted.append(queue.submit(1, habit_id, f"2024-02-{day:02d}"))
+            except RuntimeError:
+                return
+
+    with ThreadPoolExecutor(4) as executor:
+        for habit_id in (1, 2, 1, 2):
+            executor.submit(submit_until_closed, habit_id)
+        queue.close()
+    assert all(future.done() for future in accepted)
+    assert queue.flush(timeout=1) is True
+
+
+def test_log_completion_in_write_behind_mode(database):
+    """main.log_completion queues the completion and reports the committed streak."""
+    writebehind.enable(max_delay_ms=1)
+    with patch("main.questionary.print") as mock_print:
+        main.log_completion("ann", 1, 1, "2024-03-01")
+        main.log_completion("ann", 1, 3, "2024-03-01")
+    mock_print.assert_any_call("🔥 Total completions so far: 1")
+    mock_print.assert_any_call("❌ Habit not found or doesn't belong to the user.")
+    assert completions(1) == 1
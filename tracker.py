@@ -0,0 +1,338 @@
+"""
+Core habit tracker operations, free of any user interaction.
+
+These functions hold the data logic behind the interactive menu in main.py
+and the non-interactive command line in cli.py. Like the helpers in
+analyze.py they take a database cursor as their first argument; they return
+plain data and raise a TrackerError subclass instead of printing, and they
+leave committing to the caller.
+"""
+import base64
+import sqlite3
+from datetime import datetime
+
+import rollups
+from completions import record_completion, to_local_datetime
+from habit import Habit, habit_row, select_list
+
+PERIODICITIES = ("daily", "weekly")
+
+# Habits per page for list_habits_page
+DEFAULT_PAGE_SIZE = 50
+
+# Tables holding per-habit data. Foreign key enforcement (and with it the
+# schema's ON DELETE CASCADE) is off on ordinary connections, so deleting a
+# habit or user removes these rows explicitly, in the same transaction.
+HABIT_DATA_TABLES = ("completions", "streak", *rollups.TABLES.values())
+
+
+# ---------------------------
+# Errors
+# ---------------------------
+
+class TrackerError(Exception):
+    """Base class for expected, user-facing failures."""
+
+
+class AuthenticationError(TrackerError):
+    """The credentials (or username/user ID pair) do not identify a user."""
+
+
+class DuplicateError(TrackerError):
+    """The user or habit being created already exists."""
+
+
+class HabitNotFoundError(TrackerError):
+    """The habit does not exist or belongs to another user."""
+
+
+class InvalidInputError(TrackerError):
+    """An argument has the wrong type or value."""
+
+
+def parse_id(value, label="ID") -> int:
+    """Convert a user-supplied ID to an int, raising InvalidInputError if it is not a number."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidInputError(f"Invalid {label}. Must be a number.") from None
+
+
+# ---------------------------
+# Users
+# ---------------------------
+
+def register_user(cursor, username: str, password: str) -> int:
+    """
+    Create a new user account.
+
+    Returns:
+        int: The new user's ID.
+    """
+    try:
+        cursor.execute(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            (username, password)
+        )
+    except sqlite3.IntegrityError:
+        raise DuplicateError(f"Username '{username}' is already taken.") from None
+    return cursor.lastrowid
+
+
+def authenticate(cursor, username: str, password: str):
+    """
+    Check a username and password.
+
+    Returns:
+        tuple: (user_id, username) of the authenticated user.
+
+    Raises:
+        AuthenticationError: If the credentials do not match a user.
+    """
+    cursor.execute("SELECT user_id, username FROM users WHERE username = ? AND password = ?", (username, password))
+    user = cursor.fetchone()
+    if not user:
+        raise AuthenticationError("Invalid username or password.")
+    return user
+
+
+def verify_user_id(cursor, username: str, user_id: int) -> int:
+    """
+    Check that a username belongs to the given user ID.
+
+    Returns:
+        int: The verified user ID.
+
+    Raises:
+        AuthenticationError: If the username does not exist or has another ID.
+    """
+    cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
+    user = cursor.fetchone()
+    if not user or user[0] != user_id:
+        raise AuthenticationError("Username and User ID do not match.")
+    return user_id
+
+
+def delete_user(cursor, user_id: int) -> None:
+    """Delete a user account together with their habits and the habits' data."""
+    _delete_habit_data(cursor, "user_id = ?", (user_id,))
+    cursor.execute("DELETE FROM habits WHERE user_id = ?", (user_id,))
+    cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+
+# ---------------------------
+# Habits
+# ---------------------------
+
+def add_habit(cursor, user_id: int, name: str, description: str, periodicity: str) -> int:
+    """
+    Create a habit for a user.
+
+    Returns:
+        int: The new habit's ID.
+
+    Raises:
+        InvalidInputError: If the periodicity is not "daily" or "weekly".
+        DuplicateError: If a habit with this name already exists.
+    """
+    if periodicity not in PERIODICITIES:
+        raise InvalidInputError(f"Periodicity must be one of: {', '.join(PERIODICITIES)}.")
+
+    cursor.execute("SELECT * FROM habits WHERE user_id = ? AND name = ?", (user_id, name))
+    if cursor.fetchone():
+        raise DuplicateError(f"Habit '{name}' already exists for this user.")
+
+    created_at = datetime.now()
+    try:
+        cursor.execute("""
+            INSERT INTO habits (name, description, periodicity, created_at, user_id, is_active)
+            VALUES (?, ?, ?, ?, ?, 'Yes')
+        """, (name, description, periodicity, created_at, user_id))
+    except sqlite3.IntegrityError:
+        raise DuplicateError(f"Habit '{name}' already exists.") from None
+    return cursor.lastrowid
+
+
+# Columns of the habit tuples returned by list_habits and list_habits_page
+HABIT_COLUMNS = "habit_id, name, description, periodicity, is_active, last_completed_at"
+
+
+def _fetch_habits(cursor, sql: str, params, as_objects: bool) -> list:
+    # `sql` selects {columns}: the tuple columns, or every Habit column for habit_row
+    if not as_objects:
+        return cursor.execute(sql.format(columns=HABIT_COLUMNS), params).fetchall()
+    factory = cursor.row_factory
+    cursor.row_factory = habit_row
+    try:
+        return cursor.execute(sql.format(columns=select_list(Habit)), params).fetchall()
+    finally:
+        cursor.row_factory = factory
+
+
+def list_habits(cursor, user_id: int, as_objects: bool = False) -> list:
+    """
+    Retrieve all habits of a user.
+
+    Args:
+        cursor: The database cursor object.
+        user_id (int): Owner of the habits.
+        as_objects (bool): Return habit.Habit objects instead of tuples.
+
+    Returns:
+        list of tuples: (habit_id, name, description, periodicity, is_active, last_completed_at),
+        or of Habit objects.
+    """
+    return _fetch_habits(cursor, "SELECT {columns} FROM habits WHERE user_id = ?", (user_id,), as_objects)
+
+
+def encode_page_token(habit_id: int) -> str:
+    """Encode the last habit ID of a page as an opaque cursor token."""
+    return base64.urlsafe_b64encode(f"h:{habit_id}".encode()).decode().rstrip("=")
+
+
+def decode_page_token(token: str) -> int:
+    """
+    Decode a cursor token from encode_page_token back to a habit ID.
+
+    Raises:
+        InvalidInputError: If the token is malformed.
+    """
+    try:
+        kind, _, habit_id = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode().partition(":")
+        if kind != "h":
+            raise ValueError
+        return int(habit_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidInputError("Invalid page token.") from None
+
+
+def list_habits_page(cursor, user_id: int, after: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                     is_active: str | None = None, periodicity: str | None = None, as_objects: bool = False):
+    """
+    Retrieve one page of a user's habits, ordered by habit ID.
+
+    Uses keyset pagination: each page starts after the last habit ID of the
+    previous one (carried in the ``after`` token), so fetching page N costs
+    the same as fetching the first page, unlike OFFSET.
+
+    Args:
+        cursor: The database cursor object.
+        user_id (int): Owner of the habits.
+        after (str, optional): The ``next`` token of the previous page (None for the first page).
+        limit (int): Maximum number of habits per page.
+        is_active (str, optional): Only habits with this status ("Yes" or "No").
+        periodicity (str, optional): Only "daily" or "weekly" habits.
+        as_objects (bool): Return habit.Habit objects instead of tuples.
+
+    Returns:
+        tuple: (list of habits as in list_habits, token for the next page or None on the last page).
+
+    Raises:
+        InvalidInputError: If the token or a filter is invalid.
+    """
+    if limit < 1:
+        raise InvalidInputError("Page size must be at least 1.")
+    if periodicity is not None and periodicity not in PERIODICITIES:
+        raise InvalidInputError(f"Periodicity must be one of: {', '.join(PERIODICITIES)}.")
+
+    conditions, params = ["user_id = ?", "habit_id > ?"], [user_id, decode_page_token(after) if after else 0]
+    # Unary + keeps SQLite on the (user_id) paging index instead of the periodicity index
+    if is_active is not None:
+        conditions.append("+is_active = ?")
+        params.append(is_active)
+    if periodicity is not None:
+        conditions.append("+periodicity = ?")
+        params.append(periodicity)
+
+    # Fetch one extra row to learn whether another page follows
+    habits = _fetch_habits(cursor, f"""
+        SELECT {{columns}}
+        FROM habits
+        WHERE {' AND '.join(conditions)}
+        ORDER BY habit_id
+        LIMIT ?
+    """, (*params, limit + 1), as_objects)
+    if len(habits) > limit:
+        habits = habits[:limit]
+        return habits, encode_page_token(habits[-1].habit_id if as_objects else habits[-1][0])
+    return habits, None
+
+
+def iter_habit_pages(cursor, user_id: int, after: str | None = None, limit: int = DEFAULT_PAGE_SIZE,
+                     is_active: str | None = None, periodicity: str | None = None, as_objects: bool = False):
+    """
+    Yield (habits, next token) for every page of a user's habits, starting after ``after``.
+
+    See list_habits_page for the arguments.
+    """
+    while True:
+        habits, after = list_habits_page(cursor, user_id, after, limit, is_active, periodicity, as_objects)
+        yield habits, after
+        if after is None:
+            return
+
+
+def get_habit(cursor, user_id: int, habit_id: int):
+    """
+    Fetch one of the user's habits.
+
+    Raises:
+        HabitNotFoundError: If the habit does not exist or belongs to someone else.
+    """
+    cursor.execute("SELECT * FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
+    habit = cursor.fetchone()
+    if not habit:
+        raise HabitNotFoundError("Habit not found or doesn't belong to the user.")
+    return habit
+
+
+def delete_habit(cursor, user_id: int, habit_id: int) -> None:
+    """Delete one of the user's habits with its completions and streak."""
+    _delete_habit_data(cursor, "habit_id = ? AND user_id = ?", (habit_id, user_id))
+    cursor.execute("DELETE FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
+
+
+def _delete_habit_data(cursor, where: str, params) -> None:
+    # Every table is keyed on habit_id first, so the lookups use their indexes
+    for table in HABIT_DATA_TABLES:
+        cursor.execute(f"DELETE FROM {table} WHERE habit_id IN (SELECT habit_id FROM habits WHERE {where})", params)
+
+
+def log_completion(cursor, user_id: int, habit_id: int, completed_at=None) -> dict:
+    """
+    Record a completion of one of the user's habits.
+
+    Args:
+        cursor: The database cursor object.
+        user_id (int): ID of the habit's owner.
+        habit_id (int): ID of the completed habit.
+        completed_at (datetime, date or str, optional): When it was completed (defaults to now).
+
+    Returns:
+        dict: habit_id, periodicity, count, current_streak, longest_streak and completed_on.
+
+    Raises:
+        HabitNotFoundError: If the habit does not exist or belongs to someone else.
+    """
+    cursor.execute("SELECT periodicity FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
+    habit = cursor.fetchone()
+    if not habit:
+        raise HabitNotFoundError("Habit not found or doesn't belong to the user.")
+    periodicity = habit[0]
+
+    try:
+        completed_at = to_local_datetime(completed_at)
+    except ValueError:
+        raise InvalidInputError(f"Invalid completion time '{completed_at}'.") from None
+
+    # Append the completion to the event log and advance the streak in O(1)
+    summary = record_completion(cursor, user_id, habit_id, periodicity, completed_at)
+
+    # Update the habit's last completed date (never moving it backwards)
+    cursor.execute("""
+        UPDATE habits
+        SET last_completed_at = MAX(COALESCE(last_completed_at, ''), ?)
+        WHERE habit_id = ? AND user_id = ?
+    """, (completed_at.strftime('%Y-%m-%d %H:%M:%S'), habit_id, user_id))
+
+    return {"habit_id": habit_id, "periodicity": periodicity, **summary}
@@ -0,0 +1,315 @@
+"""
+Group-commit write-behind queue for completion logging.
+
+Logging a completion directly runs a handful of statements and then commits,
+and every commit waits for the disk (fsync). With many completions arriving
+at once that wait, not SQLite, caps the logging rate. In write-behind mode
+completions are put on an in-process queue instead, and one background writer
+thread drains it in batches: it opens a transaction, logs up to ``batch_size``
+completions (or whatever arrived within ``max_delay_ms`` of the first one),
+and commits them together - one fsync per batch instead of per completion.
+
+``submit`` returns a ``concurrent.futures.Future`` that resolves to the same
+summary ``tracker.log_completion`` returns once the batch holding it has been
+committed (the durability acknowledgement), or raises its TrackerError. Each
+completion runs inside its own savepoint, so one bad event does not fail its
+batch. ``flush`` waits until everything submitted so far is committed, and
+``close`` (run at exit for the process-wide queue) flushes and stops the writer.
+
+Enable it for ``main.log_completion`` with ``HABIT_TRACKER_WRITE_BEHIND=1``
+(batch size and delay from ``HABIT_TRACKER_WB_BATCH`` and
+``HABIT_TRACKER_WB_DELAY_MS``) or ``writebehind.enable()``; the menu action
+then waits for its acknowledgement, so it still reports the updated streak,
+while concurrent callers share commits.
+
+Usage:
+    python writebehind.py bench --events 2000 --threads 16
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import tracker
+from db import begin_write, get_connection, get_shard_map, retrying
+from shards import shard_of_id
+
+# Completions committed together at most, and the longest a completion waits for company
+BATCH_SIZE = int(os.environ.get("HABIT_TRACKER_WB_BATCH", "256"))
+MAX_DELAY_MS = float(os.environ.get("HABIT_TRACKER_WB_DELAY_MS", "5"))
+
+_STOP = object()
+
+
+class _Flush:
+    """Queue marker: commit what has been collected and signal ``done``."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class WriteBehindQueue:
+    """An in-process queue of completions written by one background thread in group commits."""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, max_delay_ms: float = MAX_DELAY_MS):
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.stats = {"events": 0, "batches": 0, "failed": 0}
+        self._queue = queue.Queue()
+        self._closed = False
+        # Held while checking _closed and queueing, so nothing is queued after _STOP
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+
+    def submit(self, user_id: int, habit_id: int, completed_at=None) -> Future:
+        """
+        Queue a completion of one of the user's habits.
+
+        Returns:
+            Future: Resolves to the summary ``tracker.log_completion`` returns once
+            the completion is committed; raises its TrackerError (or the database error).
+
+        Raises:
+            RuntimeError: If the queue has been closed.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The write-behind queue is closed.")
+            self._queue.put((future, user_id, habit_id, completed_at))
+        return future
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every completion submitted so far is committed. Returns False on timeout."""
+        marker = _Flush()
+        with self._lock:
+            if self._closed:
+                # close() already waited for everything submitted before it
+                self._thread.join(timeout)
+                return not self._thread.is_alive()
+            self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self) -> None:
+        """Flush, then stop the writer thread. Further submits raise RuntimeError."""
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join()
+
+    # ---------------------------
+    # Writer thread
+    # ---------------------------
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, markers = [], []
+            deadline = time.monotonic() + self.max_delay
+            while True:
+                if isinstance(item, _Flush):
+                    markers.append(item)
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception as e:
+                # E.g. the shard layout could not be opened: fail the batch, keep the writer running
+                self._fail(batch, e)
+            finally:
+                for marker in markers:
+                    marker.done.set()
+
+        # Nothing is queued after _STOP, but never leave a caller waiting on a stopped writer
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is not _STOP:
+                self._fail([item], RuntimeError("The write-behind queue is closed."))
+
+    def _fail(self, events, error):
+        for future, *_ in events:
+            if not future.done():
+                self.stats["failed"] += 1
+                future.set_exception(error)
+
+    def _write(self, batch):
+        # In sharded mode each shard's completions are committed on that shard
+        groups = {}
+        sharded = get_shard_map() is not None
+        for event in batch:
+            groups.setdefault(shard_of_id(event[1]) if sharded else 0, []).append(event)
+
+        for events in groups.values():
+            try:
+                for attempt in retrying():
+                    with attempt, get_connection(user_id=events[0][1]) as conn:
+                        results = []
+                        cursor = conn.cursor()
+                        begin_write(conn)
+                        for future, user_id, habit_id, completed_at in events:
+                            cursor.execute("SAVEPOINT completion")
+                            try:
+                                results.append((future, tracker.log_completion(cursor, user_id, habit_id,
+                                                                               completed_at), None))
+                            except tracker.TrackerError as e:
+                                cursor.execute("ROLLBACK TO completion")
+                                results.append((future, None, e))
+                            cursor.execute("RELEASE completion")
+                        conn.commit()
+            except Exception as e:
+                self._fail(events, e)
+                continue
+
+            self.stats["events"] += len(events)
+            self.stats["batches"] += 1
+            for future, summary, error in results:
+                if error is None:
+                    future.set_result(summary)
+                else:
+                    future.set_exception(error)
+
+
+# ---------------------------
+# Process-wide queue
+# ---------------------------
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def enable(batch_size: int = BATCH_SIZE, max_delay_ms: float = MAX_DELAY_MS) -> WriteBehindQueue:
+    """Start (or restart) the process-wide queue used by ``main.log_completion``."""
+    global _queue
+    with _queue_lock:
+        if _queue is not None:
+            _queue.close()
+        _queue = WriteBehindQueue(batch_size, max_delay_ms)
+        return _queue
+
+
+def disable() -> None:
+    """Flush and stop the process-wide queue; completions are written directly again."""
+    global _queue
+    with _queue_lock:
+        if _queue is not None:
+            _queue.close()
+            _queue = None
+
+
+def get_queue() -> WriteBehindQueue | None:
+    """The process-wide queue, started on first use when HABIT_TRACKER_WRITE_BEHIND is set."""
+    if _queue is None and os.environ.get("HABIT_TRACKER_WRITE_BEHIND", "") not in ("", "0"):
+        with _queue_lock:
+            if _queue is None:
+                globals()["_queue"] = WriteBehindQueue()
+    return _queue
+
+
+# Queued completions are committed before the interpreter exits
+atexit.register(disable)
+
+
+# ---------------------------
+# Command line
+# ---------------------------
+
+def _bench(args) -> dict:
+    """Log the same completions directly and through the queue on copies of a scratch database."""
+    import shutil
+    import sqlite3
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    import db
+    import migrations
+
+    workdir = tempfile.mkdtemp(prefix="writebehind-")
+    template = os.path.join(workdir, "template.db")
+    conn = sqlite3.connect(template)
+    migrations.migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'pw')")
+    conn.executemany("INSERT INTO habits (name, periodicity, created_at, user_id) VALUES (?, 'daily', '2024-01-01', 1)",
+                     [(f"habit {i}",) for i in range(100)])
+    conn.commit()
+    conn.close()
+
+    url, results = db.DATABASE_URL, {}
+    try:
+        for mode in ("direct", "write-behind"):
+            path = os.path.join(workdir, f"{mode}.db")
+            shutil.copy(template, path)
+            db.DATABASE_URL = path
+            wb = WriteBehindQueue(args.batch_size, args.delay_ms) if mode == "write-behind" else None
+
+            def log(i):
+                habit_id = i % 100 + 1
+                if wb is not None:
+                    return wb.submit(1, habit_id).result()
+                with get_connection(user_id=1) as conn:
+                    summary = tracker.log_completion(conn.cursor(), 1, habit_id)
+                    conn.commit()
+                    return summary
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(args.threads) as executor:
+                list(executor.map(log, range(args.events)))
+            seconds = time.perf_counter() - started
+            results[mode] = {"seconds": round(seconds, 3), "per_second": round(args.events / seconds)}
+            if wb is not None:
+                wb.close()
+                results[mode]["batches"] = wb.stats["batches"]
+            db.close_pool()
+    finally:
+        db.DATABASE_URL = url
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None) -> int:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Compare direct and write-behind completion logging.")
+    parser.add_argument("command", choices=("bench",))
+    parser.add_argument("--events", type=int, default=2000, help="completions to log")
+    parser.add_argument("--threads", type=int, default=16, help="concurrent callers")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--delay-ms", type=float, default=MAX_DELAY_MS)
+    args = parser.parse_args(argv)
+
+    results = _bench(args)
+    print(json.dumps(results, indent=2))
+    speedup = results["direct"]["seconds"] / results["write-behind"]["seconds"]
+    print(f"write-behind: {speedup:.1f}x the direct logging rate", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())